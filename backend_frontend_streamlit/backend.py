@@ -1,53 +1,565 @@
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+
 import pymysql
-from flask import Flask, jsonify
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
+
+import columnar
+import metriques
+import quantiles
+from cache_http import DataVersion, ResultCache, conditional
+from pool import ConnectionPool, PoolTimeout
 
 app = Flask(__name__)
 
-# Connexion à la base de données MySQL avec pymysql
+# Configuration de connexion à MySQL (surchargeable par variables d'environnement, ex. base du banc d'essai)
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),  # Remplace par ton hôte
+    "user": os.environ.get("DB_USER", "root"),       # Remplace par ton utilisateur MySQL
+    "password": os.environ.get("DB_PASSWORD", ""),   # Remplace par ton mot de passe
+    "database": os.environ.get("DB_NAME", "prediction"),  # Nom de la base de données
+    "cursorclass": pymysql.cursors.DictCursor
+}
+
+# Pool de connexions partagé par toutes les routes (tailles configurables par variables d'environnement)
+pool = ConnectionPool(
+    DB_CONFIG,
+    min_size=int(os.environ.get("DB_POOL_MIN", 2)),
+    max_size=int(os.environ.get("DB_POOL_MAX", 10)),
+    idle_timeout=float(os.environ.get("DB_POOL_IDLE_TIMEOUT", 300)),
+    wait_timeout=float(os.environ.get("DB_POOL_WAIT_TIMEOUT", 10)),
+)
+
+# Mesures de chaque requête (acquisition, exécution, lecture, sérialisation, lignes, octets),
+# exposées par route sur /metrics ; les requêtes SQL plus lentes que SLOW_QUERY_SECONDS sont journalisées
+metrics_registry = metriques.MetricsRegistry()
+metriques.init_app(app, metrics_registry)
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 1.0))
+
+# Connexion à la base de données MySQL empruntée au pool
+# (conn.close() rend la connexion au pool au lieu de la fermer)
 def get_db_connection():
-    return pymysql.connect(
-        host="localhost",  # Remplace par ton hôte
-        user="root",       # Remplace par ton utilisateur MySQL
-        password="",       # Remplace par ton mot de passe
-        database="prediction",  # Nom de la base de données
-        cursorclass=pymysql.cursors.DictCursor
+    with metriques.timer("acquisition"):
+        return pool.acquire()
+
+# Curseur instrumenté (temps d'exécution et de lecture, lignes, journal des requêtes lentes)
+def measured_cursor(conn, cursor_class=None):
+    return metriques.TimedCursor(conn.cursor(cursor_class), SLOW_QUERY_SECONDS)
+
+# Version des données (nombre de lignes, id max, date de mise à jour) utilisée pour les ETag,
+# et cache en mémoire des réponses, invalidé dès que la version des tables lues change
+data_version = DataVersion(get_db_connection, ttl=float(os.environ.get("DATA_VERSION_TTL", 2)))
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_ENTRIES", 128)),
+    max_bytes=int(os.environ.get("RESULT_CACHE_MB", 256)) * 1024 * 1024,
+)
+
+# Sketches de quantiles de temps_reponse, construits en arrière-plan à la première demande puis
+# complétés par les nouvelles détections avant chaque réponse non servie depuis le cache
+# (voir quantiles.py et /data/objets/quantiles)
+quantile_index = quantiles.QuantileIndex(
+    get_db_connection,
+    open_cursor=lambda conn: measured_cursor(conn, pymysql.cursors.SSCursor),
+    relative_accuracy=float(os.environ.get("QUANTILE_ACCURACY", quantiles.RELATIVE_ACCURACY)),
+    chunk_size=int(os.environ.get("STREAM_CHUNK_SIZE", 5000)),
+    check_interval=float(os.environ.get("QUANTILE_CHECK_INTERVAL", 60)),
+)
+
+# Tables lues par chaque famille de routes
+OBJETS_TABLES = ("objets", "categories", "utilisateurs")
+SATISFACTION_TABLES = ("satisfactions", "objets", "categories", "utilisateurs")
+
+# Nombre de lignes lues à la fois par le curseur serveur en mode streaming
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 5000))
+
+# Clé de période calculée par MySQL pour chaque granularité.
+# Les libellés sont triables lexicographiquement : "2024-W05" (semaine ISO), "2024-03", "2024".
+# (les % sont doublés car pymysql applique le formatage des paramètres à la requête)
+PERIOD_SQL = {
+    "Semaine": "DATE_FORMAT(o.date_detection, '%%x-W%%v')",
+    "Mois": "DATE_FORMAT(o.date_detection, '%%Y-%%m')",
+    "Année": "DATE_FORMAT(o.date_detection, '%%Y')",
+}
+
+# Pool saturé : répondre 503 plutôt que de bloquer indéfiniment
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(error):
+    return jsonify({"erreur": str(error)}), 503
+
+# Sketches de quantiles en construction : 503, le client réessaie plus tard (réponse non mise en cache)
+@app.errorhandler(quantiles.IndexNotReady)
+def handle_index_not_ready(error):
+    response = jsonify({"erreur": str(error)})
+    response.headers["Retry-After"] = "5"
+    return response, 503
+
+# Libération unique du curseur et de la connexion d'une réponse diffusée : à la fin de la diffusion,
+# ou à la fermeture de la réponse si le générateur n'a jamais démarré (requête HEAD, réponse abandonnée)
+def closing_once(cursor, conn):
+    closed = []
+
+    def close():
+        if not closed:
+            closed.append(True)
+            try:
+                cursor.close()
+            finally:
+                conn.close()
+    return close
+
+# Diffuse le résultat d'une requête au fil de l'eau avec un curseur non bufferisé (SSDictCursor) :
+# la mémoire du backend reste constante et le premier octet part dès le premier paquet de lignes.
+#   mode "ndjson" : une ligne JSON par enregistrement (application/x-ndjson)
+#   mode "json"   : un tableau JSON envoyé par morceaux (application/json)
+def stream_query(sql, params=None, mode="ndjson"):
+    conn = get_db_connection()
+    cursor = measured_cursor(conn, pymysql.cursors.SSDictCursor)
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        cursor.close()
+        conn.close()
+        raise
+    release = closing_once(cursor, conn)
+
+    def generate():
+        try:
+            first = True
+            if mode == "json":
+                yield "["
+            while True:
+                rows = cursor.fetchmany(STREAM_CHUNK_SIZE)
+                if not rows:
+                    break
+                if mode == "json":
+                    chunk = ",".join(app.json.dumps(row) for row in rows)
+                    yield chunk if first else "," + chunk
+                else:
+                    yield "".join(app.json.dumps(row) + "\n" for row in rows)
+                first = False
+            if mode == "json":
+                yield "]"
+        finally:
+            # Toujours libérer le curseur et rendre la connexion, même si le client se déconnecte
+            release()
+
+    mimetype = "application/json" if mode == "json" else "application/x-ndjson"
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.call_on_close(release)
+    return response
+
+# Lecture d'un paramètre date (AAAA-MM-JJ) de la requête HTTP
+def parse_date_arg(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f"Paramètre '{name}' invalide (format attendu : AAAA-MM-JJ)")
+
+# Construction des clauses WHERE paramétrées à partir des filtres de la requête HTTP
+# (alias attendus dans la requête SQL : o = objets, c = categories, u = utilisateurs)
+def build_filters(args):
+    clauses, params = [], []
+
+    categories = args.getlist("categorie")
+    if categories:
+        clauses.append(f"c.nom IN ({', '.join(['%s'] * len(categories))})")
+        params.extend(categories)
+
+    types_objets = args.getlist("type_objet")
+    if types_objets:
+        clauses.append(f"o.type_objet IN ({', '.join(['%s'] * len(types_objets))})")
+        params.extend(types_objets)
+
+    date_from = parse_date_arg(args, "date_from")
+    if date_from:
+        clauses.append("o.date_detection >= %s")
+        params.append(date_from)
+
+    date_to = parse_date_arg(args, "date_to")
+    if date_to:
+        # Borne incluse : on compare au lendemain pour couvrir toute la journée
+        clauses.append("o.date_detection < %s")
+        params.append(date_to + timedelta(days=1))
+
+    genre = args.get("genre")
+    if genre:
+        if genre not in ("H", "F"):
+            abort(400, description="Paramètre 'genre' invalide (valeurs possibles : H, F)")
+        clauses.append("u.genre = %s")
+        params.append(genre)
+
+    return clauses, params
+
+def where_sql(clauses):
+    return ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+# Colonnes exposées par /data/objets (nom renvoyé -> expression SQL)
+OBJETS_COLUMNS = {
+    "id": "o.id",
+    "utilisateur_id": "o.utilisateur_id",
+    "type_objet": "o.type_objet",
+    "image_url": "o.image_url",
+    "temps_reponse": "o.temps_reponse",
+    "date_detection": "o.date_detection",
+    "categorie_id": "o.categorie_id",
+    "categorie": "c.nom",
+    "genre": "u.genre",
+}
+OBJETS_DEFAULT_COLUMNS = ["id", "utilisateur_id", "type_objet", "image_url", "temps_reponse", "date_detection", "categorie_id"]
+
+# Colonnes exposées par /data/satisfaction
+SATISFACTION_COLUMNS = {
+    "id": "s.id",
+    "utilisateur_id": "s.utilisateur_id",
+    "satisfait": "s.satisfait",
+    "non_satisfait": "s.non_satisfait",
+    "categorie": "c.nom",
+    "type_objet": "o.type_objet",
+    "date_detection": "o.date_detection",
+    "genre": "u.genre",
+}
+SATISFACTION_DEFAULT_COLUMNS = ["id", "utilisateur_id", "satisfait", "non_satisfait", "categorie", "date_detection", "genre"]
+
+# Projection demandée par le paramètre colonnes=a,b,c (toutes les colonnes par défaut)
+def parse_columns(args, available, default):
+    value = args.get("colonnes")
+    if not value:
+        return default
+    columns = [column.strip() for column in value.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        abort(400, description=f"Colonnes inconnues : {', '.join(unknown)} (disponibles : {', '.join(available)})")
+    return columns
+
+def select_sql(columns, available):
+    return ", ".join(f"{available[column]} AS {column}" for column in columns)
+
+# Requête de /data/objets : les jointures ne sont faites que si un filtre ou une colonne les exige
+def objets_query(args):
+    columns = parse_columns(args, OBJETS_COLUMNS, OBJETS_DEFAULT_COLUMNS)
+    clauses, params = build_filters(args)
+    joins = []
+    if "categorie" in columns or args.getlist("categorie"):
+        joins.append("JOIN categories c ON o.categorie_id = c.id")
+    if "genre" in columns or args.get("genre"):
+        joins.append("JOIN utilisateurs u ON o.utilisateur_id = u.id")
+
+    # Synchronisation incrémentale : seulement les détections postérieures au curseur since_id,
+    # triées par id pour que le client puisse avancer son curseur (id est alors toujours renvoyé)
+    order_by = ""
+    since_id = args.get("since_id")
+    if since_id is not None:
+        try:
+            since_id = int(since_id)
+        except ValueError:
+            abort(400, description="Paramètre 'since_id' invalide (entier attendu)")
+        clauses.append("o.id > %s")
+        params.append(since_id)
+        order_by = "ORDER BY o.id"
+        if "id" not in columns:
+            columns = ["id"] + columns
+
+    sql = f"""
+    SELECT {select_sql(columns, OBJETS_COLUMNS)}
+    FROM objets o
+    {" ".join(joins)}
+    {where_sql(clauses)}
+    {order_by}
+    """
+    return sql, tuple(params)
+
+# Les SUM/AVG MySQL renvoient des Decimal, que jsonify sérialise en chaînes : on les convertit en float
+def normalize_rows(rows):
+    for row in rows:
+        for key, value in row.items():
+            if isinstance(value, Decimal):
+                row[key] = float(value)
+    return rows
+
+# Négociation du format de réponse selon l'en-tête Accept.
+# JSON reste le format par défaut (navigateur, curl, Accept: */*) ; Arrow IPC et Parquet ne sont
+# proposés que si pyarrow est installé et que le client les demande explicitement.
+def negotiated_format():
+    if not columnar.available():
+        return "json"
+    best = request.accept_mimetypes.best_match(
+        ["application/json", columnar.ARROW_MIMETYPE, columnar.PARQUET_MIMETYPE],
+        default="application/json"
     )
+    return {columnar.ARROW_MIMETYPE: "arrow", columnar.PARQUET_MIMETYPE: "parquet"}.get(best, "json")
+
+# Flux Arrow IPC construit directement depuis un curseur serveur non bufferisé
+def arrow_response(sql, params):
+    conn = get_db_connection()
+    cursor = measured_cursor(conn, pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        cursor.close()
+        conn.close()
+        raise
+
+    release = closing_once(cursor, conn)
+
+    def generate():
+        try:
+            yield from columnar.arrow_stream(cursor, STREAM_CHUNK_SIZE)
+        finally:
+            release()
+
+    # Comme pour stream_query : connexion rendue même si le corps n'est jamais lu (HEAD, client parti)
+    response = Response(stream_with_context(generate()), mimetype=columnar.ARROW_MIMETYPE)
+    response.call_on_close(release)
+    return response
+
+def parquet_response(sql, params):
+    with get_db_connection() as conn:
+        cursor = measured_cursor(conn, pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(sql, params)
+            with metriques.serialization():
+                body = columnar.parquet_bytes(cursor, STREAM_CHUNK_SIZE)
+        finally:
+            cursor.close()
+    return Response(body, mimetype=columnar.PARQUET_MIMETYPE)
+
+# Réponse d'une requête de lecture dans le format négocié (JSON, diffusé ou non, Arrow IPC ou Parquet)
+def rows_response(sql, params, stream=None):
+    response_format = negotiated_format()
+    if response_format == "arrow":
+        return arrow_response(sql, params)
+    if response_format == "parquet":
+        return parquet_response(sql, params)
+    if stream is not None:
+        return stream_query(sql, params, mode=stream)
+
+    # Le bloc with garantit le retour de la connexion au pool même en cas d'erreur
+    with get_db_connection() as conn:
+        with measured_cursor(conn) as cursor:
+            cursor.execute(sql, params)
+            data = normalize_rows(cursor.fetchall())
+    with metriques.serialization():
+        return jsonify(data)
+
+def parse_granularite(args):
+    granularite = args.get("granularite", "Mois")
+    if granularite not in PERIOD_SQL:
+        abort(400, description="Paramètre 'granularite' invalide (valeurs possibles : Semaine, Mois, Année)")
+    return granularite
+
+# Requête de /data/objets/aggregate
+def objets_aggregate_query(args):
+    granularite = parse_granularite(args)
+    by_type = args.get("par_type") == "1"
+    clauses, params = build_filters(args)
+
+    group_columns = "periode, categorie, type_objet" if by_type else "periode, categorie"
+    type_column = "o.type_objet, " if by_type else ""
+    user_join = "JOIN utilisateurs u ON o.utilisateur_id = u.id" if args.get("genre") else ""
+    sql = f"""
+    SELECT {PERIOD_SQL[granularite]} AS periode, c.nom AS categorie, {type_column}
+           COUNT(*) AS nb_objets,
+           SUM(o.temps_reponse) AS somme_temps_reponse,
+           AVG(o.temps_reponse) AS moyenne_temps_reponse,
+           MIN(o.temps_reponse) AS min_temps_reponse,
+           MAX(o.temps_reponse) AS max_temps_reponse
+    FROM objets o
+    JOIN categories c ON o.categorie_id = c.id
+    {user_join}
+    {where_sql(clauses)}
+    GROUP BY {group_columns}
+    ORDER BY {group_columns};
+    """
+    return sql, tuple(params)
+
+# Requête de /data/satisfaction
+def satisfaction_query(args):
+    columns = parse_columns(args, SATISFACTION_COLUMNS, SATISFACTION_DEFAULT_COLUMNS)
+    clauses, params = build_filters(args)
+    # Jointure avec la table utilisateurs pour récupérer le genre
+    user_join = "JOIN utilisateurs u ON s.utilisateur_id = u.id" if "genre" in columns or args.get("genre") else ""
+    sql = f"""
+    SELECT {select_sql(columns, SATISFACTION_COLUMNS)}
+    FROM satisfactions s
+    JOIN objets o ON s.utilisateur_id = o.utilisateur_id
+    JOIN categories c ON o.categorie_id = c.id
+    {user_join}
+    {where_sql(clauses)};
+    """
+    return sql, tuple(params)
+
+# Requête de /data/satisfaction/aggregate
+# La table satisfactions n'est liée aux objets que par l'utilisateur : une jointure directe répète
+# chaque avis autant de fois que l'utilisateur a de détections. Ici, les avis sont d'abord sommés par
+# utilisateur, puis attribués à ses détections au prorata (nb détections du groupe / total de
+# l'utilisateur) : la somme des avis attribués est égale au total réel et la taille de la réponse
+# dépend seulement du nombre de groupes (période x catégorie [x type_objet]).
+def satisfaction_aggregate_query(args):
+    granularite = parse_granularite(args)
+    by_type = args.get("par_type") == "1"
+    clauses, params = build_filters(args)
+
+    group_columns = "periode, categorie, type_objet" if by_type else "periode, categorie"
+    inner_type_column = ", o.type_objet" if by_type else ""
+    outer_type_column = "d.type_objet, " if by_type else ""
+    user_join = "JOIN utilisateurs u ON o.utilisateur_id = u.id" if args.get("genre") else ""
+    detections = f"""FROM objets o
+        JOIN categories c ON o.categorie_id = c.id
+        {user_join}
+        {where_sql(clauses)}"""
+    # Totaux (toutes détections de l'utilisateur, pour répartir ses avis) et avis ne sont calculés que
+    # pour les utilisateurs des détections filtrées, par les index sur utilisateur_id, au lieu d'un
+    # parcours complet des index de objets et de satisfactions à chaque requête (sans filtre, tous
+    # les utilisateurs sont concernés : le parcours complet est alors nécessaire)
+    users = f"WHERE utilisateur_id IN (SELECT o.utilisateur_id {detections})" if clauses else ""
+    sql = f"""
+    SELECT d.periode, d.categorie, {outer_type_column}
+           SUM(s.satisfait * d.nb / t.total) AS satisfait,
+           SUM(s.non_satisfait * d.nb / t.total) AS non_satisfait,
+           100 * SUM(s.satisfait * d.nb / t.total)
+               / NULLIF(SUM((s.satisfait + s.non_satisfait) * d.nb / t.total), 0) AS taux_precision,
+           SUM(d.nb) AS nb_objets
+    FROM (
+        SELECT o.utilisateur_id, {PERIOD_SQL[granularite]} AS periode, c.nom AS categorie{inner_type_column},
+               COUNT(*) AS nb
+        {detections}
+        GROUP BY o.utilisateur_id, {group_columns}
+    ) d
+    JOIN (
+        SELECT utilisateur_id, COUNT(*) AS total
+        FROM objets
+        {users}
+        GROUP BY utilisateur_id
+    ) t ON t.utilisateur_id = d.utilisateur_id
+    JOIN (
+        SELECT utilisateur_id, SUM(satisfait) AS satisfait, SUM(non_satisfait) AS non_satisfait
+        FROM satisfactions
+        {users}
+        GROUP BY utilisateur_id
+    ) s ON s.utilisateur_id = d.utilisateur_id
+    GROUP BY {group_columns}
+    ORDER BY {group_columns};
+    """
+    # Les filtres apparaissent trois fois : détections, totaux et avis
+    return sql, tuple(params) * (3 if clauses else 1)
+
+# Paramètres de /data/objets/quantiles : dimensions de regroupement (par=periode,type_objet...),
+# quantiles demandés (quantiles=0.5,0.95,0.99) et filtres categorie / type_objet (répétables).
+# Les sketches ne portent pas la date exacte ni le genre : ces filtres sont refusés.
+def quantiles_args(args):
+    granularite = parse_granularite(args)
+    unsupported = [name for name in ("date_from", "date_to", "genre") if args.get(name)]
+    if unsupported:
+        abort(400, description=f"Filtres non disponibles pour les quantiles : {', '.join(unsupported)}")
+
+    by = args.get("par", "periode,categorie")
+    by = [dimension.strip() for dimension in by.split(",") if dimension.strip()]
+    unknown = [dimension for dimension in by if dimension not in quantiles.DIMENSIONS]
+    if unknown:
+        abort(400, description=f"Dimensions inconnues : {', '.join(unknown)} (disponibles : {', '.join(quantiles.DIMENSIONS)})")
+
+    try:
+        levels = [float(q) for q in args.get("quantiles", "").split(",") if q.strip()] or list(quantiles.DEFAULT_QUANTILES)
+    except ValueError:
+        abort(400, description="Paramètre 'quantiles' invalide (nombres entre 0 et 1 séparés par des virgules)")
+    if any(not 0 <= q <= 1 for q in levels):
+        abort(400, description="Paramètre 'quantiles' invalide (nombres entre 0 et 1 séparés par des virgules)")
+
+    return {
+        "granularite": granularite,
+        "by": by,
+        "categories": set(args.getlist("categorie")),
+        "types_objets": set(args.getlist("type_objet")),
+        "quantiles": levels,
+    }
+
+# Toutes les routes de données acceptent Accept: application/vnd.apache.arrow.stream (flux Arrow IPC)
+# ou Accept: application/vnd.apache.parquet (fichier Parquet) si pyarrow est installé ; JSON sinon.
 
 # Route pour obtenir des données des objets
+# Filtres : categorie et type_objet (répétables), date_from / date_to (AAAA-MM-JJ), genre (H, F)
+# Projection : colonnes=type_objet,date_detection,... (voir OBJETS_COLUMNS)
+# Delta : since_id=N ne renvoie que les détections d'id > N (triées par id)
+# ?stream=ndjson ou ?stream=json active la diffusion en continu (recommandé pour les grandes tables)
 @app.route('/data/objets', methods=['GET'])
+@conditional(data_version, result_cache, *OBJETS_TABLES)
 def get_objets():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM objets")
-    data = cursor.fetchall()
-    conn.close()
-    return jsonify(data)
+    sql, params = objets_query(request.args)
+    stream = request.args.get("stream")
+    if stream is not None and stream not in ("ndjson", "json"):
+        abort(400, description="Paramètre 'stream' invalide (valeurs possibles : ndjson, json)")
+    return rows_response(sql, params, stream=stream)
+
+# Route pour obtenir les objets pré-agrégés par MySQL
+# Paramètres : granularite (Semaine, Mois, Année), categorie et type_objet (répétables),
+# date_from / date_to (AAAA-MM-JJ), genre (H, F), par_type=1 pour détailler aussi par type d'objet.
+# Chaque ligne contient : periode, categorie, [type_objet,] nb_objets,
+# somme_temps_reponse, moyenne_temps_reponse, min_temps_reponse, max_temps_reponse.
+@app.route('/data/objets/aggregate', methods=['GET'])
+@conditional(data_version, result_cache, *OBJETS_TABLES)
+def get_objets_aggregate():
+    return rows_response(*objets_aggregate_query(request.args))
+
+# Route pour obtenir les quantiles de temps_reponse (p50, p95, p99 par défaut) sans lire les détections :
+# les sketches par (période, catégorie, type d'objet) sont fusionnés selon les dimensions demandées.
+# Paramètres : granularite, par (dimensions parmi periode, categorie, type_objet ; "periode,categorie"
+# par défaut), quantiles, categorie et type_objet (répétables).
+# Chaque ligne contient : les dimensions demandées, nb_objets, p50, p95, p99 (un pNN par quantile).
+# Erreur relative de chaque quantile : QUANTILE_ACCURACY (1 % par défaut). Réponse JSON uniquement.
+# 503 tant que les sketches sont en construction (premier appel, base régénérée).
+@app.route('/data/objets/quantiles', methods=['GET'])
+@conditional(data_version, result_cache, *OBJETS_TABLES)
+def get_objets_quantiles():
+    query = quantiles_args(request.args)
+    quantile_index.refresh()
+    data = quantile_index.query(
+        query["granularite"], by=query["by"], categories=query["categories"],
+        types_objets=query["types_objets"], quantiles=query["quantiles"]
+    )
+    with metriques.serialization():
+        return jsonify(data)
 
 # Route pour obtenir des données de satisfaction
+# Attention : chaque avis est répété pour chaque détection de l'utilisateur (jointure sur utilisateur_id) ;
+# pour des comptes corrects, utiliser /data/satisfaction/aggregate.
+# Mêmes filtres et projection que /data/objets (voir SATISFACTION_COLUMNS)
 @app.route('/data/satisfaction', methods=['GET'])
+@conditional(data_version, result_cache, *SATISFACTION_TABLES)
 def get_satisfaction():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Jointure avec la table utilisateurs pour récupérer le genre
-    cursor.execute("""
-    SELECT s.*, c.nom AS categorie, o.date_detection
-    FROM satisfactions s
-    JOIN objets o ON s.utilisateur_id = o.utilisateur_id
-    JOIN categories c ON o.categorie_id = c.id;
-    """)
-    data = cursor.fetchall()
-    conn.close()
-    return jsonify(data)
+    return rows_response(*satisfaction_query(request.args))
+
+# Route pour obtenir la satisfaction pré-agrégée par période et catégorie, sans démultiplication
+# (voir satisfaction_aggregate_query). Paramètres : mêmes filtres que /data/objets/aggregate
+# (granularite, categorie, type_objet, date_from, date_to, genre, par_type=1).
+@app.route('/data/satisfaction/aggregate', methods=['GET'])
+@conditional(data_version, result_cache, *SATISFACTION_TABLES)
+def get_satisfaction_aggregate():
+    return rows_response(*satisfaction_aggregate_query(request.args))
 
 # Route pour obtenir des données des catégories
 @app.route('/data/categories', methods=['GET'])
+@conditional(data_version, result_cache, "categories")
 def get_categories():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM categories")
-    data = cursor.fetchall()
-    conn.close()
-    return jsonify(data)
+    return rows_response("SELECT * FROM categories", ())
+
+# Route pour obtenir les statistiques du pool de connexions
+@app.route('/stats/pool', methods=['GET'])
+def get_pool_stats():
+    return jsonify(pool.stats())
+
+# Route pour obtenir les statistiques du cache des résultats
+@app.route('/stats/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify(result_cache.stats())
+
+# Route pour obtenir l'état des sketches de quantiles (lignes lues, nombre de sketches et de paniers)
+@app.route('/stats/quantiles', methods=['GET'])
+def get_quantile_stats():
+    return jsonify(quantile_index.stats())
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
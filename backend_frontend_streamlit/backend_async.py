@@ -0,0 +1,311 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import time
+
+import aiomysql
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import HTTPException
+
+import backend
+import quantiles
+from cache_http import STATS_EXPIRY_SQL, ResultCache
+
+# Mode de service asynchrone (ASGI) des routes de données du backend :
+#
+#   uvicorn backend_async:app --port 8000
+#
+# Les requêtes SQL sont construites par les mêmes fonctions que backend.py et exécutées avec aiomysql :
+# pendant qu'une requête attend MySQL, la boucle d'événements sert les autres sessions, si bien qu'un
+# seul processus tient de nombreuses connexions simultanées (la limite devient la taille du pool).
+# Réponses JSON (diffusées ou non, ?stream=ndjson / ?stream=json) avec ETag et cache des résultats ;
+# Arrow et Parquet restent servis par backend.py (les clients lisent le format d'après Content-Type).
+# Les quantiles (/data/objets/quantiles) sont lus dans les sketches de backend.quantile_index : leur mise
+# à jour (pymysql, pool de backend.py) se fait dans le pool de threads, hors de la boucle d'événements.
+
+DB_CONFIG = {
+    "host": backend.DB_CONFIG["host"],
+    "user": backend.DB_CONFIG["user"],
+    "password": backend.DB_CONFIG["password"],
+    "db": backend.DB_CONFIG["database"],
+    "autocommit": True,  # chaque SELECT voit les dernières données (pas d'instantané REPEATABLE READ)
+}
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+POOL_WAIT_TIMEOUT = float(os.environ.get("DB_POOL_WAIT_TIMEOUT", 10))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_IDLE_TIMEOUT", 300))
+
+# Pool aiomysql créé au démarrage de l'application (il doit appartenir à la boucle d'événements du serveur)
+pool = None
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_ENTRIES", 128)),
+    max_bytes=int(os.environ.get("RESULT_CACHE_MB", 256)) * 1024 * 1024,
+)
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion libre n'a pu être obtenue dans le délai imparti."""
+
+
+class Connection:
+    """Connexion empruntée au pool aiomysql, rendue à la sortie du bloc async with."""
+
+    async def __aenter__(self):
+        try:
+            self.conn = await asyncio.wait_for(pool.acquire(), POOL_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"Aucune connexion disponible après {POOL_WAIT_TIMEOUT} s") from None
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        pool.release(self.conn)
+
+
+async def fetch_all(sql, params=()):
+    async with Connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            return backend.normalize_rows(list(await cursor.fetchall()))
+
+
+class AsyncDataVersion:
+    """Équivalent asynchrone de cache_http.DataVersion (mêmes requêtes, même version combinée).
+
+    Un seul calcul est en cours à la fois par table : les requêtes concurrentes attendent la même tâche.
+    """
+
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._versions = {}  # table -> (instant du calcul, version, date de mise à jour)
+        self._pending = {}  # table -> tâche du calcul en cours
+
+    async def _compute(self, tables):
+        placeholders = ", ".join(["%s"] * len(tables))
+        async with Connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                # Même session pour le réglage et la lecture d'UPDATE_TIME (voir cache_http.STATS_EXPIRY_SQL)
+                try:
+                    await cursor.execute(STATS_EXPIRY_SQL)
+                except aiomysql.MySQLError:
+                    pass
+                await cursor.execute(f"""
+                SELECT TABLE_NAME AS nom, UPDATE_TIME AS mise_a_jour
+                FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders});
+                """, tuple(tables))
+                update_times = {row["nom"]: row["mise_a_jour"] for row in await cursor.fetchall()}
+                results = {}
+                for table in tables:
+                    await cursor.execute(f"SELECT MAX(id) AS id_max FROM {table}")
+                    row = await cursor.fetchone()
+                    update_time = update_times.get(table)
+                    results[table] = (f"{row['id_max']}:{update_time}", update_time)
+        return results
+
+    async def _refresh(self, tables, now):
+        try:
+            for table, (version, update_time) in (await self._compute(tables)).items():
+                self._versions[table] = (now, version, update_time)
+        finally:
+            for table in tables:
+                self._pending.pop(table, None)
+
+    async def get(self, tables):
+        now = time.monotonic()
+        stale = [t for t in tables if t not in self._versions or now - self._versions[t][0] > self.ttl]
+        if stale:
+            missing = [t for t in stale if t not in self._pending]
+            if missing:
+                task = asyncio.ensure_future(self._refresh(missing, now))
+                for table in missing:
+                    self._pending[table] = task
+            # shield : une requête annulée n'interrompt pas le calcul attendu par les autres
+            await asyncio.gather(*(asyncio.shield(task) for task in {self._pending[t] for t in stale}))
+        entries = [self._versions[t] for t in tables]
+        version = "|".join(f"{t}={entry[1]}" for t, entry in zip(tables, entries))
+        update_times = [entry[2] for entry in entries if entry[2] is not None]
+        return version, (max(update_times) if update_times else None)
+
+    def invalidate(self):
+        self._versions.clear()
+
+
+data_version = AsyncDataVersion(ttl=float(os.environ.get("DATA_VERSION_TTL", 2)))
+
+
+# Même encodage JSON que le backend Flask (dates au format HTTP, voir schemas.HTTP_DATE_FORMAT)
+def dumps(data):
+    return backend.app.json.dumps(data)
+
+
+class JSON(JSONResponse):
+    def render(self, content):
+        return dumps(content).encode("utf-8")
+
+
+def stream_query(sql, params, mode):
+    async def generate():
+        async with Connection() as conn:
+            async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+                await cursor.execute(sql, params)
+                first = True
+                if mode == "json":
+                    yield "["
+                while True:
+                    rows = await cursor.fetchmany(backend.STREAM_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    if mode == "json":
+                        chunk = ",".join(dumps(row) for row in rows)
+                        yield chunk if first else "," + chunk
+                    else:
+                        yield "".join(dumps(row) + "\n" for row in rows)
+                    first = False
+                if mode == "json":
+                    yield "]"
+
+    media_type = "application/json" if mode == "json" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type)
+
+
+async def rows_response(sql, params, stream=None):
+    if stream is not None:
+        return stream_query(sql, params, stream)
+    return JSON(await fetch_all(sql, params))
+
+
+def conditional(*tables):
+    """Décorateur de route : ETag, réponse 304 et cache des résultats (comme cache_http.conditional)."""
+    def decorator(view):
+        async def wrapper(request):
+            version, last_modified = await data_version.get(tables)
+            key = (request.url.path, request.url.query.encode("utf-8"), request.headers.get("Accept", ""))
+            etag = hashlib.sha1(f"{version}|{key}".encode("utf-8")).hexdigest()
+
+            if f'"{etag}"' in request.headers.get("If-None-Match", ""):
+                response = Response(status_code=304)
+            else:
+                cached = result_cache.get(key, etag)
+                if cached is not None:
+                    response = Response(cached[1], media_type=cached[2])
+                else:
+                    response = await view(request)
+                    if response.status_code == 200 and not isinstance(response, StreamingResponse):
+                        result_cache.put(key, etag, response.body, response.media_type)
+
+            if response.status_code in (200, 304):
+                response.headers["ETag"] = f'"{etag}"'
+                if last_modified is not None:
+                    response.headers["Last-Modified"] = last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorator
+
+
+# Routes : mêmes chemins, paramètres et réponses JSON que backend.py
+@conditional(*backend.OBJETS_TABLES)
+async def get_objets(request):
+    sql, params = backend.objets_query(request.query_params)
+    stream = request.query_params.get("stream")
+    if stream is not None and stream not in ("ndjson", "json"):
+        return JSON({"erreur": "Paramètre 'stream' invalide (valeurs possibles : ndjson, json)"}, status_code=400)
+    return await rows_response(sql, params, stream)
+
+
+@conditional(*backend.OBJETS_TABLES)
+async def get_objets_aggregate(request):
+    return await rows_response(*backend.objets_aggregate_query(request.query_params))
+
+
+@conditional(*backend.SATISFACTION_TABLES)
+async def get_satisfaction(request):
+    return await rows_response(*backend.satisfaction_query(request.query_params))
+
+
+@conditional(*backend.SATISFACTION_TABLES)
+async def get_satisfaction_aggregate(request):
+    return await rows_response(*backend.satisfaction_aggregate_query(request.query_params))
+
+
+def _quantiles(query):
+    backend.quantile_index.refresh()
+    return backend.quantile_index.query(
+        query["granularite"], by=query["by"], categories=query["categories"],
+        types_objets=query["types_objets"], quantiles=query["quantiles"]
+    )
+
+
+@conditional(*backend.OBJETS_TABLES)
+async def get_objets_quantiles(request):
+    query = backend.quantiles_args(request.query_params)
+    return JSON(await run_in_threadpool(_quantiles, query))
+
+
+@conditional("categories")
+async def get_categories(request):
+    return await rows_response("SELECT * FROM categories", ())
+
+
+async def get_pool_stats(request):
+    return JSON({"taille": pool.size, "libres": pool.freesize, "min": pool.minsize, "max": pool.maxsize})
+
+
+async def get_cache_stats(request):
+    return JSON(result_cache.stats())
+
+
+# Paramètre invalide (abort(400) des fonctions de construction des requêtes) et pool saturé
+async def handle_http_exception(request, error):
+    return JSON({"erreur": error.description}, status_code=error.code)
+
+
+async def handle_pool_timeout(request, error):
+    return JSON({"erreur": str(error)}, status_code=503)
+
+
+# Sketches de quantiles en construction (comme backend.handle_index_not_ready)
+async def handle_index_not_ready(request, error):
+    return JSON({"erreur": str(error)}, status_code=503, headers={"Retry-After": "5"})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global pool
+    pool = await aiomysql.create_pool(minsize=POOL_MIN, maxsize=POOL_MAX, pool_recycle=POOL_RECYCLE, **DB_CONFIG)
+    try:
+        yield
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+app = Starlette(
+    routes=[
+        Route("/data/objets", get_objets),
+        Route("/data/objets/aggregate", get_objets_aggregate),
+        Route("/data/objets/quantiles", get_objets_quantiles),
+        Route("/data/satisfaction", get_satisfaction),
+        Route("/data/satisfaction/aggregate", get_satisfaction_aggregate),
+        Route("/data/categories", get_categories),
+        Route("/stats/pool", get_pool_stats),
+        Route("/stats/cache", get_cache_stats),
+    ],
+    exception_handlers={
+        HTTPException: handle_http_exception,
+        PoolTimeout: handle_pool_timeout,
+        backend.PoolTimeout: handle_pool_timeout,  # pool de backend.py (quantiles)
+        quantiles.IndexNotReady: handle_index_not_ready,
+    },
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, port=int(os.environ.get("PORT", 8000)))
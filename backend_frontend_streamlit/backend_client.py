@@ -0,0 +1,347 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import columnar
+from schemas import apply_schema, concat_frames, schema_for
+
+# Nombre de lignes accumulées avant de construire un DataFrame intermédiaire en mode streaming
+STREAM_FRAME_ROWS = 50000
+
+# Formats demandés au backend : Arrow IPC en priorité si pyarrow est installé, JSON sinon
+ACCEPT_HEADER = (
+    f"{columnar.ARROW_MIMETYPE}, application/json;q=0.5" if columnar.available() else "application/json"
+)
+
+# Nombre de réponses conservées pour les requêtes conditionnelles (If-None-Match)
+ETAG_STORE_SIZE = 32
+
+# Délais (secondes) : établissement de la connexion, puis attente maximale entre deux paquets reçus
+REQUEST_TIMEOUT = (3.05, 60)
+
+# Nouvelles tentatives (avec attente exponentielle) sur erreur de connexion et sur 502/503/504
+# (le backend répond 503 quand son pool de connexions MySQL est saturé)
+REQUEST_RETRIES = 3
+
+# Nombre de chargements exécutés en parallèle par fetch_concurrently
+FETCH_WORKERS = 4
+
+
+# Session HTTP partagée : les connexions TCP vers le backend sont gardées ouvertes (keep-alive) et
+# réutilisées par toutes les requêtes, y compris celles lancées en parallèle depuis plusieurs threads.
+def create_session(retries=REQUEST_RETRIES, pool_size=FETCH_WORKERS * 2):
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = create_session()
+
+
+class EtagStore:
+    """Dernière copie reçue de chaque requête avec son ETag (LRU, partagé par toutes les sessions)."""
+
+    def __init__(self, max_entries=ETAG_STORE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (etag, DataFrame)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, data):
+        if not etag:
+            return
+        with self._lock:
+            self._entries[key] = (etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+etag_store = EtagStore()
+
+
+# Clé hachable identifiant une requête (endpoint + paramètres normalisés)
+def request_key(endpoint, params=None, stream=False):
+    items = []
+    for name, value in sorted((params or {}).items()):
+        if isinstance(value, (list, tuple)):
+            value = tuple(value)
+        items.append((name, value))
+    return endpoint, tuple(items), stream
+
+
+# Parcourt une réponse NDJSON ligne par ligne et produit des DataFrames de STREAM_FRAME_ROWS lignes :
+# le client commence à parser dès le premier paquet reçu, sans attendre la fin de la réponse.
+# Chaque paquet est typé (schéma de l'endpoint) dès sa construction pour garder la mémoire basse.
+def iter_ndjson_frames(response, frame_rows=STREAM_FRAME_ROWS, schema=None):
+    batch = []
+    for line in response.iter_lines():
+        if not line:
+            continue
+        batch.append(json.loads(line))
+        if len(batch) >= frame_rows:
+            yield apply_schema(pd.DataFrame(batch), schema)
+            batch = []
+    if batch:
+        yield apply_schema(pd.DataFrame(batch), schema)
+
+
+# Consommation incrémentale d'un endpoint : la réponse est diffusée par le backend (Arrow IPC si
+# pyarrow est installé, NDJSON sinon) et rendue en DataFrames typés d'environ frame_rows lignes, au
+# fil de la réception ; seul le paquet en cours est en mémoire (erreurs requests propagées).
+def iter_frames(endpoint, params=None, frame_rows=STREAM_FRAME_ROWS):
+    request_params = dict(params or {})
+    request_params["stream"] = "ndjson"
+    schema = schema_for(endpoint)
+    headers = {"Accept": ACCEPT_HEADER}
+    with session.get(endpoint, params=request_params, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        # Format reçu noté dans frame.attrs["format"] (l'empreinte "avant" typage en dépend)
+        if content_type == columnar.ARROW_MIMETYPE:
+            received = "Arrow"
+            frames = (apply_schema(frame, schema) for frame in columnar.iter_arrow(response.raw, frame_rows))
+        else:
+            received = "JSON"
+            frames = iter_ndjson_frames(response, frame_rows, schema)
+        for frame in frames:
+            frame.attrs["format"] = received
+            yield frame
+
+
+# Récupère un endpoint sous forme de DataFrame (les erreurs requests sont propagées à l'appelant).
+# La requête est conditionnelle : si les données n'ont pas changé (304), la copie locale est réutilisée
+# (une copie est renvoyée pour que l'appelant puisse la modifier sans altérer la référence).
+# conditional=False : pas de copie conservée (requêtes à usage unique).
+# stream=True : le backend diffuse la réponse sans la matérialiser ; le résultat renvoyé est tout de même
+# un DataFrame complet (pour traiter la réponse paquet par paquet, voir iter_frames).
+def fetch_dataframe(endpoint, params=None, stream=False, conditional=True):
+    key = request_key(endpoint, params, stream)
+    request_params = dict(params or {})
+    if stream:
+        request_params["stream"] = "ndjson"
+    stored = etag_store.get(key) if conditional else None
+    headers = {"Accept": ACCEPT_HEADER}
+    if stored:
+        headers["If-None-Match"] = stored[0]
+
+    with session.get(endpoint, params=request_params, headers=headers, stream=stream, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304 and stored is not None:
+            return stored[1].copy()
+        response.raise_for_status()
+        # Colonnes typées selon le schéma de l'endpoint (voir schemas.py) ; rapport mémoire dans data.attrs
+        schema = schema_for(endpoint)
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type == columnar.ARROW_MIMETYPE:
+            # Flux Arrow : lu au fil de l'eau en mode stream, sans passer par JSON
+            data = apply_schema(columnar.read_arrow(response.raw if stream else response.content), schema)
+        elif content_type == columnar.PARQUET_MIMETYPE:
+            data = apply_schema(columnar.read_parquet(response.content), schema)
+        elif stream:
+            data = concat_frames(list(iter_ndjson_frames(response, schema=schema)))
+        else:
+            data = apply_schema(pd.DataFrame(response.json()), schema)
+        if conditional:
+            etag_store.put(key, response.headers.get("ETag"), data)
+    return data
+
+
+def _timed(job):
+    start = time.perf_counter()
+    try:
+        return job(), None, time.perf_counter() - start
+    except requests.RequestException as error:
+        return None, error, time.perf_counter() - start
+
+
+def fetch_concurrently(jobs, max_workers=FETCH_WORKERS, initializer=None):
+    """Exécute en parallèle des chargements indépendants (fonctions sans argument, ex. fetch_dataframe partiel).
+
+    jobs : {nom: fonction}. Renvoie trois dicts indexés par nom : résultats, erreurs requests
+    (le chargement concerné est absent des résultats) et durées en secondes ; la durée totale
+    réelle, à comparer à la somme des durées, est sous la clé "total".
+    initializer : fonction appelée au démarrage de chaque thread (ex. contexte Streamlit).
+    """
+    results, errors, timings = {}, {}, {}
+    start = time.perf_counter()
+    if jobs:
+        workers = min(max_workers, len(jobs))
+        with ThreadPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+            futures = {name: executor.submit(_timed, job) for name, job in jobs.items()}
+            for name, future in futures.items():
+                result, error, elapsed = future.result()
+                timings[name] = elapsed
+                if error is None:
+                    results[name] = result
+                else:
+                    errors[name] = error
+    timings["total"] = time.perf_counter() - start
+    return results, errors, timings
+
+
+class DeltaStore:
+    """Copie locale des détections, complétée par synchronisation incrémentale.
+
+    La table objets est alimentée en ajout seulement : chaque refresh() ne demande que les lignes
+    d'id supérieur au dernier id reçu (paramètre since_id), lus paquet par paquet (iter_frames) :
+    chaque paquet est ajouté à la liste des blocs reçus et intégré aux agrégats enregistrés avec
+    add_aggregate() dès sa réception, sans que le delta soit jamais matérialisé en entier.
+    Le coût d'une actualisation dépend donc du nombre de nouvelles détections, pas de la taille de la
+    table : les blocs ne sont concaténés qu'à la lecture de data, dans un nouveau DataFrame.
+    """
+
+    def __init__(self, endpoint, params=None, prepare=None):
+        self.endpoint = endpoint
+        # Fonction appliquée une seule fois à chaque paquet reçu (ex. calcul des clés de période)
+        self.prepare = prepare
+        self.params = dict(params or {})
+        columns = self.params.get("colonnes")
+        if columns and "id" not in columns.split(","):
+            # L'id sert de curseur de synchronisation
+            self.params["colonnes"] = "id," + columns
+        self._chunks = []  # DataFrames reçus, concaténés à la demande par data
+        self.rows = 0
+        self.max_id = None
+        # Incrémenté à chaque changement des données (delta non vide, rechargement) : clé de cache des
+        # résultats dérivés, max_id seul ne change pas si un rechargement retrouve le même id maximal
+        self.generation = 0
+        self.last_refresh = None
+        self.last_delta_rows = 0
+        # Empreinte mémoire cumulée des données reçues, avant et après typage
+        self.memory_report = {"avant": 0, "apres": 0, "format": None}
+        self._aggregates = {}  # nom -> (colonnes de regroupement, spécification groupby.agg, DataFrame agrégé)
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        """Détections reçues, en un seul DataFrame (partagé : ne pas le modifier)."""
+        with self._lock:
+            return self._consolidate()
+
+    @data.setter
+    def data(self, frame):
+        with self._lock:
+            self._chunks = [] if frame.empty else [frame]
+            self.rows = len(frame)
+            self.generation += 1
+
+    def _consolidate(self):
+        if not self._chunks:
+            return pd.DataFrame()
+        if len(self._chunks) > 1:
+            self._chunks = [concat_frames(self._chunks)]
+        return self._chunks[0]
+
+    def add_aggregate(self, name, by, sum_columns=(), min_columns=(), max_columns=()):
+        """Enregistre un agrégat (nombre de lignes, sommes, min et max par groupe) maintenu incrémentalement."""
+        spec = {"nb": (by[0], "size")}
+        for column in sum_columns:
+            spec[f"somme_{column}"] = (column, "sum")
+        for column in min_columns:
+            spec[f"min_{column}"] = (column, "min")
+        for column in max_columns:
+            spec[f"max_{column}"] = (column, "max")
+        with self._lock:
+            self._aggregates[name] = (list(by), spec, self._aggregate(self._consolidate(), by, spec))
+
+    def aggregate(self, name):
+        return self._aggregates[name][2]
+
+    @staticmethod
+    def _aggregate(frame, by, spec):
+        if frame.empty:
+            return pd.DataFrame()
+        return frame.groupby(by, observed=True, dropna=False).agg(**spec)
+
+    # Fusion d'un agrégat existant et de l'agrégat d'un delta : les comptes et sommes s'additionnent,
+    # les min et max se combinent ; seuls les groupes présents dans le delta changent de valeur.
+    @staticmethod
+    def _merge(current, delta):
+        if current.empty:
+            return delta
+        index = current.index.union(delta.index)
+        current = current.reindex(index)
+        delta = delta.reindex(index)
+        merged = pd.DataFrame(index=index)
+        for column in current.columns:
+            if column.startswith("min_"):
+                merged[column] = np.fmin(current[column], delta[column])
+            elif column.startswith("max_"):
+                merged[column] = np.fmax(current[column], delta[column])
+            else:
+                merged[column] = current[column].fillna(0) + delta[column].fillna(0)
+        return merged
+
+    # Un paquet du delta : typé à la réception, préparé, conservé comme bloc et intégré aux agrégats
+    # (seuls les groupes présents dans le paquet sont modifiés)
+    def _add_frame(self, frame):
+        memory = frame.attrs.get("memoire")
+        if memory:
+            self.memory_report["avant"] += memory["avant"]
+            self.memory_report["apres"] += memory["apres"]
+            self.memory_report["format"] = frame.attrs.get("format")
+        if frame.empty:
+            return
+        if self.prepare is not None:
+            frame = self.prepare(frame)
+        self._chunks.append(frame)
+        self.rows += len(frame)
+        self.generation += 1
+        self.max_id = int(frame["id"].max()) if self.max_id is None else max(self.max_id, int(frame["id"].max()))
+        for name, (by, spec, current) in self._aggregates.items():
+            self._aggregates[name] = (by, spec, self._merge(current, self._aggregate(frame, by, spec)))
+
+    def refresh(self, max_age=None):
+        """Récupère les nouvelles détections ; max_age (secondes) évite de réinterroger le backend trop souvent.
+
+        Renvoie le nombre de lignes ajoutées. Les paquets sont triés par id : si la lecture est
+        interrompue, les paquets déjà reçus restent acquis et la suivante reprend après eux.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if max_age is not None and self.last_refresh is not None and now - self.last_refresh < max_age:
+                return 0
+            # since_id toujours transmis (0 au premier chargement) : le backend trie alors par id
+            params = {**self.params, "since_id": self.max_id if self.max_id is not None else 0}
+            added = 0
+            for frame in iter_frames(self.endpoint, params=params):
+                self._add_frame(frame)
+                added += len(frame)
+            self.last_refresh = now
+            self.last_delta_rows = added
+            return added
+
+    def reload(self):
+        """Recharge entièrement les données (après suppression ou modification de lignes côté base)."""
+        with self._lock:
+            self._chunks = []
+            self.rows = 0
+            self.generation += 1
+            self.max_id = None
+            self.last_refresh = None
+            self.memory_report = {"avant": 0, "apres": 0, "format": None}
+            self._aggregates = {name: (by, spec, pd.DataFrame()) for name, (by, spec, _) in self._aggregates.items()}
+        return self.refresh()
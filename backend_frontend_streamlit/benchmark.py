@@ -0,0 +1,352 @@
+import argparse
+import datetime
+import importlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+import columnar
+from backend_client import DeltaStore
+from cube import DetectionCube
+from periodes import GRANULARITES, PERIOD_KEY_COLUMNS, add_period_keys, label_periods, parse_periods
+from schemas import apply_schema, memory_bytes, schema_for
+
+# Banc d'essai du backend et des préparations de données des tableaux de bord.
+#
+#   python benchmark.py executer --tailles 1000 100000 --sortie resultats.json
+#   python benchmark.py comparer avant.json apres.json
+#   python benchmark.py debit http://localhost:5000 http://localhost:8000 --concurrence 1 10 50 200
+#
+# Pour chaque volume, la base du banc d'essai (MySQL local, les requêtes du backend utilisent des
+# fonctions MySQL comme DATE_FORMAT) est remplie par generer_données.py, puis chaque endpoint est
+# appelé via le client de test Flask (sans réseau) et chaque étape de préparation de frontend.py
+# est chronométrée sur les données reçues.
+
+# Volumes de détections mesurés par défaut
+DEFAULT_SIZES = [1000, 100000, 1000000, 10000000]
+
+# Base dédiée : le générateur vide les tables avant de les remplir
+BENCHMARK_DATABASE = "prediction_bench"
+
+# Sélection utilisée par les requêtes mesurées (une catégorie, comme le tableau de bord par défaut)
+CATEGORY = "Transport"
+TYPES = ["car", "bus"]
+OBJETS_COLUMNS = "type_objet,temps_reponse,date_detection,categorie"
+
+# Endpoints mesurés : (nom, chemin avec paramètres, en-tête Accept)
+ENDPOINTS = [
+    ("categories", "/data/categories", None),
+    ("objets_json", f"/data/objets?categorie={CATEGORY}&colonnes={OBJETS_COLUMNS}", "application/json"),
+    ("objets_ndjson", f"/data/objets?categorie={CATEGORY}&colonnes={OBJETS_COLUMNS}&stream=ndjson", "application/json"),
+    ("objets_arrow", f"/data/objets?categorie={CATEGORY}&colonnes={OBJETS_COLUMNS}", columnar.ARROW_MIMETYPE),
+    ("objets_aggregate", f"/data/objets/aggregate?granularite=Mois&categorie={CATEGORY}", None),
+    ("satisfaction", f"/data/satisfaction?categorie={CATEGORY}", None),
+    ("satisfaction_aggregate", f"/data/satisfaction/aggregate?granularite=Mois&categorie={CATEGORY}", None),
+    ("satisfaction_aggregate_par_type",
+     f"/data/satisfaction/aggregate?granularite=Mois&categorie={CATEGORY}&par_type=1", None),
+]
+
+
+def _get(client, path, accept):
+    headers = {"Accept": accept} if accept else {}
+    return client.get(path, headers=headers, buffered=False)
+
+
+# Consomme une réponse morceau par morceau : (statut, octets, délai du premier octet, durée totale)
+def _consume(client, path, accept):
+    start = time.perf_counter()
+    response = _get(client, path, accept)
+    first_byte = None
+    size = 0
+    try:
+        for chunk in response.iter_encoded():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(chunk)
+    finally:
+        response.close()
+    return response.status_code, size, first_byte, time.perf_counter() - start
+
+
+def measure_endpoint(backend, client, path, accept, repeats):
+    """Latence à froid (cache de résultats vidé), latence avec cache, taille de la réponse et pic mémoire."""
+    latencies, first_bytes = [], []
+    status, size = None, 0
+    for _ in range(repeats):
+        backend.result_cache.clear()
+        status, size, first_byte, elapsed = _consume(client, path, accept)
+        if status != 200:
+            return {"erreur": f"HTTP {status}"}
+        latencies.append(elapsed)
+        first_bytes.append(first_byte or elapsed)
+
+    # Même requête servie par le cache de résultats (réponses non diffusées seulement)
+    _, _, _, cached = _consume(client, path, accept)
+
+    # Pic mémoire Python pendant une requête à froid (mesuré à part : tracemalloc ralentit l'exécution)
+    backend.result_cache.clear()
+    tracemalloc.start()
+    try:
+        _consume(client, path, accept)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "latence_mediane_s": statistics.median(latencies),
+        "latence_max_s": max(latencies),
+        "premier_octet_median_s": statistics.median(first_bytes),
+        "latence_cache_s": cached,
+        "octets": size,
+        "pic_memoire_octets": peak,
+    }
+
+
+def _timed(step, repeats):
+    durations = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = step()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), result
+
+
+def _read(client, path, accept):
+    response = client.get(path, headers={"Accept": accept} if accept else {})
+    if response.status_code != 200:
+        return pd.DataFrame()
+    if response.mimetype == columnar.ARROW_MIMETYPE:
+        frame = columnar.read_arrow(response.get_data())
+    else:
+        frame = pd.DataFrame(response.get_json())
+    return apply_schema(frame, schema_for(path.split("?")[0]))
+
+
+def measure_preparation(client, repeats):
+    """Durée médiane de chaque étape de préparation des données de frontend.py (mode local)."""
+    timings = {}
+    accept = columnar.ARROW_MIMETYPE if columnar.available() else "application/json"
+    path = f"/data/objets?categorie={CATEGORY}&colonnes=id,{OBJETS_COLUMNS}"
+    timings["decodage_objets"], objets = _timed(lambda: _read(client, path, accept), repeats)
+    if objets.empty:
+        return timings, 0
+    timings["cles_periode"], objets = _timed(lambda: add_period_keys(objets.copy()), repeats)
+
+    store = DeltaStore(path)
+    store.data = objets
+    for granularite in GRANULARITES:
+        timings[f"agregat_{granularite}"], _ = _timed(lambda: store.add_aggregate(
+            granularite,
+            by=[PERIOD_KEY_COLUMNS[granularite], "categorie", "type_objet"],
+            sum_columns=["temps_reponse"], min_columns=["temps_reponse"], max_columns=["temps_reponse"]
+        ), repeats)
+
+    granularite = "Mois"
+    aggregate = store.aggregate(granularite)
+    types = sorted(aggregate.index.get_level_values("type_objet").dropna().unique().astype(str))
+    satisfaction = _read(
+        client, f"/data/satisfaction/aggregate?granularite={granularite}&categorie={CATEGORY}&par_type=1", None
+    )
+
+    def build():
+        cube = DetectionCube.from_aggregate(aggregate, PERIOD_KEY_COLUMNS[granularite], [CATEGORY], types)
+        if not satisfaction.empty:
+            cube.add_satisfaction(
+                parse_periods(satisfaction["periode"], granularite), satisfaction["categorie"].astype(str),
+                satisfaction["type_objet"].astype(str), satisfaction["satisfait"], satisfaction["non_satisfait"]
+            )
+        return cube
+
+    timings["construction_cube"], cube = _timed(build, repeats)
+
+    def counts(types_objets=None):
+        frame = cube.slice([CATEGORY], types_objets)
+        return label_periods(frame[frame["nb"] > 0].copy(), granularite, key_column="cle_periode")
+
+    timings["section_nombre_objets"], _ = _timed(lambda: counts(TYPES), repeats)
+    timings["section_tendance"], _ = _timed(counts, repeats)
+    timings["section_taux_precision"], _ = _timed(lambda: label_periods(
+        cube.slice([CATEGORY], TYPES).dropna(subset=["taux_precision"]), granularite, key_column="cle_periode"
+    ), repeats)
+    return timings, memory_bytes(objets)
+
+
+def run(sizes, database, repeats, generate, processes):
+    # La base du banc d'essai doit être choisie avant l'import du backend (pool de connexions)
+    os.environ["DB_NAME"] = database
+    backend = importlib.import_module("backend")
+    generator = importlib.import_module("generer_données")
+    client = backend.app.test_client()
+
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "arrow": columnar.available(),
+        "repetitions": repeats,
+        "tailles": {},
+    }
+    for size in sizes:
+        print(f"--- {size:,} détections")
+        if generate:
+            # Même serveur et mêmes identifiants que le backend mesuré ; une erreur interrompt le banc
+            generator.insert_data(
+                config={key: value for key, value in backend.DB_CONFIG.items() if key != "cursorclass"},
+                nb_utilisateurs=max(1000, size // 100),
+                nb_objets=size,
+                nb_satisfactions=max(1000, size // 10),
+                seed=size,
+                processes=processes,
+            )
+        backend.data_version.invalidate()
+
+        endpoints = {}
+        for name, path, accept in ENDPOINTS:
+            if accept == columnar.ARROW_MIMETYPE and not columnar.available():
+                continue
+            endpoints[name] = measure_endpoint(backend, client, path, accept, repeats)
+            print(f"  {name} : {endpoints[name]}")
+        preparation, memory = measure_preparation(client, repeats)
+        for step, seconds in preparation.items():
+            print(f"  {step} : {seconds * 1000:.1f} ms")
+        results["tailles"][str(size)] = {
+            "endpoints": endpoints,
+            "preparation_s": preparation,
+            "memoire_objets_octets": memory,
+        }
+    return results
+
+
+# Débit d'un serveur déjà lancé (backend.py sous un serveur WSGI, backend_async.py sous uvicorn) :
+# concurrence clients enchaînent des requêtes JSON sur les endpoints pendant duree secondes.
+# Par défaut chaque requête porte un paramètre unique (ignoré par le backend) qui contourne le cache
+# des résultats : on mesure le service des requêtes SQL, pas celui du cache.
+def measure_throughput(url, concurrency, duration, bypass_cache=True):
+    paths = [path for _, path, accept in ENDPOINTS if accept != columnar.ARROW_MIMETYPE]
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            for path in itertools.islice(itertools.cycle(paths), index, None):
+                if time.perf_counter() >= deadline:
+                    break
+                separator = "&" if "?" in path else "?"
+                target = url + path + (f"{separator}_={next(counter)}" if bypass_cache else "")
+                start = time.perf_counter()
+                try:
+                    response = session.get(target, headers={"Accept": "application/json"}, timeout=60)
+                    response.content  # corps lu en entier, comme un tableau de bord
+                    ok = response.status_code == 200
+                except requests.RequestException:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return {
+        "requetes_par_s": len(latencies) / elapsed,
+        "latence_mediane_s": statistics.median(latencies) if latencies else None,
+        "latence_p95_s": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        "erreurs": sum(errors for _, errors in results),
+    }
+
+
+def run_throughput(urls, concurrencies, duration, bypass_cache):
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "duree_s": duration,
+        "sans_cache": bypass_cache,
+        "serveurs": {},
+    }
+    for url in urls:
+        results["serveurs"][url] = {}
+        for concurrency in concurrencies:
+            measures = measure_throughput(url, concurrency, duration, bypass_cache)
+            results["serveurs"][url][str(concurrency)] = measures
+            print(f"{url} x{concurrency} : {measures['requetes_par_s']:.1f} req/s, "
+                  f"médiane {measures['latence_mediane_s'] or 0:.3f} s, p95 {measures['latence_p95_s'] or 0:.3f} s, "
+                  f"{measures['erreurs']} erreurs")
+    return results
+
+
+# Valeurs comparées entre deux exécutions : (chemin lisible, valeur) pour chaque mesure numérique
+def _flatten(results):
+    values = {}
+    for size, measures in results["tailles"].items():
+        for name, metrics in measures["endpoints"].items():
+            for metric, value in metrics.items():
+                if isinstance(value, (int, float)):
+                    values[f"{size} / {name} / {metric}"] = value
+        for step, value in measures["preparation_s"].items():
+            values[f"{size} / preparation / {step}"] = value
+        values[f"{size} / memoire_objets_octets"] = measures["memoire_objets_octets"]
+    return values
+
+
+def compare(before, after):
+    """Affiche chaque mesure des deux exécutions et leur rapport (après / avant)."""
+    before_values, after_values = _flatten(before), _flatten(after)
+    for key in sorted(before_values.keys() & after_values.keys()):
+        old, new = before_values[key], after_values[key]
+        ratio = f"x{new / old:.2f}" if old else "-"
+        print(f"{key} : {old:.4g} -> {new:.4g} ({ratio})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai du backend et des tableaux de bord.")
+    commands = parser.add_subparsers(dest="commande", required=True)
+
+    execute = commands.add_parser("executer", help="mesure les volumes demandés")
+    execute.add_argument("--tailles", type=int, nargs="+", default=DEFAULT_SIZES, help="nombres de détections")
+    execute.add_argument("--base", default=BENCHMARK_DATABASE, help="base MySQL du banc d'essai (vidée !)")
+    execute.add_argument("--repetitions", type=int, default=5, help="mesures par endpoint et par étape")
+    execute.add_argument("--sans-generation", action="store_true", help="réutilise les données déjà en base")
+    execute.add_argument("--processus", type=int, default=None, help="processus du générateur")
+    execute.add_argument("--sortie", default=None, help="fichier JSON des résultats")
+
+    comparison = commands.add_parser("comparer", help="compare deux fichiers de résultats")
+    comparison.add_argument("avant")
+    comparison.add_argument("apres")
+
+    throughput = commands.add_parser("debit", help="débit de serveurs déjà lancés (ex. Flask et ASGI)")
+    throughput.add_argument("urls", nargs="+", help="adresses des serveurs, ex. http://localhost:8000")
+    throughput.add_argument("--concurrence", type=int, nargs="+", default=[1, 10, 50], help="clients simultanés")
+    throughput.add_argument("--duree", type=float, default=10, help="secondes de mesure par niveau")
+    throughput.add_argument("--avec-cache", action="store_true", help="laisse le cache des résultats répondre")
+    throughput.add_argument("--sortie", default=None, help="fichier JSON des résultats")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.commande == "comparer":
+        with open(args.avant, encoding="utf-8") as before, open(args.apres, encoding="utf-8") as after:
+            compare(json.load(before), json.load(after))
+    else:
+        if args.commande == "debit":
+            results = run_throughput(args.urls, args.concurrence, args.duree, not args.avec_cache)
+        else:
+            results = run(args.tailles, args.base, args.repetitions, not args.sans_generation, args.processus)
+        prefix = "debit" if args.commande == "debit" else "benchmark"
+        output = args.sortie or f"{prefix}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, ensure_ascii=False)
+        print(f"Résultats enregistrés dans {output}")
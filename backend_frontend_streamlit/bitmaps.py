@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+
+class BitmapIndex:
+    """Index bitmap des détections sur des colonnes à faible cardinalité (catégorie, type d'objet).
+
+    Chaque colonne est encodée par dictionnaire (valeur -> code entier) et chaque valeur reçoit un
+    bitmap de ses lignes (bits empaquetés, une ligne par bit). Une combinaison de filtres se résout
+    par OU entre les bitmaps des valeurs sélectionnées d'une colonne, puis ET entre les colonnes :
+    aucune chaîne n'est relue après la construction de l'index.
+    """
+
+    def __init__(self, frame, columns):
+        self.rows = len(frame)
+        self.dictionaries = {}  # colonne -> pd.Index des valeurs (code = position)
+        self.bitmaps = {}  # colonne -> tableau uint8 (valeurs x octets de lignes)
+        for column in columns:
+            codes, values = pd.factorize(frame[column], sort=True)  # valeur manquante : code -1
+            self.dictionaries[column] = pd.Index(values.astype(str))
+            self.bitmaps[column] = _bitmaps(codes, len(values), self.rows)
+
+    def encode(self, column, values):
+        """Codes des valeurs connues de column (les valeurs absentes des détections sont ignorées)."""
+        codes = self.dictionaries[column].get_indexer(pd.Index(values).astype(str))
+        return codes[codes >= 0]
+
+    def bitmap(self, column, values):
+        """Bitmap des lignes dont column vaut l'une des valeurs (OU des bitmaps des valeurs)."""
+        codes = self.encode(column, values)
+        if len(codes) == 0:
+            return np.zeros(self.bitmaps[column].shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[column][codes], axis=0)
+
+    def select(self, filters):
+        """Positions des lignes qui satisfont tous les filtres [(colonne, valeurs), ...] (ET)."""
+        mask = None
+        for column, values in filters:
+            bitmap = self.bitmap(column, values)
+            mask = bitmap if mask is None else mask & bitmap
+        if mask is None:
+            return np.arange(self.rows)
+        return np.flatnonzero(np.unpackbits(mask, count=self.rows))
+
+    def nbytes(self):
+        return sum(bitmaps.nbytes for bitmaps in self.bitmaps.values())
+
+
+# Un bitmap par code : les positions des lignes sont regroupées par code (tri stable), puis chaque
+# groupe est écrit dans son bitmap
+def _bitmaps(codes, size, rows):
+    bitmaps = np.zeros((size, (rows + 7) // 8), dtype=np.uint8)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(size + 1))
+    bits = np.zeros(rows, dtype=bool)
+    for code in range(size):
+        positions = order[bounds[code]:bounds[code + 1]]
+        bits[positions] = True
+        bitmaps[code] = np.packbits(bits)
+        bits[positions] = False
+    return bitmaps
+
+
+class CodeSet:
+    """Encodage par dictionnaire d'un ensemble fixe de valeurs, avec un masque d'entiers par groupe.
+
+    Sert aux correspondances statiques (types d'objets de chaque catégorie) : les valeurs d'une
+    sélection de groupes sont obtenues par OU des masques, dans l'ordre des codes.
+    """
+
+    def __init__(self, groups):
+        values = list(dict.fromkeys(value for members in groups.values() for value in members))
+        self.values = values
+        self.codes = {value: code for code, value in enumerate(values)}
+        self.masks = {
+            group: sum(1 << self.codes[value] for value in set(members))
+            for group, members in groups.items()
+        }
+
+    def mask(self, groups):
+        mask = 0
+        for group in groups:
+            mask |= self.masks.get(group, 0)
+        return mask
+
+    def decode(self, mask):
+        return [value for code, value in enumerate(self.values) if mask >> code & 1]
+
+    def members(self, groups):
+        return self.decode(self.mask(groups))
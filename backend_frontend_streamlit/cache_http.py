@@ -0,0 +1,172 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import pymysql
+from flask import make_response, request
+
+# MySQL 8 garde en cache les statistiques d'information_schema.TABLES (dont UPDATE_TIME) pendant
+# information_schema_stats_expiry secondes (86400 par défaut) : la session qui lit la version les
+# relit à chaque requête. Variable inconnue avant MySQL 8.0, où UPDATE_TIME n'est pas mis en cache.
+STATS_EXPIRY_SQL = "SET SESSION information_schema_stats_expiry = 0"
+
+
+class DataVersion:
+    """Version des données de chaque table, dérivée de (id max, date de mise à jour).
+
+    MAX(id) se lit dans la clé primaire sans parcours ; la date de mise à jour
+    (information_schema.TABLES.UPDATE_TIME, lue sans le cache de statistiques de MySQL 8, voir
+    STATS_EXPIRY_SQL) change aussi après une modification ou une suppression. UPDATE_TIME n'est pas
+    conservé au redémarrage de MySQL : la version change alors une fois de plus, sans conséquence.
+    Le calcul est mis en cache ttl secondes pour ne pas interroger MySQL à chaque requête HTTP, et un
+    seul calcul est en cours à la fois par table : les requêtes concurrentes attendent son résultat.
+    """
+
+    def __init__(self, get_connection, ttl=2.0):
+        self.get_connection = get_connection
+        self.ttl = ttl
+        self._lock = threading.Condition()
+        self._versions = {}  # table -> (instant du calcul, version, date de mise à jour)
+        self._computing = set()  # tables dont la version est en cours de calcul
+
+    def _compute(self, tables):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(STATS_EXPIRY_SQL)
+            except pymysql.MySQLError:
+                pass
+            placeholders = ", ".join(["%s"] * len(tables))
+            cursor.execute(f"""
+            SELECT TABLE_NAME AS nom, UPDATE_TIME AS mise_a_jour
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders});
+            """, tuple(tables))
+            update_times = {row["nom"]: row["mise_a_jour"] for row in cursor.fetchall()}
+            results = {}
+            for table in tables:
+                # Les noms de tables viennent du code (jamais de la requête HTTP)
+                cursor.execute(f"SELECT MAX(id) AS id_max FROM {table}")
+                row = cursor.fetchone()
+                update_time = update_times.get(table)
+                results[table] = (f"{row['id_max']}:{update_time}", update_time)
+        return results
+
+    def get(self, tables):
+        """Renvoie (version combinée des tables, date de dernière mise à jour connue ou None)."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                stale = [t for t in tables if t not in self._versions or now - self._versions[t][0] > self.ttl]
+                if not any(t in self._computing for t in stale):
+                    break
+                self._lock.wait()
+            self._computing.update(stale)
+        if stale:
+            try:
+                computed = self._compute(stale)
+                with self._lock:
+                    for table, (version, update_time) in computed.items():
+                        self._versions[table] = (now, version, update_time)
+            finally:
+                with self._lock:
+                    self._computing.difference_update(stale)
+                    self._lock.notify_all()
+        with self._lock:
+            entries = [self._versions[t] for t in tables]
+        version = "|".join(f"{t}={entry[1]}" for t, entry in zip(tables, entries))
+        update_times = [entry[2] for entry in entries if entry[2] is not None]
+        return version, (max(update_times) if update_times else None)
+
+    def invalidate(self):
+        with self._lock:
+            self._versions.clear()
+
+
+class ResultCache:
+    """Cache LRU des corps de réponse, borné en nombre d'entrées et en octets."""
+
+    def __init__(self, max_entries=128, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (etag, corps, mimetype)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, etag, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (etag, body, mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_body, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted_body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entrees": len(self._entries),
+                "octets": self._bytes,
+                "succes": self.hits,
+                "echecs": self.misses,
+            }
+
+
+def conditional(data_version, result_cache, *tables):
+    """Décorateur de route : ETag / Last-Modified, réponse 304 et cache des résultats.
+
+    L'ETag dépend de la version des tables lues, du chemin, des paramètres et de l'en-tête Accept :
+    une requête avec If-None-Match à jour reçoit 304 sans qu'aucune requête SQL de données soit exécutée.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version, last_modified = data_version.get(tables)
+            key = (request.path, request.query_string, request.headers.get("Accept", ""))
+            etag = hashlib.sha1(f"{version}|{key}".encode("utf-8")).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                cached = result_cache.get(key, etag)
+                if cached is not None:
+                    response = make_response(cached[1])
+                    response.mimetype = cached[2]
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    # Les réponses diffusées en continu ne sont pas mises en cache (corps non matérialisé)
+                    if response.status_code == 200 and not response.is_streamed:
+                        result_cache.put(key, etag, response.get_data(), response.mimetype)
+
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                # Le client peut garder sa copie mais doit la revalider à chaque utilisation
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapper
+    return decorator
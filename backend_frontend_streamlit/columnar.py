@@ -0,0 +1,135 @@
+import io
+
+# pyarrow est optionnel : sans lui, le backend et les frontends restent en JSON
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Codes de type des colonnes MySQL (cursor.description) ; absent côté client, qui ne fait que lire
+try:
+    from pymysql.constants import FIELD_TYPE
+except ImportError:
+    FIELD_TYPE = None
+
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+
+
+def available():
+    return pa is not None
+
+
+# Type Arrow de chaque code de type MySQL. Les DECIMAL MySQL (SUM, AVG...) sont convertis en
+# float64, plus simple à exploiter côté pandas ; les textes (VARCHAR, TEXT, ENUM...) en chaînes.
+def _mysql_types():
+    if pa is None or FIELD_TYPE is None:
+        return {}
+    types = {}
+    for code in (FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.INT24, FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR):
+        types[code] = pa.int64()
+    for code in (FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE, FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL):
+        types[code] = pa.float64()
+    for code in (FIELD_TYPE.DATE, FIELD_TYPE.NEWDATE):
+        types[code] = pa.date32()
+    for code in (FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP):
+        types[code] = pa.timestamp("us")
+    types[FIELD_TYPE.TIME] = pa.duration("us")
+    for code in (
+        FIELD_TYPE.VARCHAR, FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING, FIELD_TYPE.ENUM, FIELD_TYPE.SET, FIELD_TYPE.JSON,
+        FIELD_TYPE.TINY_BLOB, FIELD_TYPE.MEDIUM_BLOB, FIELD_TYPE.LONG_BLOB, FIELD_TYPE.BLOB
+    ):
+        types[code] = pa.string()
+    types[FIELD_TYPE.NULL] = pa.null()
+    return types
+
+MYSQL_TYPES = _mysql_types()
+
+
+# Schéma du flux fixé d'après cursor.description, avant la première ligne : une colonne vide
+# (NULL) ou entière dans le premier paquet ne contraint pas le type des paquets suivants.
+# Les types inconnus (BIT, GEOMETRY...) sont transmis en binaire.
+def _schema(description):
+    return pa.schema([
+        pa.field(column[0], MYSQL_TYPES.get(column[1], pa.binary())) for column in description
+    ])
+
+
+# Construit une table Arrow à partir d'un paquet de lignes (tuples) d'un curseur, dans le schéma du flux
+def _table(schema, rows):
+    arrays = [pa.array([row[i] for row in rows]).cast(field.type) for i, field in enumerate(schema)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+# Diffuse un curseur au format Arrow IPC (flux) : chaque paquet de chunk_size lignes devient un
+# RecordBatch envoyé dès qu'il est prêt, sans jamais matérialiser le résultat complet.
+def arrow_stream(cursor, chunk_size):
+    schema = _schema(cursor.description)
+    sink = io.BytesIO()
+    writer = None
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        table = _table(schema, rows)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, schema)
+        for batch in table.to_batches():
+            writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, schema)
+    writer.close()
+    yield sink.getvalue()
+
+
+# Sérialise un curseur en Parquet (le format exige un pied de fichier : la réponse est matérialisée)
+def parquet_bytes(cursor, chunk_size):
+    schema = _schema(cursor.description)
+    sink = io.BytesIO()
+    writer = None
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        table = _table(schema, rows)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_table(table)
+    if writer is None:
+        writer = pq.ParquetWriter(sink, schema)
+    writer.close()
+    return sink.getvalue()
+
+
+# Lecture côté client d'une réponse Arrow IPC (objet fichier ou octets) en DataFrame pandas.
+# Les dates restent en datetime64 et les colonnes numériques sans valeurs manquantes sont converties sans copie.
+def read_arrow(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = pa.py_buffer(source)
+    return pa.ipc.open_stream(source).read_all().to_pandas(date_as_object=False)
+
+
+# Lecture côté client d'un flux Arrow IPC par paquets d'environ frame_rows lignes : chaque DataFrame
+# est produit dès que ses RecordBatch sont reçus, sans matérialiser le flux complet.
+def iter_arrow(source, frame_rows):
+    reader = pa.ipc.open_stream(source)
+    batches = []
+    rows = 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows >= frame_rows:
+            yield pa.Table.from_batches(batches, schema=reader.schema).to_pandas(date_as_object=False)
+            batches = []
+            rows = 0
+    if batches:
+        yield pa.Table.from_batches(batches, schema=reader.schema).to_pandas(date_as_object=False)
+
+
+def read_parquet(content):
+    return pq.read_table(pa.py_buffer(content)).to_pandas(date_as_object=False)
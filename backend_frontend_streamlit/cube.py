@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+
+class DetectionCube:
+    """Cube dense (période x catégorie x type d'objet) des mesures des tableaux de bord.
+
+    Mesures par cellule : nombre de détections, somme / min / max de temps_reponse, satisfaits et
+    non satisfaits. Les dimensions sont petites (quelques centaines de périodes, 9 catégories,
+    ~80 types) : un filtre sur les catégories et les types se résout par des masques booléens
+    sur deux axes puis une somme, en temps constant quel que soit le nombre de détections.
+    """
+
+    def __init__(self, period_keys, categories, types):
+        self.period_keys = np.asarray(sorted(period_keys), dtype="int64")
+        self.categories = list(categories)
+        self.types = list(types)
+        shape = (len(self.period_keys), len(self.categories), len(self.types))
+        self.nb = np.zeros(shape, dtype="int64")
+        self.somme = np.zeros(shape, dtype="float64")
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.satisfait = np.zeros(shape, dtype="float64")
+        self.non_satisfait = np.zeros(shape, dtype="float64")
+
+    @staticmethod
+    def _codes(values, dimension):
+        # Position de chaque valeur dans la dimension (-1 si absente)
+        return pd.Index(dimension).get_indexer(pd.Index(values))
+
+    def _cells(self, period_keys, categories, types):
+        p = self._codes(np.asarray(period_keys, dtype="int64"), self.period_keys)
+        c = self._codes(categories, self.categories)
+        t = self._codes(types, self.types)
+        valid = (p >= 0) & (c >= 0) & (t >= 0)
+        return p[valid], c[valid], t[valid], valid
+
+    @classmethod
+    def from_aggregate(cls, aggregate, key_column, categories, types):
+        """Construit le cube à partir d'un agrégat (clé de période, categorie, type_objet) de DeltaStore."""
+        frame = aggregate.reset_index().dropna(subset=[key_column])
+        keys = frame[key_column].astype("int64").to_numpy()
+        cube = cls(np.unique(keys), categories, types)
+        p, c, t, valid = cube._cells(keys, frame["categorie"].astype(str), frame["type_objet"].astype(str))
+        # Chaque groupe de l'agrégat est unique : une affectation directe suffit
+        cube.nb[p, c, t] = frame["nb"].to_numpy()[valid]
+        cube.somme[p, c, t] = frame["somme_temps_reponse"].to_numpy()[valid]
+        cube.min[p, c, t] = frame["min_temps_reponse"].to_numpy()[valid]
+        cube.max[p, c, t] = frame["max_temps_reponse"].to_numpy()[valid]
+        return cube
+
+    def add_satisfaction(self, period_keys, categories, types, satisfait, non_satisfait):
+        """Ajoute la satisfaction pré-agrégée (voir /data/satisfaction/aggregate?par_type=1)."""
+        period_keys = np.asarray(period_keys, dtype="int64")
+        p, c, t, valid = self._cells(period_keys, categories, types)
+        np.add.at(self.satisfait, (p, c, t), np.asarray(satisfait, dtype="float64")[valid])
+        np.add.at(self.non_satisfait, (p, c, t), np.asarray(non_satisfait, dtype="float64")[valid])
+
+    def _masks(self, categories, types):
+        category_mask = np.ones(len(self.categories), dtype=bool) if not categories else np.isin(self.categories, list(categories))
+        type_mask = np.ones(len(self.types), dtype=bool) if not types else np.isin(self.types, list(types))
+        return category_mask, type_mask
+
+    def slice(self, categories=None, types=None):
+        """Mesures par (période, catégorie) pour les catégories et types sélectionnés (None = tous).
+
+        Renvoie un DataFrame long : cle_periode, categorie, nb, somme_temps_reponse, moyenne_temps_reponse,
+        min_temps_reponse, max_temps_reponse, satisfait, non_satisfait, taux_precision.
+        """
+        category_mask, type_mask = self._masks(categories, types)
+        selected_categories = [c for c, keep in zip(self.categories, category_mask) if keep]
+
+        def reduce(array, how):
+            return how(array[:, category_mask][:, :, type_mask], axis=2)
+
+        nb = reduce(self.nb, np.sum)
+        somme = reduce(self.somme, np.sum)
+        minimum = reduce(self.min, np.min) if type_mask.any() else np.full(nb.shape, np.inf)
+        maximum = reduce(self.max, np.max) if type_mask.any() else np.full(nb.shape, -np.inf)
+        satisfait = reduce(self.satisfait, np.sum)
+        non_satisfait = reduce(self.non_satisfait, np.sum)
+
+        n_periods, n_categories = nb.shape
+        frame = pd.DataFrame({
+            "cle_periode": np.repeat(self.period_keys, n_categories),
+            "categorie": np.tile(selected_categories, n_periods) if n_categories else np.array([], dtype=object),
+            "nb": nb.ravel(),
+            "somme_temps_reponse": somme.ravel(),
+            "min_temps_reponse": np.where(nb > 0, minimum, np.nan).ravel(),
+            "max_temps_reponse": np.where(nb > 0, maximum, np.nan).ravel(),
+            "satisfait": satisfait.ravel(),
+            "non_satisfait": non_satisfait.ravel(),
+        })
+        frame = frame[(frame["nb"] > 0) | (frame["satisfait"] + frame["non_satisfait"] > 0)].reset_index(drop=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame["moyenne_temps_reponse"] = frame["somme_temps_reponse"] / frame["nb"].replace(0, np.nan)
+            frame["taux_precision"] = 100 * frame["satisfait"] / (frame["satisfait"] + frame["non_satisfait"]).replace(0, np.nan)
+        return frame
+
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.nb, self.somme, self.min, self.max, self.satisfait, self.non_satisfait))
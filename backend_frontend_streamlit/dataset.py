@@ -0,0 +1,315 @@
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+import requests
+import pandas as pd
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from backend_client import fetch_concurrently, fetch_dataframe
+from bitmaps import BitmapIndex, CodeSet
+from perf import cache_miss
+from periodes import PERIOD_KEY_COLUMNS, add_period_keys, label_periods
+
+# Couche de données commune aux tableaux de bord (frontend.py, frontend2.py, frontend3.py) :
+# chargement depuis le backend, correspondance catégories / types d'objets et préparation des
+# détections (dates, clés de période), faites une seule fois ici plutôt que dans chaque page.
+#
+# Les sections décrivent ce dont elles ont besoin par un plan paresseux :
+#
+#   objets = data.detections(OBJETS_COLUMNS, categories)
+#   objets.where("type_objet", types).count(granularite="Mois").collect()
+#
+# Chaque étape d'un plan est identifiée par sa clé (étapes précédentes comprises) : deux sections
+# qui partagent un préfixe (détections chargées et préparées, détections filtrées par type...)
+# ne le calculent qu'une fois. Les résultats sont partagés et ne doivent pas être modifiés.
+
+BACKEND_URL = "http://localhost:5000"
+OBJETS_ENDPOINT = f"{BACKEND_URL}/data/objets"
+QUANTILES_ENDPOINT = f"{BACKEND_URL}/data/objets/quantiles"
+
+# Durée de vie (secondes) des données en cache (réponses du backend et résultats des plans)
+REFRESH_INTERVAL = 30
+
+# Nombre maximal de résultats de plans conservés par session
+PLAN_CACHE_ENTRIES = 64
+
+# Mapping des types d'objets aux catégories
+CATEGORY_MAPPING = {
+    "Transport": ["bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck", "boat"],
+    "Signalisation et Infrastructure": ["traffic light", "fire hydrant", "stop sign", "parking meter", "bench"],
+    "Animaux": ["bird", "cat", "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe"],
+    "Accessoires personnels": ["backpack", "umbrella", "handbag", "tie", "suitcase"],
+    "Sports et Loisirs": ["frisbee", "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket"],
+    "Cuisine et Nourriture": ["bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake"],
+    "Mobilier": ["chair", "sofa", "pottedplant", "bed", "diningtable", "toilet"],
+    "Électronique": ["tvmonitor", "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator"],
+    "Lecture et Décoration": ["book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush"]
+}
+
+# Liste de tous les types d'objets
+CLASS_NAMES = sorted(set(obj for category in CATEGORY_MAPPING.values() for obj in category))
+
+# Types d'objets encodés par des entiers, avec le masque des types de chaque catégorie
+CATEGORY_TYPES = CodeSet(CATEGORY_MAPPING)
+
+# Colonnes des détections indexées par bitmap (filtres des sections)
+INDEXED_COLUMNS = ["categorie", "type_objet"]
+
+
+# Types d'objets des catégories sélectionnées (OU des masques des catégories, dans l'ordre du mapping)
+def types_of(categories):
+    return CATEGORY_TYPES.members(categories)
+
+
+# Fonction pour récupérer les données depuis Flask (avec cache)
+# (params : filtres et projection appliqués par MySQL ; stream=True : réponse diffusée par le backend,
+# reçue en entier)
+# À expiration du cache, la requête est conditionnelle : une réponse 304 réutilise la copie locale.
+# Les erreurs ne sont pas mises en cache : elles sont propagées à l'appelant.
+@st.cache_data(ttl=REFRESH_INTERVAL, show_spinner=False)
+def fetch_backend(endpoint, params=None, stream=False):
+    cache_miss()
+    return fetch_dataframe(endpoint, params=params, stream=stream)
+
+def load_data_from_backend(endpoint, params=None, stream=False, perf=None):
+    measure = perf.measure("chargement", endpoint.replace(BACKEND_URL, ""), cached=True) if perf else contextlib.nullcontext()
+    try:
+        with measure:
+            return fetch_backend(endpoint, params=params, stream=stream)
+    except requests.RequestException as e:
+        st.error(f"Erreur lors de la récupération des données : {e}")
+        return pd.DataFrame()
+
+
+# Chargements indépendants exécutés en parallèle sur les connexions keep-alive partagées (voir
+# backend_client) ; un chargement en erreur donne un DataFrame vide, comme load_data_from_backend.
+# Les threads reçoivent le contexte de la session pour accéder au cache de Streamlit ; les erreurs
+# sont affichées dans le thread du script. Les durées s'ajoutent à timings (voir
+# perf.render_load_timings), chaque chargement est mesuré dans perf s'il est donné.
+def load_concurrently(jobs, timings, perf=None):
+    def measured(name, job):
+        def run():
+            with perf.measure("chargement", name, cached=getattr(job, "func", None) is fetch_backend):
+                return job()
+        return run
+
+    if perf is not None:
+        jobs = {name: measured(name, job) for name, job in jobs.items()}
+    ctx = get_script_run_ctx()
+    results, errors, durations = fetch_concurrently(
+        jobs, initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    )
+    for name, error in errors.items():
+        st.error(f"Erreur lors de la récupération des données ({name}) : {error}")
+    total = durations.pop("total")
+    timings.update(durations)
+    timings["total"] = timings.get("total", 0) + total
+    return {name: results.get(name, pd.DataFrame()) for name in jobs}
+
+
+# Détections : projection sur les colonnes utilisées et, si categories est donné, filtre par catégorie
+# appliqué par MySQL (la colonne "categorie" porte alors le nom de la catégorie : aucune fusion locale)
+def objets_params(columns, categories=None):
+    params = {"colonnes": ",".join(columns)}
+    if categories is not None:
+        params["categorie"] = list(categories)
+    return params
+
+# Détections prêtes à l'emploi : colonnes présentes même sans donnée, dates converties et clés de
+# période des trois granularités calculées une fois (sur une copie : la réponse en cache est intacte)
+def prepare_detections(frame, columns):
+    data = frame.reindex(columns=list(columns))
+    data["date_detection"] = pd.to_datetime(data["date_detection"], errors='coerce')
+    data = add_period_keys(data)
+    return data.reindex(columns=list(columns) + list(PERIOD_KEY_COLUMNS.values()))
+
+def load_detections(columns, categories=None):
+    data = fetch_backend(OBJETS_ENDPOINT, params=objets_params(columns, categories), stream=True)
+    return prepare_detections(data, columns)
+
+
+# Quantiles de temps_reponse calculés par le backend à partir de ses sketches (aucune détection
+# transférée), regroupés selon by (periode, categorie, type_objet)
+QUANTILE_COLUMNS = {"p50": "Médiane (p50)", "p95": "p95", "p99": "p99"}
+
+def load_quantiles(granularite, by, categories=None, types_objets=None):
+    params = {"granularite": granularite, "par": ",".join(by)}
+    if categories:
+        params["categorie"] = list(categories)
+    if types_objets:
+        params["type_objet"] = list(types_objets)
+    return fetch_backend(QUANTILES_ENDPOINT, params=params)
+
+# Ajoute à frame les colonnes de QUANTILE_COLUMNS jointes sur la colonne on (nouvelle copie ; les
+# lignes sans quantile, comme "Autres", restent vides)
+def add_quantiles(frame, quantiles, on):
+    quantiles = quantiles.reindex(columns=[on] + list(QUANTILE_COLUMNS)).rename(columns=QUANTILE_COLUMNS)
+    return frame.assign(**{on: frame[on].astype(str)}).merge(
+        quantiles.assign(**{on: quantiles[on].astype(str)}), on=on, how="left"
+    )
+
+
+class Plan:
+    """Étape d'un plan paresseux ; rien n'est calculé avant collect()."""
+
+    def __init__(self, dataset, op, args, parent=None):
+        self.dataset = dataset
+        self.op = op
+        self.args = args
+        self.parent = parent
+        self.key = (op, args, parent.key if parent is not None else None)
+
+    def _then(self, op, *args):
+        return Plan(self.dataset, op, args, self)
+
+    # Lignes dont column vaut l'une des valeurs (values=None : pas de filtre) ; les filtres
+    # successifs appliqués aux détections sont résolus ensemble par l'index bitmap
+    def where(self, column, values):
+        if values is None:
+            return self
+        return self._then("where", column, tuple(sorted(set(values), key=str)))
+
+    # Nombre de lignes par groupe ; granularite : regroupement par période (colonne "periode")
+    def count(self, by=(), granularite=None, name="Nombre d'objets"):
+        return self._then("count", _columns(by), granularite, name)
+
+    def mean(self, column, by=(), granularite=None, name=None):
+        return self._then("mean", column, _columns(by), granularite, name or column)
+
+    # Agrégats additifs (count, sum...) de column par groupe, une colonne par fonction
+    def agg(self, column, functions, by=(), granularite=None):
+        return self._then("agg", column, tuple(functions), _columns(by), granularite)
+
+    # Valeurs distinctes de column, dans l'ordre d'apparition
+    def unique(self, column):
+        return self._then("unique", column)
+
+    def collect(self):
+        return self.dataset.evaluate(self)
+
+
+def _columns(by):
+    return (by,) if isinstance(by, str) else tuple(by)
+
+
+def _group(frame, by, granularite):
+    keys = list(by)
+    if granularite is not None:
+        keys.insert(0, PERIOD_KEY_COLUMNS[granularite])
+    return frame.dropna(subset=keys).groupby(keys, observed=True, sort=True)
+
+# Libellés de période ("2024-W05", "2024-03", "2024", comme le backend) à la place de la clé entière
+def _finish(result, granularite):
+    result = result.reset_index()
+    if granularite is None:
+        return result
+    key_column = PERIOD_KEY_COLUMNS[granularite]
+    result = label_periods(result, granularite).drop(columns=key_column)
+    return result[["periode"] + [c for c in result.columns if c != "periode"]]
+
+
+def _where(frame, column, values):
+    return frame[frame[column].isin(values)]
+
+def _count(frame, by, granularite, name):
+    return _finish(_group(frame, by, granularite).size().rename(name), granularite)
+
+def _mean(frame, column, by, granularite, name):
+    return _finish(_group(frame, by, granularite)[column].mean().rename(name), granularite)
+
+def _agg(frame, column, functions, by, granularite):
+    return _finish(_group(frame, by, granularite)[column].agg(list(functions)), granularite)
+
+def _unique(frame, column):
+    return list(frame[column].dropna().unique())
+
+def _index(frame):
+    return BitmapIndex(frame, [column for column in INDEXED_COLUMNS if column in frame.columns])
+
+OPERATIONS = {"where": _where, "count": _count, "mean": _mean, "agg": _agg, "unique": _unique, "index": _index}
+
+
+# Détections et filtres [(colonne, valeurs), ...] d'une suite de where appliquée directement aux
+# détections ; None si la suite part d'un résultat intermédiaire (filtre par isin)
+def _filters(plan):
+    filters = []
+    while plan.op == "where":
+        column, values = plan.args
+        if column not in INDEXED_COLUMNS:
+            return None
+        filters.append((column, values))
+        plan = plan.parent
+    if plan.op != "source":
+        return None
+    return plan, filters[::-1]
+
+
+class Dataset:
+    """Évalue les plans des sections en réutilisant les étapes déjà calculées.
+
+    Les résultats sont conservés (LRU, max_entries) jusqu'à expiration de ttl : une réexécution du
+    script ou d'un fragment, et le retour à un filtre déjà vu, ne recalculent que les étapes nouvelles.
+    Les erreurs de chargement ne sont pas conservées : elles sont propagées à l'appelant.
+    """
+
+    def __init__(self, ttl=REFRESH_INTERVAL, max_entries=PLAN_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._results = OrderedDict()  # clé d'étape -> résultat
+        self._expires = None
+        self.computed = 0
+        self.reused = 0
+
+    def detections(self, columns, categories=None):
+        categories = tuple(categories) if categories is not None else None
+        return Plan(self, "source", (tuple(columns), categories))
+
+    def evaluate(self, plan):
+        with self._lock:
+            now = time.monotonic()
+            if self._expires is not None and now >= self._expires:
+                self.clear()
+            if plan.key in self._results:
+                self._results.move_to_end(plan.key)
+                self.reused += 1
+                return self._results[plan.key]
+            indexed = _filters(plan) if plan.op == "where" else None
+            if plan.parent is None:
+                result = load_detections(*plan.args)
+            elif indexed is not None:
+                source, filters = indexed
+                result = self.evaluate(source).take(self.index(source).select(filters))
+            else:
+                result = OPERATIONS[plan.op](self.evaluate(plan.parent), *plan.args)
+            if self._expires is None:
+                self._expires = now + self.ttl
+            self._results[plan.key] = result
+            self.computed += 1
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+            return result
+
+    # Index bitmap des colonnes catégorielles des détections, construit au premier filtre
+    def index(self, source):
+        return self.evaluate(Plan(self, "index", (), source))
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._expires = None
+
+    def stats(self):
+        with self._lock:
+            return {"entrees": len(self._results), "calculs": self.computed, "reutilisations": self.reused}
+
+
+# Couche de données de la session : ses résultats survivent aux réexécutions du script et des fragments
+def get_dataset(key="dataset"):
+    if key not in st.session_state:
+        st.session_state[key] = Dataset()
+    return st.session_state[key]
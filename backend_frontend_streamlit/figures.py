@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class FigureCache:
+    """Cache LRU des figures Plotly, borné en nombre d'entrées et en octets.
+
+    Une figure est identifiée par (section, filtres normalisés, granularité, version des données) :
+    un rerun qui ne change rien de tout cela sert la figure déjà construite. La taille d'une figure
+    est celle de son JSON, c'est-à-dire ce que Streamlit envoie au navigateur.
+    Les figures en cache sont partagées : elles ne doivent pas être modifiées après construction.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (figure, octets)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, figure):
+        size = len(figure.to_json())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (figure, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get_or_build(self, key, build):
+        """Renvoie (figure, True) depuis le cache, ou (build(), False) après l'avoir mise en cache."""
+        figure = self.get(key)
+        if figure is not None:
+            return figure, True
+        figure = build()
+        self.put(key, figure)
+        return figure, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entrees": len(self._entries),
+                "octets": self._bytes,
+                "succes": self.hits,
+                "echecs": self.misses,
+            }
+
+
+# Filtres sous une forme hachable et indépendante de l'ordre de sélection
+# (["Animaux", "Transport"] et ["Transport", "Animaux"] donnent la même figure)
+def normalize(value):
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), normalize(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset, pd.Index, pd.Series)):
+        return tuple(sorted(str(item) for item in value))
+    return value
+
+
+# Version des données d'une figure : empreinte du DataFrame qui la construit (quelques centaines de
+# lignes agrégées au plus), si bien qu'une actualisation sans nouvelle donnée garde la même version
+def data_version(frame):
+    if frame is None:
+        return None
+    rows = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    return (tuple(frame.columns), hashlib.sha1(rows.tobytes()).hexdigest())
+
+
+def figure_key(section, filters, granularite, frame):
+    return (section, normalize(filters), granularite, data_version(frame))
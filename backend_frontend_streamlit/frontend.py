@@ -1,9 +1,27 @@
+import functools
+
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-import plotly.subplots as sp
+
+from backend_client import DeltaStore
+from cube import DetectionCube
+from dataset import BACKEND_URL, CLASS_NAMES, REFRESH_INTERVAL, fetch_backend, load_concurrently, load_data_from_backend, objets_params, types_of
+from figures import FigureCache, figure_key
+import lod
+from perf import PerfRecorder, cache_miss, render_load_timings, render_panel
+from periodes import GRANULARITES, PERIOD_KEY_COLUMNS, add_period_keys, label_periods, parse_periods, pivot_periods, start_labels
+
+# Fenêtre par défaut (en périodes) de la moyenne glissante de la tendance
+TREND_WINDOW = 2
+
+# Cache des figures partagé par les sessions : nombre de figures et mémoire (Mo) maximum
+FIGURE_CACHE_ENTRIES = 64
+FIGURE_CACHE_MB = 64
+
+# Copies locales des détections conservées (une par sélection de catégories) ; les moins récemment
+# utilisées sont libérées, leur mémoire n'est pas bornée autrement
+DETECTION_STORE_ENTRIES = 4
 
 # Configuration de la page
 st.set_page_config(
@@ -12,16 +30,69 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Fonction pour récupérer les données depuis Flask (avec cache)
-@st.cache_data
-def load_data_from_backend(endpoint):
-    try:
-        response = requests.get(endpoint)
-        response.raise_for_status()
-        return pd.DataFrame(response.json())
-    except requests.RequestException as e:
-        st.error(f"Erreur lors de la récupération des données : {e}")
+# Mesures de l'exécution en cours (panneau de performance activé dans les options avancées ;
+# l'état de la case est lu avant qu'elle soit affichée, pour mesurer dès le début du script)
+perf = PerfRecorder(enabled=st.session_state.get("panneau_performance", False))
+
+# Durées des chargements de la page (secondes), affichées dans la barre latérale
+load_timings = {}
+
+# Copie locale des détections d'une sélection de catégories, partagée entre les sessions et
+# complétée par deltas (since_id). Les dates sont converties et les clés de période des trois
+# granularités calculées une seule fois, à la réception de chaque delta. Un agrégat
+# (période, catégorie, type) par granularité est maintenu incrémentalement : changer de
+# granularité ou de filtre ne coûte qu'une lecture de ces agrégats.
+@st.cache_resource(max_entries=DETECTION_STORE_ENTRIES)
+def get_detection_store(categories):
+    store = DeltaStore(
+        f"{BACKEND_URL}/data/objets",
+        params=objets_params(["type_objet", "temps_reponse", "date_detection", "categorie"], categories),
+        prepare=add_period_keys
+    )
+    for granularity in GRANULARITES:
+        store.add_aggregate(
+            granularity,
+            by=[PERIOD_KEY_COLUMNS[granularity], "categorie", "type_objet"],
+            sum_columns=["temps_reponse"],
+            min_columns=["temps_reponse"],
+            max_columns=["temps_reponse"]
+        )
+    return store
+
+# Cube (période x catégorie x type) construit à partir de l'agrégat incrémental et de la satisfaction
+# par type : les filtres de la sidebar se résolvent ensuite sans aucun groupby sur les détections.
+# generation identifie l'état de la copie locale et la satisfaction (quelques milliers de lignes) est
+# hachée par Streamlit : le cube n'est reconstruit qu'après un delta non vide, un rechargement complet
+# ou un changement des avis.
+@st.cache_resource(max_entries=16)
+def build_cube(categories, granularite, generation, _store, satisfaction):
+    cache_miss()
+    aggregate = _store.aggregate(granularite)
+    types = sorted(aggregate.index.get_level_values("type_objet").dropna().unique().astype(str))
+    cube = DetectionCube.from_aggregate(aggregate, PERIOD_KEY_COLUMNS[granularite], categories, types)
+    if not satisfaction.empty:
+        cube.add_satisfaction(
+            parse_periods(satisfaction["periode"], granularite),
+            satisfaction["categorie"].astype(str),
+            satisfaction["type_objet"].astype(str),
+            satisfaction["satisfait"],
+            satisfaction["non_satisfait"]
+        )
+    return cube
+
+def aggregate_params(granularite, categories, types_objets=None):
+    params = {"granularite": granularite, "categorie": list(categories)}
+    if types_objets:
+        params["type_objet"] = list(types_objets)
+    return params
+
+# Agrégats (période x catégorie) calculés par MySQL : seules quelques centaines de lignes transitent
+def load_aggregates(granularite, categories, types_objets=None):
+    if not categories:
         return pd.DataFrame()
+    params = aggregate_params(granularite, categories, types_objets)
+    aggregates = load_data_from_backend(f"{BACKEND_URL}/data/objets/aggregate", params=params, perf=perf)
+    return aggregates.rename(columns={"categorie": "nom", "nb_objets": "Nombre d'objets"})
 
 # Charger les polices Font Awesome pour les icônes
 st.markdown(
@@ -45,26 +116,10 @@ st.markdown("<h1 style='text-align: center; color: #2E86C1; font-size: 2.5em; ma
 #         unsafe_allow_html=True
 #     )
 
-# Chargement des données (avec cache)
-data_objets = load_data_from_backend("http://localhost:5000/data/objets")
-data_satisfaction = load_data_from_backend("http://localhost:5000/data/satisfaction")
-data_categories = load_data_from_backend("http://localhost:5000/data/categories")
-
-# Mapping des types d'objets aux catégories
-category_mapping = {
-    "Transport": ["bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck", "boat"],
-    "Signalisation et Infrastructure": ["traffic light", "fire hydrant", "stop sign", "parking meter", "bench"],
-    "Animaux": ["bird", "cat", "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe"],
-    "Accessoires personnels": ["backpack", "umbrella", "handbag", "tie", "suitcase"],
-    "Sports et Loisirs": ["frisbee", "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket"],
-    "Cuisine et Nourriture": ["bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake"],
-    "Mobilier": ["chair", "sofa", "pottedplant", "bed", "diningtable", "toilet"],
-    "Électronique": ["tvmonitor", "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator"],
-    "Lecture et Décoration": ["book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush"]
-}
-
-# Définir class_names comme la liste de tous les types d'objets
-class_names = sorted(set(obj for category in category_mapping.values() for obj in category))
+# Chargement des catégories (avec cache) : nécessaires pour construire les filtres
+data_categories = load_concurrently(
+    {"/data/categories": functools.partial(fetch_backend, f"{BACKEND_URL}/data/categories")}, load_timings, perf
+).get("/data/categories", pd.DataFrame())
 
 # Sidebar avec les filtres globaux
 with st.sidebar:
@@ -98,16 +153,13 @@ with st.sidebar:
     st.markdown("---")  # Séparateur
 
     # Filtre spécifique : type d'objet (dynamique en fonction de la catégorie sélectionnée)
-    if not data_objets.empty:
+    if not data_categories.empty:
         # Récupérer les types d'objets correspondant à la catégorie sélectionnée
-        types_objets = []
-        for category in selected_categories:
-            if category in category_mapping:
-                types_objets.extend(category_mapping[category])
+        types_objets = types_of(selected_categories)
 
         # Si aucune catégorie n'est sélectionnée, afficher tous les types d'objets
         if not selected_categories:
-            types_objets = class_names
+            types_objets = CLASS_NAMES
 
         # Gestion de la sélection des types d'objets
         if 'previous_categories' not in st.session_state:
@@ -140,6 +192,144 @@ with st.sidebar:
         # Sauvegarder la sélection des types d'objets dans session_state
         st.session_state.selected_types = selected_types
 
+    # Options avancées
+    with st.expander("Options avancées"):
+        agregation_serveur = st.checkbox(
+            "Agrégation côté serveur (MySQL)",
+            key="agregation_serveur",
+            help="Les sections « Nombre d'Objets Détectés », « Vitesse de Traitement » et « Tendance » "
+                 "récupèrent des agrégats calculés par la base au lieu de la table complète des objets."
+        )
+        # Actualisation : seules les nouvelles détections sont téléchargées
+        actualiser_donnees = st.button("Actualiser les données")
+        # Rechargement complet (si des détections ont été modifiées ou supprimées)
+        recharger_donnees = st.button("Recharger toutes les données")
+        # Nombre de barres borné : granularité plus grossière si la période choisie en produit trop
+        niveau_detail = st.checkbox(
+            "Niveau de détail automatique",
+            value=True,
+            key="niveau_detail",
+            help=f"Au-delà de {lod.MAX_POINTS} barres, les périodes sont regroupées (semaines en mois, "
+                 "mois en années) ; les longues séries sont tracées en WebGL."
+        )
+        # Lissage de la tendance, appliqué à toutes les catégories
+        fenetre_tendance = st.slider(
+            "Moyenne glissante de la tendance (périodes)",
+            min_value=1,
+            max_value=12,
+            value=TREND_WINDOW,
+            key="fenetre_tendance"
+        )
+        # Durées de chargement, de préparation et de construction des figures à chaque exécution
+        st.checkbox("Panneau de performance", key="panneau_performance")
+
+if data_categories.empty:
+    selected_categories, selected_types = [], []
+
+# Chargement des données, filtrées par MySQL selon les catégories sélectionnées :
+# seules les colonnes utilisées par les graphiques sont transférées, puis seules les nouvelles
+# détections le sont lors des actualisations suivantes.
+# En mode agrégation serveur, la table des objets n'est pas téléchargée du tout.
+# Les chargements de la page sont indépendants : ils sont lancés en parallèle, puis les sections
+# relisent les résultats (directement ou via le cache de fetch_backend).
+satisfaction_params = {"granularite": granularite, "categorie": list(selected_categories)}
+jobs = {}
+if selected_categories and not agregation_serveur:
+    detection_store = get_detection_store(tuple(selected_categories))
+    if recharger_donnees:
+        jobs["/data/objets"] = detection_store.reload
+    else:
+        jobs["/data/objets"] = functools.partial(
+            detection_store.refresh, max_age=None if actualiser_donnees else REFRESH_INTERVAL
+        )
+    # Satisfaction par (période, catégorie, type) : intégrée au cube pour suivre le filtre des types
+    jobs["/data/satisfaction/aggregate"] = functools.partial(
+        fetch_backend, f"{BACKEND_URL}/data/satisfaction/aggregate", params={**satisfaction_params, "par_type": 1}
+    )
+elif selected_categories:
+    jobs["/data/objets/aggregate"] = functools.partial(
+        fetch_backend, f"{BACKEND_URL}/data/objets/aggregate",
+        params=aggregate_params(granularite, selected_categories, selected_types)
+    )
+    if selected_types:
+        # Tendance : toutes les catégories sélectionnées, sans filtre de types
+        jobs["/data/objets/aggregate (tendance)"] = functools.partial(
+            fetch_backend, f"{BACKEND_URL}/data/objets/aggregate",
+            params=aggregate_params(granularite, selected_categories)
+        )
+    jobs["/data/satisfaction/aggregate"] = functools.partial(
+        fetch_backend, f"{BACKEND_URL}/data/satisfaction/aggregate", params=satisfaction_params
+    )
+loaded = load_concurrently(jobs, load_timings, perf)
+
+if agregation_serveur or not selected_categories:
+    cube = None
+else:
+    satisfaction_par_type = loaded.get("/data/satisfaction/aggregate", pd.DataFrame())
+    if detection_store.rows == 0:
+        cube = None
+    else:
+        with perf.measure("preparation", "Cube", cached=True):
+            cube = build_cube(
+                tuple(selected_categories), granularite, detection_store.generation, detection_store, satisfaction_par_type
+            )
+    if perf.enabled:
+        perf.frame("Détections (copie locale)", detection_store.data)
+    perf.frame("Satisfaction par type", satisfaction_par_type)
+
+    # Empreinte mémoire des détections avant/après typage des colonnes (voir schemas.py)
+    with st.sidebar:
+        memory = detection_store.memory_report
+        if memory["avant"]:
+            # "avant" : DataFrame décodé du format reçu (Arrow par défaut, JSON sans pyarrow)
+            received = f" ({memory['format']} décodé)" if memory["format"] else ""
+            st.caption(
+                f"Mémoire des détections : {memory['avant'] / 1e6:.1f} Mo{received} → "
+                f"{memory['apres'] / 1e6:.1f} Mo (typé), {detection_store.rows} lignes"
+            )
+
+# Mesures par (période, catégorie) lues dans le cube pour un filtre de types donné
+def cube_counts(types_objets=None):
+    counts = cube.slice(selected_categories, types_objets)
+    counts = counts[counts["nb"] > 0].rename(columns={"categorie": "nom", "nb": "Nombre d'objets"})
+    return label_periods(counts, granularite, key_column="cle_periode")
+
+# Niveau de détail : regroupe les périodes tant que le graphique dépasse lod.MAX_POINTS barres
+# et signale la granularité effectivement affichée
+def limit_detail(counts):
+    if counts is None or counts.empty or not niveau_detail:
+        return counts
+    counts, effective = lod.coarsen(counts, granularite, ["Nombre d'objets"], by=["nom"])
+    if effective != granularite:
+        st.caption(f"Trop de barres en granularité {granularite} : affichage par {effective}.")
+    return counts
+
+# Figures déjà construites, servies tant que la section, les filtres, la granularité et les données
+# qui les construisent sont inchangés (un widget sans rapport ne reconstruit aucune figure)
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(max_entries=FIGURE_CACHE_ENTRIES, max_bytes=FIGURE_CACHE_MB * 1024 * 1024)
+
+def cached_figure(section, filters, data, build):
+    def build_missing():
+        cache_miss()
+        return build()
+    return get_figure_cache().get_or_build(figure_key(section, filters, granularite, data), build_missing)[0]
+
+# Filtres qui déterminent les figures (les sections 1 et 2 dépendent aussi des types sélectionnés)
+figure_filters = {"categories": selected_categories, "serveur": agregation_serveur, "niveau_detail": niveau_detail}
+
+# Satisfaction pré-agrégée par période et catégorie (sans démultiplication des avis par détection),
+# utilisée telle quelle en mode agrégation serveur
+if agregation_serveur:
+    data_satisfaction = loaded.get("/data/satisfaction/aggregate", pd.DataFrame())
+else:
+    data_satisfaction = pd.DataFrame()
+perf.frame("Satisfaction agrégée", data_satisfaction)
+
+# Durée de chaque chargement ; le total est inférieur à la somme grâce au parallélisme
+render_load_timings(load_timings)
+
 # Section 1 : Nombre d'objets détectés sur une période
 st.markdown("---")
 st.markdown(
@@ -147,59 +337,51 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-if not data_objets.empty:
-    # Jointure avec les catégories (avec cache)
-    if 'data_objets_merged' not in st.session_state:
-        st.session_state.data_objets_merged = data_objets.merge(data_categories, left_on="categorie_id", right_on="id")
-    
-    # Filtrage des données (global : catégorie)
-    filtered_data_objets = st.session_state.data_objets_merged[
-        st.session_state.data_objets_merged["nom"].isin(selected_categories)
-    ].copy()
-    
-    # Appliquer le filtre spécifique pour les types d'objets
-    if selected_types:
-        filtered_data_objets = filtered_data_objets[filtered_data_objets["type_objet"].isin(selected_types)]
-    
-    # Vérifiez que le DataFrame n'est pas vide après le filtrage
-    if filtered_data_objets.empty:
+with perf.measure("preparation", "Section 1 : nombre d'objets"):
+    count_per_period_category = None
+    if agregation_serveur:
+        # Agrégation par période et par catégorie faite par MySQL
+        count_per_period_category = load_aggregates(granularite, selected_categories, selected_types)
+    elif cube is not None:
+        # Cube déjà filtré par catégorie côté serveur : le filtre des types est un masque sur un axe,
+        # puis libellés triables ("2024-W05", "2024-03", "2024")
+        count_per_period_category = cube_counts(selected_types)
+    count_per_period_category = limit_detail(count_per_period_category)
+
+if count_per_period_category is not None:
+    if count_per_period_category.empty:
         st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
     else:
-        # Convertir la date de détection en datetime
-        filtered_data_objets['date_detection'] = pd.to_datetime(filtered_data_objets['date_detection'], errors='coerce')
-
-        # Appliquer la granularité globale
-        if granularite == "Semaine":
-            filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%G-W%V')  # ISO week format
-        elif granularite == "Mois":
-            filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%b %Y')  # Ex: 'Sep 2023'
-        elif granularite == "Année":
-            filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.year.astype(str)  # Format: "2023"
-
-        # Agrégation des données par période et par catégorie
-        count_per_period_category = filtered_data_objets.groupby(["periode", "nom"]).size().reset_index(name="Nombre d'objets")
-
         # Affichage du graphique
-        fig = px.bar(
-            count_per_period_category,
-            x="periode",
-            y="Nombre d'objets",
-            color="nom",
-            labels={"periode": "Période", "Nombre d'objets": "Nombre d'Objets", "nom": "Catégorie"},
-            color_discrete_sequence=['#2E86C1', '#28B463', '#E74C3C', '#F39C12']  # Palette de couleurs
-        )
-
-        fig.update_layout(
-            xaxis_tickangle=-45,
-            xaxis={'title': 'Période'},
-            yaxis={'title': "Nombre d'Objets"},
-            barmode="group",
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font=dict(color='#566573')
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
+        def build_count_figure():
+            fig = px.bar(
+                count_per_period_category,
+                x="periode",
+                y="Nombre d'objets",
+                color="nom",
+                labels={"periode": "Période", "Nombre d'objets": "Nombre d'Objets", "nom": "Catégorie"},
+                color_discrete_sequence=['#2E86C1', '#28B463', '#E74C3C', '#F39C12']  # Palette de couleurs
+            )
+
+            fig.update_layout(
+                xaxis_tickangle=-45,
+                xaxis={'title': 'Période'},
+                yaxis={'title': "Nombre d'Objets"},
+                barmode="group",
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(color='#566573')
+            )
+            return fig
+
+        with perf.measure("figure", "Section 1 : nombre d'objets", cached=True):
+            fig = cached_figure(
+                "Section 1 : nombre d'objets", {**figure_filters, "types": selected_types},
+                count_per_period_category, build_count_figure
+            )
+
+        with perf.measure("affichage", "Section 1 : nombre d'objets"):
+            st.plotly_chart(fig, use_container_width=True)
 
 
 # Section 2 : Vitesse de traitement des objets
@@ -209,58 +391,54 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-if not data_objets.empty:
-    # Filtrage des données selon les catégories et la période globale
-    filtered_data_objets = st.session_state.data_objets_merged[
-        st.session_state.data_objets_merged["nom"].isin(selected_categories)
-    ].copy()
-    
-    # Appliquer le filtre spécifique pour les types d'objets
-    if selected_types:
-        filtered_data_objets = filtered_data_objets[filtered_data_objets["type_objet"].isin(selected_types)]
-    
-    # Vérifiez que le DataFrame n'est pas vide après le filtrage
-    if filtered_data_objets.empty:
+with perf.measure("preparation", "Section 2 : vitesse de traitement"):
+    count_per_period_category = None
+    if agregation_serveur:
+        # Mêmes filtres que la section 1 : résultat déjà en cache côté frontend
+        count_per_period_category = load_aggregates(granularite, selected_categories, selected_types)
+    elif cube is not None:
+        # Cube déjà filtré par catégorie côté serveur : le filtre des types est un masque sur un axe,
+        # puis libellés triables ("2024-W05", "2024-03", "2024")
+        count_per_period_category = cube_counts(selected_types)
+    count_per_period_category = limit_detail(count_per_period_category)
+
+if count_per_period_category is not None:
+    if count_per_period_category.empty:
         st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
     else:
-        # Convertir la date de détection en datetime
-        filtered_data_objets['date_detection'] = pd.to_datetime(filtered_data_objets['date_detection'], errors='coerce')
-
-        # Appliquer la granularité globale
-        if granularite == "Semaine":
-            filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%G-W%V')
-        elif granularite == "Mois":
-            filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%b %Y')
-        elif granularite == "Année":
-            filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.year.astype(str)
-
-        # Agrégation des données par période et par catégorie
-        count_per_period_category = filtered_data_objets.groupby(["periode", "nom"]).size().reset_index(name="Nombre d'objets")
-
         # Calcul de la vitesse de traitement
-        count_per_period_category['Vitesse de traitement (objets/min)'] = count_per_period_category.groupby("periode")["Nombre d'objets"].transform(lambda x: x / 60)
+        count_per_period_category['Vitesse de traitement (objets/min)'] = count_per_period_category["Nombre d'objets"] / 60
 
         # Affichage du graphique
-        fig = px.bar(
-            count_per_period_category,
-            x="periode",
-            y="Vitesse de traitement (objets/min)",
-            color="nom",
-            labels={"periode": "Période", "Vitesse de traitement (objets/min)": "Vitesse de traitement (objets/min)", "nom": "Catégorie"},
-            color_discrete_sequence=['#2E86C1', '#28B463', '#E74C3C', '#F39C12']
-        )
-
-        fig.update_layout(
-            xaxis_tickangle=-45,
-            xaxis={'title': 'Période'},
-            yaxis={'title': "Vitesse de traitement (objets/min)"},
-            barmode="group",
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            font=dict(color='#566573')
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
+        def build_speed_figure():
+            fig = px.bar(
+                count_per_period_category,
+                x="periode",
+                y="Vitesse de traitement (objets/min)",
+                color="nom",
+                labels={"periode": "Période", "Vitesse de traitement (objets/min)": "Vitesse de traitement (objets/min)", "nom": "Catégorie"},
+                color_discrete_sequence=['#2E86C1', '#28B463', '#E74C3C', '#F39C12']
+            )
+
+            fig.update_layout(
+                xaxis_tickangle=-45,
+                xaxis={'title': 'Période'},
+                yaxis={'title': "Vitesse de traitement (objets/min)"},
+                barmode="group",
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(color='#566573')
+            )
+            return fig
+
+        with perf.measure("figure", "Section 2 : vitesse de traitement", cached=True):
+            fig = cached_figure(
+                "Section 2 : vitesse de traitement", {**figure_filters, "types": selected_types},
+                count_per_period_category, build_speed_figure
+            )
+
+        with perf.measure("affichage", "Section 2 : vitesse de traitement"):
+            st.plotly_chart(fig, use_container_width=True)
 
 # Section 3 : Tendance des Objets Détectés
 st.markdown("---")
@@ -269,81 +447,72 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-if not data_objets.empty:
-    # Filtrage des données selon les catégories sélectionnées
-    filtered_data_objets = st.session_state.data_objets_merged[
-        st.session_state.data_objets_merged["nom"].isin(selected_categories)
-    ].copy()
-
-    # Convertir la date de détection en datetime
-    filtered_data_objets['date_detection'] = pd.to_datetime(filtered_data_objets['date_detection'], errors='coerce')
-
-    # Appliquer la granularité globale sur les périodes
-    if granularite == "Semaine":
-        filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%Y-W%V')  # Format YYYY-WEEK
-    elif granularite == "Mois":
-        filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%Y-%m')  # Format YYYY-MM
-    elif granularite == "Année":
-        filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.strftime('%Y')  # Format YYYY
-
-    # Agrégation des données par période et catégorie
-    count_per_period_category = filtered_data_objets.groupby(["periode", "nom"]).size().reset_index(name="Nombre d'objets")
-
-    # Vérifier s'il y a des données après l'agrégation
-    if count_per_period_category.empty:
-        st.warning("Aucune donnée disponible pour la tendance des objets détectés.")
-    else:
-        # Forcer le tri des périodes pour éviter un affichage désordonné
-        count_per_period_category = count_per_period_category.sort_values("periode")
-
-       # Création des sous-graphiques
-fig_trend = sp.make_subplots(
-    rows=len(selected_categories), 
-    cols=1, 
-    shared_xaxes=True,  # Partager l'axe X pour toutes les catégories
-    vertical_spacing=0.1,  # Espacement entre les subplots
-    subplot_titles=[f"Tendance pour {cat}" for cat in selected_categories]  # Titres des sous-graphiques
-)
-
-# Ajouter une ligne de tendance pour chaque catégorie
-for idx, category in enumerate(selected_categories):
-    category_data = count_per_period_category[count_per_period_category['nom'] == category]
-
-    # Lissage des tendances avec une moyenne glissante
-    trend_line = category_data["Nombre d'objets"].rolling(window=2, min_periods=1).mean()
+with perf.measure("preparation", "Section 3 : tendance"):
+    count_per_period_category = None
+    if agregation_serveur:
+        # La tendance ne tient compte que des catégories (pas du filtre de types)
+        count_per_period_category = load_aggregates(granularite, selected_categories)
+    elif cube is not None:
+        # Tous les types des catégories sélectionnées
+        count_per_period_category = cube_counts()
+
+# Vérifier s'il y a des données après l'agrégation
+if count_per_period_category is not None and count_per_period_category.empty:
+    st.warning("Aucune donnée disponible pour la tendance des objets détectés.")
+elif count_per_period_category is not None:
+    def build_trend_figure():
+        # Matrice (période x catégorie) sur un index de dates continu : une période sans détection
+        # compte 0 au lieu d'être sautée, et la moyenne glissante lisse toutes les catégories à la fois
+        matrix = pivot_periods(
+            count_per_period_category, granularite, "nom", "Nombre d'objets", order=list(selected_categories)
+        )
+        trend = matrix.rolling(window=fenetre_tendance, min_periods=1).mean()
+        trend_data = (
+            trend.assign(periode=start_labels(trend.index, granularite)).reset_index()
+            .melt(id_vars=["debut", "periode"], var_name="nom", value_name="Tendance")
+        )
 
-    fig_trend.add_trace(
-        go.Scatter(
-            x=category_data['periode'],
-            y=trend_line,
-            mode='lines+markers',
-            name=category,
+        # Un sous-graphique par catégorie (facettes) ; longues séries tracées en WebGL
+        fig_trend = px.line(
+            trend_data,
+            x="debut",
+            y="Tendance",
+            facet_row="nom",
+            category_orders={"nom": list(selected_categories)},
+            markers=True,
+            hover_data={"debut": False, "periode": True},
+            labels={"debut": "Période", "Tendance": "Nombre d'objets", "periode": "Période"},
+            facet_row_spacing=0.04,
+            height=250 * len(selected_categories),  # Ajustement dynamique de la hauteur
+            render_mode=lod.render_mode(len(trend))
+        )
+        fig_trend.update_traces(
             line=dict(color='#2E86C1', width=2),  # Couleur de la ligne
-            marker=dict(color='#F39C12', size=8),  # Couleur des marqueurs
-        ),
-        row=idx + 1, col=1
-    )
-
-# Mise en forme du graphique
-fig_trend.update_layout(
-    height=250 * len(selected_categories),  # Ajustement dynamique de la hauteur
-    template="plotly_white",
-    showlegend=False,  # Désactiver la légende (les titres des sous-graphiques suffisent)
-    plot_bgcolor='white',  # Fond blanc
-    paper_bgcolor='white',  # Fond blanc
-    font=dict(color='#566573'),  # Couleur du texte
-)
+            marker=dict(color='#F39C12', size=8)  # Couleur des marqueurs
+        )
+        # Titres des sous-graphiques et échelle propre à chaque catégorie
+        fig_trend.for_each_annotation(lambda annotation: annotation.update(text=f"Tendance pour {annotation.text.split('=', 1)[-1]}"))
+        fig_trend.update_yaxes(matches=None, title_text="")
+
+        # Mise en forme du graphique
+        fig_trend.update_layout(
+            template="plotly_white",
+            showlegend=False,  # Désactiver la légende (les titres des sous-graphiques suffisent)
+            plot_bgcolor='white',  # Fond blanc
+            paper_bgcolor='white',  # Fond blanc
+            font=dict(color='#566573'),  # Couleur du texte
+        )
+        return fig_trend
 
-# Forcer l'axe X en tant que catégorie et ajouter un ordre
-fig_trend.update_xaxes(
-    title_text="Période", 
-    row=len(selected_categories), col=1,
-    type='category',  # Spécifier que l'axe est catégoriel
-    categoryorder='category ascending'  # Assurer que les périodes sont triées correctement
-)
+    with perf.measure("figure", "Section 3 : tendance", cached=True):
+        fig_trend = cached_figure(
+            "Section 3 : tendance", {**figure_filters, "fenetre": fenetre_tendance},
+            count_per_period_category, build_trend_figure
+        )
 
-# Afficher le graphique
-st.plotly_chart(fig_trend, use_container_width=True)
+    # Afficher le graphique
+    with perf.measure("affichage", "Section 3 : tendance"):
+        st.plotly_chart(fig_trend, use_container_width=True)
 
 
 # Section 4 : Taux de précision
@@ -353,57 +522,46 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-if not data_satisfaction.empty:
-    # Filtrer les données en fonction des catégories sélectionnées
-    if 'categorie' in data_satisfaction.columns:
-        if selected_categories:
-            filtered_data = data_satisfaction[data_satisfaction["categorie"].isin(selected_categories)].copy()
-        else:
-            filtered_data = data_satisfaction.copy()
-    else:
-        st.warning("La colonne 'categorie' est manquante dans les données.")
-        filtered_data = data_satisfaction
-
+with perf.measure("preparation", "Section 4 : taux de précision"):
+    count_per_period_category = None
+    if not data_satisfaction.empty:
+        # Les avis sont déjà agrégés par période et catégorie par le backend,
+        # avec le taux de précision calculé sur les comptes réels
+        count_per_period_category = data_satisfaction.dropna(subset=["taux_precision"])
+    elif cube is not None:
+        # Taux recalculé à partir des comptes du cube, tous types confondus comme en mode serveur
+        rates = cube.slice(selected_categories).dropna(subset=["taux_precision"])
+        count_per_period_category = label_periods(rates, granularite, key_column="cle_periode")
+
+if count_per_period_category is not None:
     # Vérifiez que le DataFrame n'est pas vide après le filtrage
-    if filtered_data.empty:
+    if count_per_period_category.empty:
         st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
     else:
-        # Convertir la date de détection en datetime
-        filtered_data['date_detection'] = pd.to_datetime(filtered_data['date_detection'], errors='coerce')
-
-        # Appliquer la granularité globale
-        if granularite == "Semaine":
-            filtered_data['periode'] = filtered_data['date_detection'].dt.strftime('%G-W%V')
-        elif granularite == "Mois":
-            filtered_data['periode'] = filtered_data['date_detection'].dt.strftime('%Y-%m')
-        elif granularite == "Année":
-            filtered_data['periode'] = filtered_data['date_detection'].dt.strftime('%Y')
-
-        # Agrégation des données par période et par catégorie
-        count_per_period_category = filtered_data.groupby(["periode", "categorie"]).agg({
-            "satisfait": "sum",
-            "non_satisfait": "sum"
-        }).reset_index()
-
-        # Calculer le taux de précision
-        count_per_period_category["taux_precision"] = (
-            count_per_period_category["satisfait"] / 
-            (count_per_period_category["satisfait"] + count_per_period_category["non_satisfait"])
-        ) * 100
-
         # Créer le graphique en barres
-        fig_satisfaction = px.bar(
-            count_per_period_category,
-            x="periode",
-            y="taux_precision",
-            color="categorie",
-            labels={"taux_precision": "Taux de Précision (%)", "periode": "Période"},
-            color_discrete_sequence=['#2E86C1', '#28B463', '#E74C3C', '#F39C12']  # Palette de couleurs
-        )
-
-        # Forcer l'axe X à être catégorique
-        fig_satisfaction.update_layout(xaxis_type='category')
+        def build_precision_figure():
+            fig_satisfaction = px.bar(
+                count_per_period_category,
+                x="periode",
+                y="taux_precision",
+                color="categorie",
+                labels={"taux_precision": "Taux de Précision (%)", "periode": "Période"},
+                color_discrete_sequence=['#2E86C1', '#28B463', '#E74C3C', '#F39C12']  # Palette de couleurs
+            )
+
+            # Forcer l'axe X à être catégorique
+            fig_satisfaction.update_layout(xaxis_type='category')
+            return fig_satisfaction
+
+        with perf.measure("figure", "Section 4 : taux de précision", cached=True):
+            fig_satisfaction = cached_figure(
+                "Section 4 : taux de précision", figure_filters,
+                count_per_period_category, build_precision_figure
+            )
 
         # Afficher le graphique
-        st.plotly_chart(fig_satisfaction, use_container_width=True)
+        with perf.measure("affichage", "Section 4 : taux de précision"):
+            st.plotly_chart(fig_satisfaction, use_container_width=True)
 
+# Panneau de performance (historique conservé dans la session même s'il est masqué)
+render_panel(perf)
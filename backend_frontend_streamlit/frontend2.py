@@ -3,232 +3,297 @@ import requests
 import pandas as pd
 import plotly.express as px
 
+from dataset import BACKEND_URL, QUANTILE_COLUMNS, add_quantiles, get_dataset, load_data_from_backend, load_quantiles
+import lod
+from perf import end_script_run, rerun_summary, section_run, start_script_run
+
 # Configuration de la page
 st.set_page_config(page_title="Tableau de Bord - Analyse des Données", layout="wide")
 
-# Fonction pour récupérer les données depuis Flask
-def load_data_from_backend(endpoint):
+# Début d'une exécution complète du script (les réexécutions de fragments ne passent pas ici)
+script_start = start_script_run()
+
+# Seules les colonnes utilisées par les graphiques sont transférées
+OBJETS_COLUMNS = ["type_objet", "temps_reponse", "date_detection"]
+
+# Entrées des sections, décrites par des plans sur les détections (voir dataset.py) : les détections
+# sont chargées et préparées une fois, les étapes communes à plusieurs sections (filtre par type...)
+# calculées une fois, et revenir à un filtre déjà vu ne recalcule rien.
+data = get_dataset()
+objets = data.detections(OBJETS_COLUMNS)
+
+def type_filter(type_objet):
+    return None if type_objet == "Tous" else [type_objet]
+
+def type_counts():
+    counts = objets.count(by="type_objet").collect().sort_values("Nombre d'objets", ascending=False)
+    return counts.rename(columns={"type_objet": "Type d'objet"})
+
+def count_per_period(types_objets, granularite):
+    return objets.where("type_objet", types_objets).count(granularite=granularite).collect()
+
+def response_time_per_period(type_objet, granularite):
+    return (
+        objets.where("type_objet", type_filter(type_objet))
+        .mean("temps_reponse", granularite=granularite, name="Temps Moyen de Réponse (heures)")
+        .collect()
+    )
+
+# Quantiles (p50, p95, p99) du temps de réponse, lus dans les sketches du backend : une erreur de
+# chargement est affichée et le graphique garde la moyenne seule
+def response_time_quantiles(granularite, by, type_objet):
+    return section_input(load_quantiles, granularite, by, None, type_filter(type_objet))
+
+# Nombre et somme par type (additifs) : regroupement des types peu fréquents, puis moyenne
+def response_time_by_type(type_objet, top_types):
+    by_type = (
+        objets.where("type_objet", type_filter(type_objet))
+        .agg("temps_reponse", ["count", "sum"], by="type_objet")
+        .collect()
+    )
+    by_type = lod.top_n(by_type, 'type_objet', 'count', n=top_types)
+    by_type["Temps Moyen de Réponse (heures)"] = by_type['sum'] / by_type['count']
+    return by_type
+
+# Entrée de section : une erreur de chargement est affichée dans la section et donne une valeur vide
+def section_input(function, *args, empty=None):
     try:
-        response = requests.get(endpoint)
-        response.raise_for_status()
-        return pd.DataFrame(response.json())
+        return function(*args)
     except requests.RequestException as e:
         st.error(f"Erreur lors de la récupération des données : {e}")
-        return pd.DataFrame()
+        return pd.DataFrame() if empty is None else empty
 
 # Titre principal
 st.markdown("<h1 style='text-align: center; color: #2E86C1;'>Tableau de Bord - Analyse des Données</h1>", unsafe_allow_html=True)
 
-# Chargement des données
-data_objets = load_data_from_backend("http://localhost:5000/data/objets")
-data_satisfaction = load_data_from_backend("http://localhost:5000/data/satisfaction")
+# Types d'objets détectés, du plus fréquent au moins fréquent (la table complète n'est pas relue ici)
+data_types = section_input(type_counts)
+# Satisfaction pré-agrégée par le backend (chaque avis n'est compté qu'une fois)
+data_satisfaction = load_data_from_backend(
+    f"{BACKEND_URL}/data/satisfaction/aggregate",
+    params={"granularite": "Année"}
+)
 
-# Filtres globaux (placés dans la barre latérale)
+# Filtres globaux (placés dans la barre latérale) : leur changement réexécute tout le script
 with st.sidebar:
     st.markdown("<h3 style='color: #2E86C1;'>Filtres Globaux</h3>", unsafe_allow_html=True)
-    
+
     # Filtre de granularité (commun à plusieurs graphiques)
     granularite = st.selectbox(
         "Choisissez la granularité de la période :",
         options=["Semaine", "Mois", "Année"],
         key='granularite'
     )
-    
+
     # Filtre des types d'objets (pour les graphiques liés aux objets)
-    if not data_objets.empty:
-        objets_types = data_objets["type_objet"].unique()
+    objets_types = list(data_types["Type d'objet"]) if not data_types.empty else []
+    if objets_types:
         selected_objets = st.multiselect(
             "Sélectionner un ou plusieurs types d'objets",
             options=objets_types,
             default=objets_types[:1]
         )
 
+    # Niveau de détail des graphiques par type : les types les moins fréquents sont regroupés
+    top_types = st.slider(
+        "Nombre de types d'objets affichés (les autres sont regroupés)",
+        min_value=5,
+        max_value=40,
+        value=lod.TOP_N,
+        key='top_types'
+    )
+
 # Palette de couleurs adaptée pour un fond clair
 colors = px.colors.qualitative.Plotly  # Palette moderne et harmonieuse
 
-# Section 1 : Nombre d'objets détectés sur une période
-st.markdown("<h2 style='color: #2E86C1;'>Nombre d'Objets Détectés</h2>", unsafe_allow_html=True)
-if not data_objets.empty:
-    # Traitement des données
-    data_objets['date_detection'] = pd.to_datetime(data_objets['date_detection'], errors='coerce')
-    filtered_data_objets = data_objets[data_objets["type_objet"].isin(selected_objets)].copy()  # Copie explicite
-
-    if granularite == "Semaine":
-        filtered_data_objets.loc[:, 'periode'] = filtered_data_objets['date_detection'].dt.to_period('W').astype(str)
-    elif granularite == "Mois":
-        filtered_data_objets.loc[:, 'periode'] = filtered_data_objets['date_detection'].dt.to_period('M').astype(str)
-    elif granularite == "Année":
-        filtered_data_objets.loc[:, 'periode'] = filtered_data_objets['date_detection'].dt.to_period('Y').astype(str)
-
-    count_per_period = filtered_data_objets.groupby("periode").size().reset_index(name="Nombre d'objets")
-
-    # Affichage du graphique
-    fig = px.line(
-        count_per_period,
-        x="periode",
-        y="Nombre d'objets",
-        labels={"periode": "Période", "Nombre d'objets": "Nombre d'Objets"},
-        title=f"Nombre d'Objets Détectés par {granularite}",
-        color_discrete_sequence=[colors[0]]  # Utilisation de la première couleur de la palette
-    )
+# Mise en forme commune des graphiques
+def white_layout(fig):
     fig.update_layout(
         plot_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
         paper_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
         font=dict(color='black')  # Texte en noir
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+# Section 1 : Nombre d'objets détectés sur une période (filtres globaux uniquement)
+st.markdown("<h2 style='color: #2E86C1;'>Nombre d'Objets Détectés</h2>", unsafe_allow_html=True)
+if objets_types:
+    with section_run("Section 1 : nombre d'objets"):
+        count_per_period_data = section_input(count_per_period, tuple(selected_objets), granularite)
+
+        if count_per_period_data.empty:
+            st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
+        else:
+            # Affichage du graphique
+            fig = px.line(
+                count_per_period_data,
+                x="periode",
+                y="Nombre d'objets",
+                labels={"periode": "Période", "Nombre d'objets": "Nombre d'Objets"},
+                title=f"Nombre d'Objets Détectés par {granularite}",
+                color_discrete_sequence=[colors[0]],  # Utilisation de la première couleur de la palette
+                render_mode=lod.render_mode(len(count_per_period_data))  # WebGL pour les longues séries
+            )
+            st.plotly_chart(white_layout(fig), use_container_width=True)
+
+# Les sections suivantes ont leur propre filtre : ce sont des fragments, réexécutés seuls quand
+# leur filtre change (leurs arguments sont ceux de la dernière exécution complète du script).
 
 # Section 2 : Degré de satisfaction des utilisateurs
+@st.fragment
+def satisfaction_section(data_satisfaction):
+    with section_run("Section 2 : satisfaction"):
+        col1, col2 = st.columns([1, 3])
+
+        with col1:
+            st.markdown("<h4 style='color: #2E86C1;'>Filtres</h4>", unsafe_allow_html=True)
+            # Filtre spécifique à la satisfaction
+            satisfaction_filter = st.selectbox(
+                "Filtrer par type de réponse :",
+                options=["Toutes", "Satisfaits", "Non satisfaits"],
+                key='satisfaction_filter'
+            )
+
+        with col2:
+            # Répartition de la satisfaction
+            total_satisfait = data_satisfaction['satisfait'].sum() if satisfaction_filter != "Non satisfaits" else 0
+            total_non_satisfait = data_satisfaction['non_satisfait'].sum() if satisfaction_filter != "Satisfaits" else 0
+
+            satisfaction_data = pd.DataFrame({
+                "Catégorie": ["Satisfaits", "Non satisfaits"],
+                "Valeurs": [total_satisfait, total_non_satisfait]
+            })
+
+            fig = px.pie(
+                satisfaction_data,
+                values="Valeurs",
+                names="Catégorie",
+                hole=0.4,
+                title="Répartition de la Satisfaction des Utilisateurs",
+                color_discrete_sequence=[colors[1], colors[2]]  # Utilisation de deux couleurs de la palette
+            )
+            st.plotly_chart(white_layout(fig), use_container_width=True)
+
 st.markdown("<h2 style='color: #2E86C1;'>Degré de Satisfaction des Utilisateurs</h2>", unsafe_allow_html=True)
 if not data_satisfaction.empty:
-    col1, col2 = st.columns([1, 3])
-    
-    with col1:
-        st.markdown("<h4 style='color: #2E86C1;'>Filtres</h4>", unsafe_allow_html=True)
-        # Filtre spécifique à la satisfaction
-        satisfaction_filter = st.selectbox(
-            "Filtrer par type de réponse :",
-            options=["Toutes", "Satisfaits", "Non satisfaits"],
-            key='satisfaction_filter'
-        )
-    
-    with col2:
-        # Répartition de la satisfaction
-        if satisfaction_filter == "Toutes":
-            total_satisfait = data_satisfaction['satisfait'].sum()
-            total_non_satisfait = data_satisfaction['non_satisfait'].sum()
-        elif satisfaction_filter == "Satisfaits":
-            total_satisfait = data_satisfaction['satisfait'].sum()
-            total_non_satisfait = 0
-        elif satisfaction_filter == "Non satisfaits":
-            total_satisfait = 0
-            total_non_satisfait = data_satisfaction['non_satisfait'].sum()
-
-        satisfaction_data = pd.DataFrame({
-            "Catégorie": ["Satisfaits", "Non satisfaits"],
-            "Valeurs": [total_satisfait, total_non_satisfait]
-        })
-
-        fig = px.pie(
-            satisfaction_data,
-            values="Valeurs",
-            names="Catégorie",
-            hole=0.4,
-            title="Répartition de la Satisfaction des Utilisateurs",
-            color_discrete_sequence=[colors[1], colors[2]]  # Utilisation de deux couleurs de la palette
-        )
-        fig.update_layout(
-            plot_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-            paper_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-            font=dict(color='black')  # Texte en noir
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    satisfaction_section(data_satisfaction)
 
 # Section 3 : Vitesse de traitement et temps moyen par détection
-st.markdown("<h2 style='color: #2E86C1;'>Vitesse de Traitement</h2>", unsafe_allow_html=True)
-if not data_objets.empty:
-    col1, col2 = st.columns([1, 3])
-    
-    with col1:
-        st.markdown("<h4 style='color: #2E86C1;'>Filtres</h4>", unsafe_allow_html=True)
-        # Filtre spécifique à la vitesse de traitement
-        vitesse_filter = st.selectbox(
-            "Filtrer par type d'objet :",
-            options=["Tous"] + list(data_objets["type_objet"].unique()),
-            key='vitesse_filter'
-        )
-    
-    with col2:
-        # Traitement des données
-        data_objets['date_detection'] = pd.to_datetime(data_objets['date_detection'], errors='coerce')
+@st.fragment
+def vitesse_section(objets_types, granularite):
+    with section_run("Section 3 : vitesse de traitement"):
+        col1, col2 = st.columns([1, 3])
 
-        if vitesse_filter != "Tous":
-            filtered_data_objets = data_objets[data_objets["type_objet"] == vitesse_filter].copy()  # Copie explicite
-        else:
-            filtered_data_objets = data_objets.copy()  # Copie explicite
-
-        if granularite == "Semaine":
-            filtered_data_objets.loc[:, 'periode'] = filtered_data_objets['date_detection'].dt.to_period('W').astype(str)
-        elif granularite == "Mois":
-            filtered_data_objets.loc[:, 'periode'] = filtered_data_objets['date_detection'].dt.to_period('M').astype(str)
-        elif granularite == "Année":
-            filtered_data_objets.loc[:, 'periode'] = filtered_data_objets['date_detection'].dt.to_period('Y').astype(str)
-
-        # Calcul du temps moyen de réponse par période
-        response_time_per_period = filtered_data_objets.groupby("periode")['temps_reponse'].mean().reset_index(name="Temps Moyen de Réponse (heures)")
-
-        # Affichage du graphique
-        fig = px.line(
-            response_time_per_period,
-            x="periode",
-            y="Temps Moyen de Réponse (heures)",
-            labels={"periode": "Période", "Temps Moyen de Réponse (heures)": "Temps Moyen de Réponse (heures)"},
-            title=f"Temps Moyen de Réponse par {granularite}",
-            color_discrete_sequence=[colors[3]]  # Utilisation d'une autre couleur de la palette
-        )
-        fig.update_layout(
-            plot_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-            paper_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-            font=dict(color='black')  # Texte en noir
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        with col1:
+            st.markdown("<h4 style='color: #2E86C1;'>Filtres</h4>", unsafe_allow_html=True)
+            # Filtre spécifique à la vitesse de traitement
+            vitesse_filter = st.selectbox(
+                "Filtrer par type d'objet :",
+                options=["Tous"] + objets_types,
+                key='vitesse_filter'
+            )
+
+        with col2:
+            # Calcul du temps moyen de réponse par période
+            response_time_data = section_input(response_time_per_period, vitesse_filter, granularite)
+
+            if response_time_data.empty:
+                st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
+            else:
+                # Moyenne et quantiles par période : la médiane et la queue (p95, p99) de la distribution
+                response_time_data = add_quantiles(
+                    response_time_data, response_time_quantiles(granularite, ["periode"], vitesse_filter), "periode"
+                ).dropna(axis=1, how="all")
+                measures = [c for c in response_time_data.columns if c != "periode"]
 
-# Section 4 : Répartition des types d'objets détectés
+                # Affichage du graphique
+                fig = px.line(
+                    response_time_data,
+                    x="periode",
+                    y=measures,
+                    labels={"periode": "Période", "value": "Temps de Réponse (heures)", "variable": "Mesure"},
+                    title=f"Temps de Réponse par {granularite} (moyenne et quantiles)",
+                    color_discrete_sequence=colors[3:],  # Utilisation d'autres couleurs de la palette
+                    render_mode=lod.render_mode(len(response_time_data) * len(measures))
+                )
+                st.plotly_chart(white_layout(fig), use_container_width=True)
+
+st.markdown("<h2 style='color: #2E86C1;'>Vitesse de Traitement</h2>", unsafe_allow_html=True)
+if objets_types:
+    vitesse_section(objets_types, granularite)
+
+# Section 4 : Répartition des types d'objets détectés (filtres globaux uniquement)
 st.markdown("<h2 style='color: #2E86C1;'>Répartition des Types d'Objets Détectés</h2>", unsafe_allow_html=True)
-if not data_objets.empty:
-    # Répartition des types d'objets
-    type_counts = data_objets['type_objet'].value_counts().reset_index()
-    type_counts.columns = ['Type d\'objet', 'Nombre d\'objets']
-    
-    fig = px.bar(
-        type_counts,
-        x='Type d\'objet',
-        y='Nombre d\'objets',
-        labels={'Type d\'objet': 'Type d\'objet', 'Nombre d\'objets': 'Nombre d\'objets'},
-        title="Répartition des Types d'Objets Détectés",
-        color_discrete_sequence=[colors[4]]  # Utilisation d'une autre couleur de la palette
-    )
-    fig.update_layout(
-        plot_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-        paper_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-        font=dict(color='black')  # Texte en noir
-    )
-    st.plotly_chart(fig, use_container_width=True)
+if objets_types:
+    with section_run("Section 4 : répartition des types"):
+        # Répartition des types d'objets : les top_types plus fréquents, les autres dans "Autres"
+        type_counts_data = lod.top_n(data_types, 'Type d\'objet', 'Nombre d\'objets', n=top_types)
+
+        fig = px.bar(
+            type_counts_data,
+            x='Type d\'objet',
+            y='Nombre d\'objets',
+            labels={'Type d\'objet': 'Type d\'objet', 'Nombre d\'objets': 'Nombre d\'objets'},
+            title="Répartition des Types d'Objets Détectés",
+            color_discrete_sequence=[colors[4]]  # Utilisation d'une autre couleur de la palette
+        )
+        st.plotly_chart(white_layout(fig), use_container_width=True)
 
 # Section 5 : Temps de réponse par type d'objet
+@st.fragment
+def response_time_section(objets_types, top_types):
+    with section_run("Section 5 : temps de réponse par type"):
+        col1, col2 = st.columns([1, 3])
+
+        with col1:
+            st.markdown("<h4 style='color: #2E86C1;'>Filtres</h4>", unsafe_allow_html=True)
+            # Filtre spécifique au temps de réponse par type d'objet
+            response_filter = st.selectbox(
+                "Filtrer par type d'objet :",
+                options=["Tous"] + objets_types,
+                key='response_filter'
+            )
+
+        with col2:
+            response_time_by_type_data = section_input(response_time_by_type, response_filter, top_types)
+            if not response_time_by_type_data.empty:
+                # Quantiles par type toutes périodes confondues (aucun pour le groupe "Autres")
+                response_time_by_type_data = add_quantiles(
+                    response_time_by_type_data, response_time_quantiles("Année", ["type_objet"], response_filter), "type_objet"
+                )
+
+            if response_time_by_type_data.empty:
+                st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
+            else:
+                fig = px.bar(
+                    response_time_by_type_data,
+                    x='type_objet',
+                    y='Temps Moyen de Réponse (heures)',
+                    labels={'type_objet': 'Type d\'objet', 'Temps Moyen de Réponse (heures)': 'Temps Moyen de Réponse (heures)'},
+                    title="Temps de Réponse Moyen par Type d'Objet",
+                    color_discrete_sequence=[colors[5]]  # Utilisation d'une autre couleur de la palette
+                )
+                fig.update_traces(name="Moyenne", showlegend=True)
+                # Médiane et queue de distribution de chaque type, en marqueurs sur les barres de la moyenne
+                for column, color in zip(QUANTILE_COLUMNS.values(), colors[6:]):
+                    if response_time_by_type_data[column].notna().any():
+                        fig.add_scatter(
+                            x=response_time_by_type_data['type_objet'],
+                            y=response_time_by_type_data[column],
+                            mode="markers",
+                            name=column,
+                            marker=dict(color=color, size=9, symbol="line-ew-open", line=dict(width=3, color=color))
+                        )
+                st.plotly_chart(white_layout(fig), use_container_width=True)
+
 st.markdown("<h2 style='color: #2E86C1;'>Temps de Réponse par Type d'Objet</h2>", unsafe_allow_html=True)
-if not data_objets.empty:
-    col1, col2 = st.columns([1, 3])
-    
-    with col1:
-        st.markdown("<h4 style='color: #2E86C1;'>Filtres</h4>", unsafe_allow_html=True)
-        # Filtre spécifique au temps de réponse par type d'objet
-        response_filter = st.selectbox(
-            "Filtrer par type d'objet :",
-            options=["Tous"] + list(data_objets["type_objet"].unique()),
-            key='response_filter'
-        )
-    
-    with col2:
-        # Temps de réponse par type d'objet
-        if response_filter != "Tous":
-            filtered_data_objets = data_objets[data_objets["type_objet"] == response_filter].copy()  # Copie explicite
-        else:
-            filtered_data_objets = data_objets.copy()  # Copie explicite
+if objets_types:
+    response_time_section(objets_types, top_types)
 
-        response_time_by_type = filtered_data_objets.groupby('type_objet')['temps_reponse'].mean().reset_index(name="Temps Moyen de Réponse (heures)")
-        
-        fig = px.bar(
-            response_time_by_type,
-            x='type_objet',
-            y='Temps Moyen de Réponse (heures)',
-            labels={'type_objet': 'Type d\'objet', 'Temps Moyen de Réponse (heures)': 'Temps Moyen de Réponse (heures)'},
-            title="Temps de Réponse Moyen par Type d'Objet",
-            color_discrete_sequence=[colors[5]]  # Utilisation d'une autre couleur de la palette
-        )
-        fig.update_layout(
-            plot_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-            paper_bgcolor='rgba(255, 255, 255, 1)',  # Fond blanc
-            font=dict(color='black')  # Texte en noir
-        )
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+# Temps d'exécution complète du script et de réexécution des fragments (médianes des dernières exécutions)
+end_script_run(script_start)
+with st.sidebar:
+    with st.expander("Temps de réexécution"):
+        st.dataframe(rerun_summary(), use_container_width=True, hide_index=True)
+        plans = data.stats()
+        st.caption(f"Plans de données : {plans['calculs']} étapes calculées, {plans['reutilisations']} réutilisées")
@@ -1,46 +1,68 @@
+import functools
+
 import streamlit as st
 import requests
 import pandas as pd
 import plotly.express as px
 
+from dataset import BACKEND_URL, add_quantiles, fetch_backend, get_dataset, load_concurrently, load_data_from_backend, load_quantiles, types_of
+from perf import end_script_run, render_load_timings, rerun_summary, section_run, start_script_run
+
 # Configuration de la page
 st.set_page_config(page_title="Tableau de Bord - Analyse des Données", layout="wide")
 
-# Fonction pour récupérer les données depuis Flask
-def load_data_from_backend(endpoint):
+# Début d'une exécution complète du script (les réexécutions de fragments ne passent pas ici)
+script_start = start_script_run()
+
+SATISFACTION_ENDPOINT = f"{BACKEND_URL}/data/satisfaction/aggregate"
+
+# Colonnes des détections utilisées par les sections (filtre par catégorie appliqué par MySQL)
+OBJETS_COLUMNS = ["type_objet", "temps_reponse", "date_detection", "categorie"]
+
+# Durées des chargements de la page (secondes), affichées dans la barre latérale
+load_timings = {}
+
+# Entrées des sections, décrites par des plans sur les détections des catégories sélectionnées
+# (voir dataset.py) : les détections sont chargées et préparées une fois pour toutes les sections,
+# et revenir à un filtre déjà vu ne recalcule rien.
+data = get_dataset()
+
+def detections(categories):
+    return data.detections(OBJETS_COLUMNS, categories)
+
+def detected_types(categories):
+    return detections(categories).unique("type_objet").collect()
+
+def count_per_period(categories, types_objets, granularite):
+    return detections(categories).where("type_objet", types_objets or None).count(granularite=granularite).collect()
+
+def response_time_per_period(categories, types_objets, granularite):
+    return (
+        detections(categories).where("type_objet", types_objets)
+        .mean("temps_reponse", granularite=granularite, name="Temps Moyen de Réponse (heures)")
+        .collect()
+    )
+
+# Entrée de section : une erreur de chargement est affichée dans la section et donne une valeur vide
+def section_input(function, *args, empty=None):
     try:
-        response = requests.get(endpoint)
-        response.raise_for_status()
-        return pd.DataFrame(response.json())
+        return function(*args)
     except requests.RequestException as e:
         st.error(f"Erreur lors de la récupération des données : {e}")
-        return pd.DataFrame()
+        return pd.DataFrame() if empty is None else empty
 
 # Titre principal
 st.markdown("<h1 style='text-align: center; color: #2E86C1;'>Tableau de Bord - Analyse des Données</h1>", unsafe_allow_html=True)
 
-# Chargement des données
-data_objets = load_data_from_backend("http://localhost:5000/data/objets")
-data_satisfaction = load_data_from_backend("http://localhost:5000/data/satisfaction")
-data_categories = load_data_from_backend("http://localhost:5000/data/categories")
-
-# Mapping des types d'objets aux catégories
-category_mapping = {
-    "Transport": ["bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck", "boat"],
-    "Signalisation et Infrastructure": ["traffic light", "fire hydrant", "stop sign", "parking meter", "bench"],
-    "Animaux": ["bird", "cat", "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe"],
-    "Accessoires personnels": ["backpack", "umbrella", "handbag", "tie", "suitcase"],
-    "Sports et Loisirs": ["frisbee", "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket"],
-    "Cuisine et Nourriture": ["bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake"],
-    "Mobilier": ["chair", "sofa", "pottedplant", "bed", "diningtable", "toilet"],
-    "Électronique": ["tvmonitor", "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator"],
-    "Lecture et Décoration": ["book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush"]
-}
+# Chargement des catégories (nécessaires pour construire les filtres)
+data_categories = load_concurrently(
+    {"/data/categories": functools.partial(fetch_backend, f"{BACKEND_URL}/data/categories")}, load_timings
+)["/data/categories"]
 
-# Filtres globaux (placés dans la barre latérale)
+# Filtres globaux (placés dans la barre latérale) : leur changement réexécute tout le script
 with st.sidebar:
     st.markdown("<h3 style='color: #2E86C1;'>Filtres Globaux</h3>", unsafe_allow_html=True)
-    
+
     # Filtre des catégories
     if not data_categories.empty:
         categories = data_categories["nom"].unique()
@@ -50,32 +72,65 @@ with st.sidebar:
             default=categories[:1],
             help="Ce filtre s'applique à toutes les sections du tableau de bord."
         )
+    else:
+        selected_categories = []
+
+    # Granularité commune aux sections 1 et 3 (globale : elle doit réexécuter les deux sections)
+    granularite = st.selectbox(
+        "Choisissez la granularité de la période :",
+        options=["Semaine", "Mois", "Année"],
+        key='granularite'
+    )
+
+selected_categories = tuple(selected_categories)
+
+# Dictionnaire de correspondance entre les libellés et les valeurs de la base de données
+genre_mapping = {
+    "Tous": "Tous",
+    "Femme": "F",
+    "Homme": "H"
+}
+
+# Satisfaction pré-agrégée filtrée par genre (section 2) : le genre est lu dans l'état du widget
+# (valeur de la dernière interaction) pour lancer la requête dès maintenant
+def satisfaction_params(genre_label):
+    params = {"granularite": "Année"}
+    if genre_mapping[genre_label] != "Tous":
+        params["genre"] = genre_mapping[genre_label]
+    return params
+
+prefetched_genre = st.session_state.get("satisfaction_genre", "Tous")
+
+# Chargement en parallèle des objets des catégories sélectionnées et de la satisfaction
+# (les détections préparées restent dans la couche de données, où les sections les relisent)
+jobs = {
+    "/data/satisfaction/aggregate": functools.partial(
+        fetch_backend, SATISFACTION_ENDPOINT, params=satisfaction_params(prefetched_genre)
+    )
+}
+if selected_categories:
+    jobs["/data/objets"] = detections(selected_categories).collect
+loaded = load_concurrently(jobs, load_timings)
+objets_loaded = not loaded.get("/data/objets", pd.DataFrame()).empty
+
+# Durée de chaque chargement ; le total est inférieur à la somme grâce au parallélisme
+render_load_timings(load_timings)
+
+# Chaque section a son propre filtre : ce sont des fragments, réexécutés seuls quand leur filtre
+# change (leurs arguments sont ceux de la dernière exécution complète du script).
 
 # Section 1 : Nombre d'objets détectés sur une période
-st.markdown("<h2 style='color: #2E86C1;'>Nombre d'Objets Détectés</h2>", unsafe_allow_html=True)
-if not data_objets.empty:
-    # Jointure avec les catégories
-    data_objets = data_objets.merge(data_categories, left_on="categorie_id", right_on="id")
-    
-    # Filtrage des données (global : catégorie)
-    filtered_data_objets = data_objets[data_objets["nom"].isin(selected_categories)].copy()
-    
-    # Créer deux colonnes : une pour les filtres, une pour le graphique
-    col1, col2 = st.columns([1, 3])
-    
-    with col1:
-        # Filtre spécifique : type d'objet (dynamique en fonction de la catégorie sélectionnée)
-        if not filtered_data_objets.empty:
+@st.fragment
+def count_section(selected_categories, granularite):
+    with section_run("Section 1 : nombre d'objets"):
+        # Créer deux colonnes : une pour les filtres, une pour le graphique
+        col1, col2 = st.columns([1, 3])
+
+        with col1:
+            # Filtre spécifique : type d'objet (dynamique en fonction de la catégorie sélectionnée)
             # Récupérer les types d'objets correspondant à la catégorie sélectionnée
-            types_objets = []
-            for category in selected_categories:
-                if category in category_mapping:
-                    types_objets.extend(category_mapping[category])
-            
-            # Si aucune catégorie n'est sélectionnée, afficher tous les types d'objets
-            if not selected_categories:
-                types_objets = class_names
-            
+            types_objets = types_of(selected_categories)
+
             # Afficher le filtre spécifique
             selected_types = st.multiselect(
                 "Sélectionner un ou plusieurs types d'objets (spécifique à cette section)",
@@ -83,65 +138,40 @@ if not data_objets.empty:
                 default=types_objets[:1] if types_objets else [],
                 help="Ce filtre s'applique uniquement à cette section."
             )
-            
-            # Appliquer le filtre spécifique
-            if selected_types:
-                filtered_data_objets = filtered_data_objets[filtered_data_objets["type_objet"].isin(selected_types)]
-        
-        # Visualisation des filtres actifs
-        st.markdown(f"**Filtres actifs :** Catégorie = {', '.join(selected_categories)}, Type d'objet = {', '.join(selected_types)}")
-    
-    with col2:
-        # Vérifiez que le DataFrame n'est pas vide après le filtrage
-        if filtered_data_objets.empty:
-            st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
-        else:
-            # Traitement des données
-            filtered_data_objets['date_detection'] = pd.to_datetime(filtered_data_objets['date_detection'], errors='coerce')
-            
-            granularite = st.selectbox(
-                "Choisissez la granularité de la période :",
-                options=["Semaine", "Mois", "Année"],
-                key='granularite'
-            )
-            
-            if granularite == "Semaine":
-                filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.to_period('W').astype(str)
-            elif granularite == "Mois":
-                filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.to_period('M').astype(str)
-            elif granularite == "Année":
-                filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.to_period('Y').astype(str)
-
-            count_per_period = filtered_data_objets.groupby("periode").size().reset_index(name="Nombre d'objets")
-
-            # Affichage du graphique
-            fig = px.line(
-                count_per_period,
-                x="periode",
-                y="Nombre d'objets",
-                labels={"periode": "Période", "Nombre d'objets": "Nombre d'Objets"},
-                title=f"Nombre d'Objets Détectés par {granularite}",
-                color_discrete_sequence=[px.colors.qualitative.Plotly[0]]
-            )
-            st.plotly_chart(fig, use_container_width=True)
+
+            # Visualisation des filtres actifs
+            st.markdown(f"**Filtres actifs :** Catégorie = {', '.join(selected_categories)}, Type d'objet = {', '.join(selected_types)}")
+
+        with col2:
+            # Données déjà filtrées par catégorie côté serveur, puis par type (entrée en cache)
+            count_per_period_data = section_input(count_per_period, selected_categories, tuple(selected_types), granularite)
+
+            # Vérifiez que le DataFrame n'est pas vide après le filtrage
+            if count_per_period_data.empty:
+                st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
+            else:
+                # Affichage du graphique
+                fig = px.line(
+                    count_per_period_data,
+                    x="periode",
+                    y="Nombre d'objets",
+                    labels={"periode": "Période", "Nombre d'objets": "Nombre d'Objets"},
+                    title=f"Nombre d'Objets Détectés par {granularite}",
+                    color_discrete_sequence=[px.colors.qualitative.Plotly[0]]
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+st.markdown("<h2 style='color: #2E86C1;'>Nombre d'Objets Détectés</h2>", unsafe_allow_html=True)
+if objets_loaded:
+    count_section(selected_categories, granularite)
 
 # Section 2 : Degré de satisfaction des utilisateurs
-st.markdown("<h2 style='color: #2E86C1;'>Degré de Satisfaction des Utilisateurs</h2>", unsafe_allow_html=True)
-if not data_satisfaction.empty:
-    # Vérifiez que la colonne 'genre' existe
-    if 'genre' not in data_satisfaction.columns:
-        st.error("La colonne 'genre' est manquante dans les données de satisfaction.")
-    else:
-        # Dictionnaire de correspondance entre les libellés et les valeurs de la base de données
-        genre_mapping = {
-            "Tous": "Tous",
-            "Femme": "F",
-            "Homme": "H"
-        }
-        
+@st.fragment
+def satisfaction_section(prefetched_genre, prefetched_satisfaction):
+    with section_run("Section 2 : satisfaction"):
         # Créer deux colonnes : une pour les filtres, une pour le graphique
         col1, col2 = st.columns([1, 3])
-        
+
         with col1:
             # Filtre spécifique : genre (choix unique)
             selected_genre_label = st.radio(
@@ -151,19 +181,20 @@ if not data_satisfaction.empty:
                 key='satisfaction_genre',
                 help="Ce filtre s'applique uniquement à cette section."
             )
-            
-            # Récupérer la valeur correspondante dans la base de données
-            selected_genre_value = genre_mapping[selected_genre_label]
-            
-            # Filtrage des données (spécifique : genre)
-            if selected_genre_value == "Tous":
-                filtered_data_satisfaction = data_satisfaction.copy()
+
+            # Filtrage des données (spécifique : genre) appliqué par MySQL sur la satisfaction pré-agrégée
+            # (chaque avis n'est compté qu'une fois, quel que soit le nombre de détections de l'utilisateur),
+            # déjà chargée en parallèle des objets sauf si le genre a changé depuis
+            if selected_genre_label == prefetched_genre:
+                filtered_data_satisfaction = prefetched_satisfaction
             else:
-                filtered_data_satisfaction = data_satisfaction[data_satisfaction["genre"] == selected_genre_value].copy()
-            
+                filtered_data_satisfaction = load_data_from_backend(
+                    SATISFACTION_ENDPOINT, params=satisfaction_params(selected_genre_label)
+                )
+
             # Visualisation des filtres actifs
             st.markdown(f"**Filtre actif :** Genre = {selected_genre_label}")
-        
+
         with col2:
             # Vérifiez que les données filtrées ne sont pas vides
             if filtered_data_satisfaction.empty:
@@ -188,19 +219,19 @@ if not data_satisfaction.empty:
                 )
                 st.plotly_chart(fig, use_container_width=True)
 
+st.markdown("<h2 style='color: #2E86C1;'>Degré de Satisfaction des Utilisateurs</h2>", unsafe_allow_html=True)
+satisfaction_section(prefetched_genre, loaded["/data/satisfaction/aggregate"])
+
 # Section 3 : Vitesse de traitement et temps moyen par détection
-st.markdown("<h2 style='color: #2E86C1;'>Vitesse de Traitement</h2>", unsafe_allow_html=True)
-if not data_objets.empty:
-    # Filtrage des données (global : catégorie)
-    filtered_data_objets = data_objets[data_objets["nom"].isin(selected_categories)].copy()
-    
-    # Créer deux colonnes : une pour les filtres, une pour le graphique
-    col1, col2 = st.columns([1, 3])
-    
-    with col1:
-        # Filtre spécifique : type d'objet
-        if not filtered_data_objets.empty:
-            types_objets = filtered_data_objets["type_objet"].unique()
+@st.fragment
+def vitesse_section(selected_categories, granularite):
+    with section_run("Section 3 : vitesse de traitement"):
+        # Créer deux colonnes : une pour les filtres, une pour le graphique
+        col1, col2 = st.columns([1, 3])
+
+        with col1:
+            # Filtre spécifique : type d'objet
+            types_objets = section_input(detected_types, selected_categories, empty=[])
             selected_types = st.multiselect(
                 "Sélectionner un ou plusieurs types d'objets (spécifique à cette section)",
                 options=types_objets,
@@ -208,45 +239,42 @@ if not data_objets.empty:
                 key='vitesse_filter',
                 help="Ce filtre s'applique uniquement à cette section."
             )
-            filtered_data_objets = filtered_data_objets[filtered_data_objets["type_objet"].isin(selected_types)]
-        
-        # Visualisation des filtres actifs
-        st.markdown(f"**Filtres actifs :** Catégorie = {', '.join(selected_categories)}, Type d'objet = {', '.join(selected_types)}")
-    
-    with col2:
-        # Vérifiez que le DataFrame n'est pas vide après le filtrage
-        if filtered_data_objets.empty:
-            st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
-        else:
-            # Vérifiez que 'date_detection' existe et est correctement formatée
-            if 'date_detection' not in filtered_data_objets.columns:
-                st.error("La colonne 'date_detection' est manquante dans les données filtrées.")
+
+            # Visualisation des filtres actifs
+            st.markdown(f"**Filtres actifs :** Catégorie = {', '.join(selected_categories)}, Type d'objet = {', '.join(selected_types)}")
+
+        with col2:
+            # Calcul du temps moyen de réponse par période (entrée en cache)
+            response_time_data = section_input(response_time_per_period, selected_categories, tuple(selected_types), granularite)
+
+            # Vérifiez que le DataFrame n'est pas vide après le filtrage
+            if response_time_data.empty:
+                st.warning("Aucune donnée ne correspond aux filtres sélectionnés.")
             else:
-                # Convertir 'date_detection' en datetime
-                filtered_data_objets['date_detection'] = pd.to_datetime(filtered_data_objets['date_detection'], errors='coerce')
-                
-                # Vérifiez que la conversion a réussi
-                if filtered_data_objets['date_detection'].isnull().all():
-                    st.error("La colonne 'date_detection' n'a pas pu être convertie en datetime.")
-                else:
-                    # Créer la colonne 'periode'
-                    if granularite == "Semaine":
-                        filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.to_period('W').astype(str)
-                    elif granularite == "Mois":
-                        filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.to_period('M').astype(str)
-                    elif granularite == "Année":
-                        filtered_data_objets['periode'] = filtered_data_objets['date_detection'].dt.to_period('Y').astype(str)
-                    
-                    # Calcul du temps moyen de réponse par période
-                    response_time_per_period = filtered_data_objets.groupby("periode")['temps_reponse'].mean().reset_index(name="Temps Moyen de Réponse (heures)")
-                    
-                    # Affichage du graphique
-                    fig = px.line(
-                        response_time_per_period,
-                        x="periode",
-                        y="Temps Moyen de Réponse (heures)",
-                        labels={"periode": "Période", "Temps Moyen de Réponse (heures)": "Temps Moyen de Réponse (heures)"},
-                        title=f"Temps Moyen de Réponse par {granularite}",
-                        color_discrete_sequence=[px.colors.qualitative.Plotly[3]]
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+                # Médiane et queue de distribution (p95, p99) par période, lues dans les sketches du
+                # backend ; en cas d'erreur de chargement, le graphique garde la moyenne seule
+                quantiles = section_input(load_quantiles, granularite, ["periode"], selected_categories, tuple(selected_types))
+                response_time_data = add_quantiles(response_time_data, quantiles, "periode").dropna(axis=1, how="all")
+
+                # Affichage du graphique
+                fig = px.line(
+                    response_time_data,
+                    x="periode",
+                    y=[c for c in response_time_data.columns if c != "periode"],
+                    labels={"periode": "Période", "value": "Temps de Réponse (heures)", "variable": "Mesure"},
+                    title=f"Temps de Réponse par {granularite} (moyenne et quantiles)",
+                    color_discrete_sequence=px.colors.qualitative.Plotly[3:]
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+st.markdown("<h2 style='color: #2E86C1;'>Vitesse de Traitement</h2>", unsafe_allow_html=True)
+if objets_loaded:
+    vitesse_section(selected_categories, granularite)
+
+# Temps d'exécution complète du script et de réexécution des fragments (médianes des dernières exécutions)
+end_script_run(script_start)
+with st.sidebar:
+    with st.expander("Temps de réexécution"):
+        st.dataframe(rerun_summary(), use_container_width=True, hide_index=True)
+        plans = data.stats()
+        st.caption(f"Plans de données : {plans['calculs']} étapes calculées, {plans['reutilisations']} réutilisées")
@@ -1,46 +1,189 @@
-import random
-import string
+import argparse
+import datetime
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
 import pymysql
-from faker import Faker
 
-# Configuration de connexion à MySQL
+import schema
+
+# Configuration de connexion à MySQL (mêmes variables d'environnement que le backend)
 db_config = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",
-    "database": "prediction"
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", ""),
+    "database": os.environ.get("DB_NAME", "prediction")
 }
 
-# Initialiser Faker pour générer des données réalistes
-faker = Faker()
-faker.unique.clear()  # Réinitialiser le tracker d'unicité au cas où
-
 # Générer des catégories fixes
 categories = [
-    "Transport", "Signalisation et Infrastructure", "Animaux", 
-    "Accessoires personnels", "Sports et Loisirs", 
+    "Transport", "Signalisation et Infrastructure", "Animaux",
+    "Accessoires personnels", "Sports et Loisirs",
     "Cuisine et Nourriture", "Mobilier", "Électronique", "Lecture et Décoration"
 ]
 
 # Générer des types d'objets
 class_names = [
     "person", "bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck", "boat",
-    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", 
-    "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack", 
-    "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball", 
-    "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", 
-    "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", 
-    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", 
-    "chair", "sofa", "pottedplant", "bed", "diningtable", "toilet", "tvmonitor", "laptop", 
-    "mouse", "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink", 
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat",
+    "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack",
+    "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball",
+    "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket",
+    "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple",
+    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake",
+    "chair", "sofa", "pottedplant", "bed", "diningtable", "toilet", "tvmonitor", "laptop",
+    "mouse", "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink",
     "refrigerator", "book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush"
 ]
 
+# Volumes par défaut (une ligne de commande peut générer des dizaines de millions de détections)
+DEFAULT_ROWS = 1000
+
+# Lignes générées puis chargées par tâche (une tâche = un paquet traité par un processus)
+CHUNK_ROWS = 100000
+
+# Période couverte par les détections : les deux dernières années
+DETECTION_DAYS = 730
+
+EMAIL_DOMAINS = np.array(["gmail.com", "yahoo.com", "hotmail.com", "example.org", "example.net"])
+PASSWORD_CHARS = np.array(list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"))
+
+# Colonnes de chaque table alimentée par paquets
+TABLE_COLUMNS = {
+    "utilisateurs": ["id", "email", "mot_de_passe", "nb_predictions", "genre"],
+    "objets": ["id", "utilisateur_id", "type_objet", "image_url", "temps_reponse", "date_detection", "categorie_id"],
+    "satisfactions": ["id", "utilisateur_id", "satisfait", "non_satisfait"],
+}
+
+
+# Génération vectorisée (NumPy) d'un paquet de lignes d'ids first_id .. first_id + count - 1.
+# Chaque paquet a son propre générateur aléatoire, dérivé de la graine : le résultat ne dépend
+# ni du nombre de processus ni de l'ordre d'exécution des paquets.
+def generate_chunk(table, first_id, count, seed, nb_utilisateurs, today):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(first_id, first_id + count, dtype="int64")
+    if table == "utilisateurs":
+        passwords = rng.choice(PASSWORD_CHARS, size=(count, 10)).view("<U10").ravel()
+        return pd.DataFrame({
+            "id": ids,
+            "email": pd.Series(ids).map("user{}@".format) + rng.choice(EMAIL_DOMAINS, count),  # emails uniques
+            "mot_de_passe": passwords,  # mot de passe aléatoire
+            "nb_predictions": rng.integers(0, 101, count),
+            "genre": rng.choice(np.array(["H", "F"]), count),
+        })
+    if table == "objets":
+        sizes = rng.integers(1, 9, size=(count, 2)) * 100
+        return pd.DataFrame({
+            "id": ids,
+            "utilisateur_id": rng.integers(1, nb_utilisateurs + 1, count),
+            "type_objet": np.asarray(class_names)[rng.integers(0, len(class_names), count)],
+            "image_url": pd.Series(sizes[:, 0]).map("https://picsum.photos/{}/".format) + pd.Series(sizes[:, 1]).astype(str),
+            "temps_reponse": np.round(rng.uniform(0.5, 60.0, count), 2),
+            "date_detection": np.datetime64(today) - rng.integers(0, DETECTION_DAYS + 1, count).astype("timedelta64[D]"),
+            "categorie_id": rng.integers(1, len(categories) + 1, count),
+        })
+    return pd.DataFrame({
+        "id": ids,
+        "utilisateur_id": rng.integers(1, nb_utilisateurs + 1, count),
+        "satisfait": rng.integers(0, 2, count),
+        "non_satisfait": rng.integers(0, 2, count),
+    })
+
+
+def connect(config, local_infile=False):
+    conn = pymysql.connect(**config, local_infile=local_infile, autocommit=False)
+    cursor = conn.cursor()
+    # Chargement en masse : contrôles différés pour la session du processus
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    cursor.execute("SET UNIQUE_CHECKS = 0")
+    cursor.close()
+    return conn
+
+
+# Chargement d'un paquet par INSERT multi-lignes (pymysql regroupe executemany en requêtes
+# INSERT ... VALUES (...), (...) d'environ 1 Mo)
+def insert_rows(conn, table, frame):
+    columns = TABLE_COLUMNS[table]
+    placeholders = ", ".join(["%s"] * len(columns))
+    frame = frame.astype({"date_detection": str}) if "date_detection" in frame.columns else frame
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            list(frame[columns].itertuples(index=False, name=None))
+        )
+
+
+# Chargement d'un paquet par LOAD DATA LOCAL INFILE (nécessite local_infile=1 côté serveur)
+def load_rows(conn, table, frame):
+    columns = TABLE_COLUMNS[table]
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, encoding="utf-8") as handle:
+        frame[columns].to_csv(handle, sep="\t", header=False, index=False, lineterminator="\n")
+        path = handle.name
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)})",
+                (path,)
+            )
+    finally:
+        os.remove(path)
+
+
+# Connexion propre à chaque processus du pool, ouverte une fois à son démarrage
+_worker = {}
+
+
+def _init_worker(config, method):
+    _worker["conn"] = connect(config, local_infile=(method == "load-data"))
+    _worker["method"] = method
+
+
+def _process_chunk(task):
+    table, first_id, count, seed, nb_utilisateurs, today = task
+    frame = generate_chunk(table, first_id, count, seed, nb_utilisateurs, today)
+    conn = _worker["conn"]
+    if _worker["method"] == "load-data":
+        load_rows(conn, table, frame)
+    else:
+        insert_rows(conn, table, frame)
+    conn.commit()
+    return count
+
+
+def _tasks(table, total, chunk_rows, seed_sequence, nb_utilisateurs, today):
+    starts = range(1, total + 1, chunk_rows)
+    seeds = seed_sequence.spawn(len(starts))
+    return [
+        (table, start, min(chunk_rows, total - start + 1), seed, nb_utilisateurs, today)
+        for start, seed in zip(starts, seeds)
+    ]
+
+
+def _report(table, done, total, start):
+    elapsed = time.perf_counter() - start
+    rate = done / elapsed if elapsed > 0 else 0
+    print(f"  {table} : {done:,} / {total:,} lignes ({100 * done / total:.1f} %) - {rate:,.0f} lignes/s", flush=True)
+
+
 # Fonction pour insérer des données
-def insert_data():
+# (volumes, graine, nombre de processus, taille des paquets et méthode de chargement paramétrables)
+# Les erreurs MySQL sont propagées : une base partiellement remplie ne doit pas passer pour prête
+def insert_data(config=db_config, nb_utilisateurs=DEFAULT_ROWS, nb_objets=DEFAULT_ROWS,
+                nb_satisfactions=DEFAULT_ROWS, seed=None, processes=None, chunk_rows=CHUNK_ROWS,
+                method="insert"):
+    conn = None
     try:
+        # Base, tables et index créés s'ils manquent (schema.py)
+        for operation in schema.create_schema(config):
+            print(operation)
+
         # Connexion à la base de données avec pymysql
-        conn = pymysql.connect(**db_config)
+        conn = pymysql.connect(**config)
         cursor = conn.cursor()
 
         # Optionnel : Réinitialiser les tables
@@ -49,7 +192,7 @@ def insert_data():
         cursor.execute("TRUNCATE TABLE categories;")
         cursor.execute("TRUNCATE TABLE utilisateurs;")
         cursor.execute("TRUNCATE TABLE objets;")
-        cursor.execute("TRUNCATE TABLE satisfaction;")
+        cursor.execute("TRUNCATE TABLE satisfactions;")
         cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")  # Réactiver les contraintes
 
         # Insérer les catégories
@@ -58,70 +201,59 @@ def insert_data():
             "INSERT INTO categories (id, nom) VALUES (%s, %s)",
             [(i + 1, categories[i]) for i in range(len(categories))]
         )
+        conn.commit()
 
-        # Générer et insérer des utilisateurs
-        print("Insertion des utilisateurs...")
-        utilisateurs = [
-            (
-                i + 1,
-                faker.unique.email(),  # Générer des emails uniques
-                "".join(random.choices(string.ascii_letters + string.digits, k=10)),  # mot de passe aléatoire
-                random.randint(0, 100),  # nb_predictions
-                random.choice(["H", "F"])  # genre
-            )
-            for i in range(1000)
-        ]
-        cursor.executemany(
-            "INSERT INTO utilisateurs (id, email, mot_de_passe, nb_predictions, genre) VALUES (%s, %s, %s, %s, %s)",
-            utilisateurs
-        )
-
-        # Générer et insérer des objets
-        print("Insertion des objets...")
-        objets = [
-            (
-                i + 1,
-                random.randint(1, 1000),  # utilisateur_id
-                random.choice(class_names),  # type_objet
-                faker.image_url(),  # image_url
-                round(random.uniform(0.5, 60.0), 2),  # temps_reponse
-                faker.date_between(start_date="-2y", end_date="today"),  # date_detection
-                random.randint(1, len(categories))  # categorie_id
-            )
-            for i in range(1000)
-        ]
-        cursor.executemany(
-            "INSERT INTO objets (id, utilisateur_id, type_objet, image_url, temps_reponse, date_detection, categorie_id) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-            objets
-        )
-
-        # Générer et insérer des enregistrements de satisfaction
-        print("Insertion des données de satisfaction...")
-        satisfaction = [
-            (
-                i + 1,
-                random.randint(1, 1000),  # utilisateur_id
-                random.randint(0, 1),  # satisfait
-                random.randint(0, 1)  # non_satisfait
-            )
-            for i in range(1000)
-        ]
-        cursor.executemany(
-            "INSERT INTO satisfaction (id, utilisateur_id, satisfait, non_satisfait) VALUES (%s, %s, %s, %s)",
-            satisfaction
-        )
+        # Générer et insérer les autres tables par paquets, en parallèle
+        seed_sequence = np.random.SeedSequence(seed)
+        today = datetime.date.today().isoformat()
+        volumes = {"utilisateurs": nb_utilisateurs, "objets": nb_objets, "satisfactions": nb_satisfactions}
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(config, method)) as pool:
+            for (table, total), table_seed in zip(volumes.items(), seed_sequence.spawn(len(volumes))):
+                if total <= 0:
+                    continue
+                print(f"Insertion des {table}...")
+                start = time.perf_counter()
+                done = 0
+                tasks = _tasks(table, total, chunk_rows, table_seed, nb_utilisateurs, today)
+                for count in pool.imap_unordered(_process_chunk, tasks):
+                    done += count
+                    _report(table, done, total, start)
 
-        # Valider les changements
-        conn.commit()
-        print("Données insérées avec succès !")
+        print("Données insérées avec succès !")
 
-    except pymysql.MySQLError as err:
-        print(f"Erreur : {err}")
     finally:
         # Fermer la connexion si elle est ouverte
         if conn:
-            cursor.close()
             conn.close()
 
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des données synthétiques dans la base MySQL.")
+    parser.add_argument("--utilisateurs", type=int, default=DEFAULT_ROWS, help="nombre d'utilisateurs")
+    parser.add_argument("--objets", type=int, default=DEFAULT_ROWS, help="nombre de détections")
+    parser.add_argument("--satisfactions", type=int, default=DEFAULT_ROWS, help="nombre d'avis")
+    parser.add_argument("--graine", type=int, default=None, help="graine aléatoire (résultat reproductible)")
+    parser.add_argument("--processus", type=int, default=None, help="processus de génération (défaut : nombre de cœurs)")
+    parser.add_argument("--taille-paquet", type=int, default=CHUNK_ROWS, help="lignes par paquet")
+    parser.add_argument("--methode", choices=["insert", "load-data"], default="insert",
+                        help="INSERT multi-lignes ou LOAD DATA LOCAL INFILE")
+    parser.add_argument("--base", default=db_config["database"], help="base de données cible")
+    return parser.parse_args(argv)
+
+
 # Exécuter l'insertion
-insert_data()
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        insert_data(
+            config={**db_config, "database": args.base},
+            nb_utilisateurs=args.utilisateurs,
+            nb_objets=args.objets,
+            nb_satisfactions=args.satisfactions,
+            seed=args.graine,
+            processes=args.processus,
+            chunk_rows=args.taille_paquet,
+            method=args.methode,
+        )
+    except pymysql.MySQLError as err:
+        raise SystemExit(f"Erreur : {err}")
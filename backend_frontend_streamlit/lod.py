@@ -0,0 +1,66 @@
+import pandas as pd
+import plotly.graph_objects as go
+
+from periodes import GRANULARITES, coarsen_keys, label_periods, parse_periods
+
+# Niveau de détail des graphiques : le nombre d'éléments envoyés au navigateur reste borné quel que
+# soit le volume de données (types d'objets, années de détections en granularité Semaine...).
+
+# Nombre de libellés affichés avant regroupement dans "Autres"
+TOP_N = 15
+OTHERS_LABEL = "Autres"
+
+# Nombre maximal de barres (ou de points) d'un graphique avant passage à une granularité plus grossière
+MAX_POINTS = 500
+
+# Au-delà de ce nombre de points, les séries en ligne sont rendues en WebGL (Scattergl)
+WEBGL_POINTS = 1000
+
+
+def top_n(frame, label_column, by, n=TOP_N, other=OTHERS_LABEL):
+    """Garde les n lignes de plus grande valeur by et regroupe les autres en une ligne other.
+
+    frame contient une ligne par libellé ; ses colonnes numériques doivent être additives
+    (nombres, sommes) : les moyennes se calculent après regroupement.
+    """
+    ordered = frame.sort_values(by, ascending=False, ignore_index=True)
+    ordered[label_column] = ordered[label_column].astype(str)
+    if len(ordered) <= n + 1:  # regrouper un seul libellé n'allège rien
+        return ordered
+    others = ordered.iloc[n:].drop(columns=label_column).sum(numeric_only=True)
+    others[label_column] = other
+    return pd.concat([ordered.iloc[:n], others.to_frame().T], ignore_index=True).astype(ordered.dtypes.to_dict())
+
+
+def coarsen(frame, granularite, value_columns, by=(), max_points=MAX_POINTS, column="periode"):
+    """Passe à une granularité plus grossière tant que le graphique dépasse max_points lignes.
+
+    frame : une ligne par (période, *by) avec les libellés de période dans column ; seules les
+    colonnes additives value_columns sont conservées (sommées par nouvelle période).
+    Renvoie (frame, granularité effective).
+    """
+    if len(frame) <= max_points or granularite == GRANULARITES[-1]:
+        return frame, granularite
+    keys = parse_periods(frame[column], granularite)
+    by = list(by)
+    for cible in GRANULARITES[GRANULARITES.index(granularite) + 1:]:
+        coarsened = (
+            frame.assign(cle_lod=coarsen_keys(keys, granularite, cible))
+            .groupby(["cle_lod"] + by, observed=True)[value_columns].sum()
+            .reset_index()
+        )
+        coarsened = label_periods(coarsened[coarsened["cle_lod"] >= 0].copy(), cible, name=column, key_column="cle_lod")
+        coarsened = coarsened.drop(columns="cle_lod")
+        if len(coarsened) <= max_points:
+            break
+    return coarsened, cible
+
+
+def render_mode(points, threshold=WEBGL_POINTS):
+    """Valeur de render_mode pour px.line / px.scatter selon le nombre de points."""
+    return "webgl" if points > threshold else "svg"
+
+
+def scatter_trace(points, threshold=WEBGL_POINTS):
+    """Classe de trace go.Scatter ou go.Scattergl (WebGL) selon le nombre de points de la série."""
+    return go.Scattergl if points > threshold else go.Scatter
@@ -0,0 +1,250 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Bornes des histogrammes de durées (secondes) et de volumes (lignes, octets)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000, 100000000, 1000000000)
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogrammes enregistrés pour chaque route : nom -> (description, bornes, attribut de RequestMetrics)
+HISTOGRAMS = {
+    "backend_requete_secondes": ("Durée totale de la requête HTTP, corps diffusé compris", LATENCY_BUCKETS, "duree"),
+    "backend_acquisition_connexion_secondes": ("Attente d'une connexion du pool", LATENCY_BUCKETS, "acquisition"),
+    "backend_execution_sql_secondes": ("Exécution des requêtes SQL (cursor.execute)", LATENCY_BUCKETS, "execution"),
+    "backend_lecture_lignes_secondes": ("Lecture des lignes (fetch)", LATENCY_BUCKETS, "lecture"),
+    "backend_serialisation_secondes": ("Sérialisation de la réponse (JSON, Arrow, Parquet)", LATENCY_BUCKETS, "serialisation"),
+    "backend_lignes": ("Lignes lues en base", SIZE_BUCKETS, "lignes"),
+    "backend_reponse_octets": ("Taille du corps de la réponse", SIZE_BUCKETS, "octets"),
+}
+
+slow_query_log = logging.getLogger("backend.requetes_lentes")
+
+
+class RequestMetrics:
+    """Mesures d'une requête HTTP, cumulées au fil de son traitement (y compris pendant la diffusion)."""
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.duree = 0.0
+        self.acquisition = 0.0
+        self.execution = 0.0
+        self.lecture = 0.0
+        self.serialisation = 0.0
+        self.lignes = 0
+        self.octets = 0
+
+
+def current():
+    """Mesures de la requête en cours (objet jetable hors requête, ex. tâches de fond)."""
+    if has_request_context():
+        if "metriques" not in g:
+            g.metriques = RequestMetrics()
+        return g.metriques
+    return RequestMetrics()
+
+
+@contextmanager
+def timer(name, metrics=None):
+    """Ajoute la durée du bloc à l'attribut name des mesures de la requête."""
+    metrics = metrics or current()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, name, getattr(metrics, name) + time.perf_counter() - start)
+
+
+@contextmanager
+def serialization(metrics=None):
+    """Mesure un bloc de sérialisation, déduction faite des lectures de lignes qu'il déclenche."""
+    metrics = metrics or current()
+    start = time.perf_counter()
+    database_before = metrics.execution + metrics.lecture
+    try:
+        yield
+    finally:
+        database = metrics.execution + metrics.lecture - database_before
+        metrics.serialisation += time.perf_counter() - start - database
+
+
+class TimedCursor:
+    """Curseur pymysql instrumenté : temps d'exécution, temps de lecture et nombre de lignes.
+
+    Les mesures sont rattachées à la requête HTTP qui a ouvert le curseur, même si les lignes sont
+    lues plus tard pendant la diffusion de la réponse. À la fermeture, une requête SQL dont
+    exécution + lecture dépasse slow_query_seconds est journalisée.
+    """
+
+    def __init__(self, cursor, slow_query_seconds=None):
+        self._cursor = cursor
+        self._metrics = current()
+        self._route = request.path if has_request_context() else None
+        self._slow_query_seconds = slow_query_seconds
+        self._sql = None
+        self._params = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, params=None):
+        self._sql, self._params = sql, params
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._metrics.execution += elapsed
+            self._elapsed += elapsed
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        rows = getattr(self._cursor, method)(*args)
+        elapsed = time.perf_counter() - start
+        self._metrics.lecture += elapsed
+        self._elapsed += elapsed
+        count = len(rows) if method != "fetchone" else int(rows is not None)
+        self._metrics.lignes += count
+        self._rows += count
+        return rows
+
+    def fetchone(self):
+        return self._fetch("fetchone")
+
+    def fetchmany(self, size=None):
+        return self._fetch("fetchmany", size) if size is not None else self._fetch("fetchmany")
+
+    def fetchall(self):
+        return self._fetch("fetchall")
+
+    def close(self):
+        try:
+            self._cursor.close()
+        finally:
+            if (self._slow_query_seconds is not None and self._sql is not None
+                    and self._elapsed >= self._slow_query_seconds):
+                slow_query_log.warning(
+                    "Requête lente (%.3f s, %d lignes) sur %s : %s ; paramètres : %r",
+                    self._elapsed, self._rows, self._route, " ".join(self._sql.split()), self._params
+                )
+            self._sql = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier compartiment : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Histogrammes par route et compteur de requêtes par (route, statut), au format texte Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (métrique, route) -> Histogram
+        self._requests = {}    # (route, statut) -> nombre
+
+    def record(self, route, status, metrics):
+        with self._lock:
+            self._requests[(route, status)] = self._requests.get((route, status), 0) + 1
+            for name, (_, buckets, attribute) in HISTOGRAMS.items():
+                histogram = self._histograms.get((name, route))
+                if histogram is None:
+                    histogram = self._histograms[(name, route)] = Histogram(buckets)
+                histogram.observe(getattr(metrics, attribute))
+
+    def render(self):
+        lines = [
+            "# HELP backend_requetes_total Requêtes HTTP traitées",
+            "# TYPE backend_requetes_total counter",
+        ]
+        with self._lock:
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(f'backend_requetes_total{{route="{_label(route)}",statut="{status}"}} {count}')
+            for name, (description, buckets, _) in HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, route), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = f'route="{_label(route)}"'
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Corps diffusé instrumenté : la production de chaque paquet compte en sérialisation (hors temps de
+# lecture des lignes, déjà mesuré par TimedCursor) et sa taille en octets envoyés.
+def _measured_body(chunks, metrics):
+    iterator = iter(chunks)
+    try:
+        while True:
+            with serialization(metrics):
+                chunk = next(iterator, None)
+            if chunk is None:
+                break
+            metrics.octets += len(chunk) if isinstance(chunk, bytes) else len(chunk.encode("utf-8"))
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def init_app(app, registry):
+    """Mesure chaque requête de l'application et expose les histogrammes sur /metrics."""
+
+    @app.before_request
+    def start_metrics():
+        g.metriques = RequestMetrics()
+
+    @app.after_request
+    def finish_metrics(response):
+        metrics = current()
+        route = request.url_rule.rule if request.url_rule is not None else "inconnue"
+        status = response.status_code
+
+        def record():
+            metrics.duree = time.perf_counter() - metrics.debut
+            registry.record(route, status, metrics)
+
+        if response.is_streamed:
+            # Le corps est produit après la fin de la vue : enregistrement à la fermeture de la réponse
+            response.response = _measured_body(response.response, metrics)
+            response.call_on_close(record)
+        else:
+            metrics.octets = response.content_length or 0
+            record()
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        return Response(registry.render(), content_type=PROMETHEUS_MIMETYPE)
@@ -0,0 +1,167 @@
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from schemas import memory_bytes
+
+# Nombre d'exécutions du script conservées dans l'historique du panneau
+HISTORY_SIZE = 30
+
+# Étapes mesurées, dans l'ordre d'affichage
+STEPS = ["chargement", "preparation", "figure", "affichage"]
+
+_local = threading.local()
+
+
+def cache_miss():
+    """À appeler dans le corps d'une fonction mise en cache : il n'est exécuté qu'en cas d'échec du cache."""
+    _local.miss = True
+
+
+class PerfRecorder:
+    """Mesures d'une exécution du script Streamlit (un rerun).
+
+    Chaque mesure est (étape, nom, secondes, détail) ; les tailles mémoire des DataFrames ne sont
+    calculées que si le panneau est activé (memory_usage(deep=True) parcourt les chaînes).
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.entries = []
+        self.memory = {}
+        self._lock = threading.Lock()
+
+    def record(self, step, name, seconds, detail=""):
+        with self._lock:
+            self.entries.append((step, name, seconds, detail))
+
+    @contextmanager
+    def measure(self, step, name, cached=False):
+        """Chronomètre un bloc ; cached=True : note aussi le succès ou l'échec du cache Streamlit
+        (st.cache_data / st.cache_resource) des fonctions appelées dans le bloc."""
+        _local.miss = False
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            detail = ("échec du cache" if _local.miss else "cache") if cached else ""
+            self.record(step, name, time.perf_counter() - start, detail)
+
+    def frame(self, name, frame):
+        if self.enabled and isinstance(frame, pd.DataFrame):
+            self.memory[name] = (len(frame), memory_bytes(frame))
+
+    def summary(self):
+        totals = {step: 0.0 for step in STEPS}
+        for step, _, seconds, _ in self.entries:
+            totals[step] = totals.get(step, 0.0) + seconds
+        details = [detail for _, _, _, detail in self.entries]
+        totals["total"] = time.perf_counter() - self.start
+        totals["succes_cache"] = details.count("cache")
+        totals["echecs_cache"] = details.count("échec du cache")
+        return totals
+
+
+def render_panel(perf):
+    """Affiche les mesures de l'exécution en cours et l'historique des exécutions précédentes."""
+    summary = perf.summary()
+    history = st.session_state.setdefault("historique_performance", deque(maxlen=HISTORY_SIZE))
+    history.append(summary)
+    if not perf.enabled:
+        return
+
+    st.markdown("---")
+    with st.expander("Performance de l'exécution", expanded=True):
+        columns = st.columns(len(STEPS) + 2)
+        columns[0].metric("Total", f"{summary['total'] * 1000:.0f} ms")
+        for column, step in zip(columns[1:], STEPS):
+            column.metric(step.capitalize(), f"{summary[step] * 1000:.0f} ms")
+        columns[-1].metric("Cache (succès / échecs)", f"{summary['succes_cache']} / {summary['echecs_cache']}")
+
+        st.dataframe(
+            pd.DataFrame(perf.entries, columns=["Étape", "Nom", "Secondes", "Détail"])
+            .assign(ms=lambda frame: (frame["Secondes"] * 1000).round(1))
+            .drop(columns="Secondes"),
+            use_container_width=True,
+            hide_index=True
+        )
+        if perf.memory:
+            st.dataframe(
+                pd.DataFrame(
+                    [(name, rows, size / 1e6) for name, (rows, size) in perf.memory.items()],
+                    columns=["DataFrame", "Lignes", "Mémoire (Mo)"]
+                ),
+                use_container_width=True,
+                hide_index=True
+            )
+
+        st.caption(f"Historique des {len(history)} dernières exécutions (ms)")
+        st.line_chart(pd.DataFrame(list(history))[["total"] + STEPS] * 1000)
+
+
+# Durée de chaque chargement de la page (voir dataset.load_concurrently) dans la barre latérale ;
+# le total est inférieur à la somme grâce au parallélisme
+def render_load_timings(timings):
+    if not timings:
+        return
+    with st.sidebar:
+        with st.expander("Temps de chargement"):
+            for name, seconds in timings.items():
+                if name != "total":
+                    st.caption(f"{name} : {seconds * 1000:.0f} ms")
+            st.caption(
+                f"Total : {timings['total'] * 1000:.0f} ms "
+                f"(somme des requêtes : {sum(v for k, v in timings.items() if k != 'total') * 1000:.0f} ms)"
+            )
+
+
+# Temps de réexécution des sections en fragments (st.fragment). Une exécution de section est
+# « complète » si tout le script a été réexécuté, « fragment » si seule la section l'a été
+# (changement d'un filtre propre à la section). L'historique est gardé dans la session.
+RERUN_KEY = "temps_reexecution"
+
+
+def start_script_run():
+    """À appeler en tête du script : compte les exécutions complètes et renvoie l'instant de départ."""
+    st.session_state["executions_script"] = st.session_state.get("executions_script", 0) + 1
+    return time.perf_counter()
+
+
+def record_rerun(name, mode, seconds):
+    runs = st.session_state.setdefault(RERUN_KEY, {})
+    runs.setdefault((name, mode), deque(maxlen=HISTORY_SIZE)).append(seconds)
+
+
+def end_script_run(start):
+    record_rerun("Script complet", "complète", time.perf_counter() - start)
+
+
+@contextmanager
+def section_run(name):
+    """Chronomètre une section ; une section déjà exécutée depuis le début du script est un fragment."""
+    run = st.session_state.get("executions_script", 0)
+    key = f"execution_section_{name}"
+    mode = "fragment" if st.session_state.get(key) == run else "complète"
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        st.session_state[key] = run
+        record_rerun(name, mode, time.perf_counter() - start)
+
+
+def rerun_summary():
+    runs = st.session_state.get(RERUN_KEY, {})
+    return pd.DataFrame(
+        [
+            (name, mode, len(durations), statistics.median(durations) * 1000, durations[-1] * 1000)
+            for (name, mode), durations in sorted(runs.items())
+        ],
+        columns=["Section", "Exécution", "Nombre", "Médiane (ms)", "Dernière (ms)"]
+    ).round(1)
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+# Granularités proposées par les tableaux de bord
+GRANULARITES = ["Semaine", "Mois", "Année"]
+
+# Colonne de clé entière associée à chaque granularité :
+#   Semaine : année ISO * 100 + semaine ISO (202405)
+#   Mois    : année * 100 + mois           (202403)
+#   Année   : année                        (2024)
+# Les clés sont triables et se concatènent sans perte (contrairement aux catégories pandas).
+PERIOD_KEY_COLUMNS = {
+    "Semaine": "cle_semaine",
+    "Mois": "cle_mois",
+    "Année": "cle_annee",
+}
+
+
+# Ajoute les clés de période des trois granularités, calculées une seule fois au chargement.
+# Les dates invalides (NaT) donnent une clé manquante, ignorée par les groupby.
+def add_period_keys(frame, column="date_detection"):
+    if frame.empty or column not in frame.columns:
+        return frame
+    dates = frame[column]
+    iso = dates.dt.isocalendar()
+    year = dates.dt.year.astype("Int32")
+    frame[PERIOD_KEY_COLUMNS["Semaine"]] = iso["year"].astype("Int32") * 100 + iso["week"].astype("Int32")
+    frame[PERIOD_KEY_COLUMNS["Mois"]] = year * 100 + dates.dt.month.astype("Int32")
+    frame[PERIOD_KEY_COLUMNS["Année"]] = year
+    return frame
+
+
+# Libellé d'une clé, identique à celui produit par le backend (PERIOD_SQL) : "2024-W05", "2024-03", "2024"
+def format_period(key, granularite):
+    key = int(key)
+    if granularite == "Semaine":
+        return f"{key // 100}-W{key % 100:02d}"
+    if granularite == "Mois":
+        return f"{key // 100}-{key % 100:02d}"
+    return str(key)
+
+
+# Convertit des clés en libellés catégoriels ordonnés chronologiquement.
+# Seules les clés distinctes (quelques centaines au plus) sont formatées.
+def period_labels(keys, granularite):
+    values = pd.array(keys, dtype="Int64")
+    missing = np.asarray(values.isna())
+    numbers = values.to_numpy(dtype="int64", na_value=0)
+    uniques = np.unique(numbers[~missing])
+    codes = np.searchsorted(uniques, numbers).astype("int64")
+    codes[missing] = -1
+    labels = [format_period(key, granularite) for key in uniques]
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+# Ajoute la colonne de libellés "periode" à partir de la clé de la granularité choisie
+# (key_column : colonne de clé à utiliser si elle ne porte pas le nom standard de PERIOD_KEY_COLUMNS)
+def label_periods(frame, granularite, name="periode", key_column=None):
+    frame[name] = period_labels(frame[key_column or PERIOD_KEY_COLUMNS[granularite]], granularite)
+    return frame
+
+
+# Clé entière d'un libellé produit par le backend ou par format_period ("2024-W05" -> 202405)
+def parse_period(label, granularite):
+    label = str(label)
+    if granularite == "Semaine":
+        year, week = label.split("-W")
+        return int(year) * 100 + int(week)
+    if granularite == "Mois":
+        year, month = label.split("-")
+        return int(year) * 100 + int(month)
+    return int(label)
+
+
+# Clés entières d'une série de libellés : seuls les libellés distincts sont analysés.
+# Un libellé manquant donne la clé -1, qui ne correspond à aucune période.
+def parse_periods(labels, granularite):
+    labels = pd.Series(labels).astype("category")
+    uniques = np.array([parse_period(label, granularite) for label in labels.cat.categories] + [-1], dtype="int64")
+    return uniques[labels.cat.codes.to_numpy()]
+
+
+# Clés d'une granularité plus grossière (Semaine -> Mois ou Année, Mois -> Année).
+# Une semaine ISO est rattachée au mois de son jeudi (comme son année ISO) ; seules les clés distinctes
+# sont converties. Les clés manquantes (-1) restent manquantes.
+def coarsen_keys(keys, granularite, cible):
+    keys = np.asarray(keys, dtype="int64")
+    if cible == granularite:
+        return keys
+    if granularite == "Mois":
+        return np.where(keys < 0, -1, keys // 100)
+    uniques, codes = np.unique(keys, return_inverse=True)
+    valid = uniques >= 0
+    thursdays = pd.to_datetime(
+        [f"{key // 100}-W{key % 100:02d}-4" for key in uniques[valid]], format="%G-W%V-%u"
+    )
+    converted = np.full(len(uniques), -1, dtype="int64")
+    if cible == "Mois":
+        converted[valid] = thursdays.year * 100 + thursdays.month
+    else:
+        converted[valid] = thursdays.year
+    return converted[codes.ravel()]
+
+
+# Fréquence pandas des débuts de période de chaque granularité (lundi ISO, 1er du mois, 1er janvier)
+PERIOD_START_FREQUENCIES = {
+    "Semaine": "W-MON",
+    "Mois": "MS",
+    "Année": "YS",
+}
+
+
+# Date de début de chaque clé de période (DatetimeIndex)
+def period_starts(keys, granularite):
+    keys = np.asarray(keys, dtype="int64")
+    if granularite == "Semaine":
+        return pd.DatetimeIndex(pd.to_datetime([f"{key // 100}-W{key % 100:02d}-1" for key in keys], format="%G-W%V-%u"))
+    if granularite == "Mois":
+        return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({"year": keys // 100, "month": keys % 100, "day": 1})))
+    return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({"year": keys, "month": 1, "day": 1})))
+
+
+# Libellés des périodes commençant aux dates données ("2024-W05", "2024-03", "2024")
+def start_labels(starts, granularite):
+    keys = add_period_keys(pd.DataFrame({"date_detection": starts}))[PERIOD_KEY_COLUMNS[granularite]]
+    return period_labels(keys, granularite)
+
+
+# Tableau (période x columns) des sommes de values, indexé par la date de début de chaque période
+# sur un intervalle continu : les périodes absentes de frame (aucune détection) valent 0.
+# order : colonnes du résultat (toutes présentes, même sans donnée) ; column : libellés de période.
+def pivot_periods(frame, granularite, columns, values, order=None, column="periode"):
+    keys = parse_periods(frame[column], granularite)
+    valid = keys >= 0
+    uniques, codes = np.unique(keys[valid], return_inverse=True)
+    if len(uniques) == 0:
+        return pd.DataFrame(columns=order, index=pd.DatetimeIndex([], name="debut"), dtype="float64")
+    starts = period_starts(uniques, granularite)
+    matrix = frame[valid].assign(debut=starts[codes]).pivot_table(
+        index="debut", columns=columns, values=values, aggfunc="sum", fill_value=0, observed=True
+    )
+    full = pd.date_range(starts[0], starts[-1], freq=PERIOD_START_FREQUENCIES[granularite], name="debut")
+    return matrix.reindex(index=full, columns=order if order is not None else matrix.columns, fill_value=0)
@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import deque
+
+import pymysql
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion libre n'a pu être obtenue dans le délai imparti."""
+
+
+class PooledConnection:
+    """Connexion empruntée au pool : close() la rend au pool au lieu de la fermer."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Pool borné de connexions pymysql.
+
+    - min_size connexions sont gardées chaudes (jamais évincées pour inactivité) ;
+    - au-delà, une connexion inactive depuis plus de idle_timeout secondes est fermée ;
+    - chaque emprunt vérifie la connexion avec ping() et la recrée si elle est morte ;
+    - si max_size connexions sont déjà empruntées, on attend au plus wait_timeout secondes.
+    """
+
+    def __init__(self, connect_kwargs, min_size=2, max_size=10, idle_timeout=300.0, wait_timeout=10.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Tailles de pool invalides : 0 <= min_size <= max_size et max_size >= 1")
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connexion, instant de dernière utilisation)
+        self._in_use = 0
+        self._opening = 0  # connexions de préchauffage en cours d'ouverture (comptées dans la taille)
+        self._warm = False
+        self._warming = False
+
+        # Statistiques
+        self._created = 0
+        self._closed = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._ping_failures = 0
+        self._peak_in_use = 0
+
+    def _size(self):
+        return len(self._idle) + self._in_use + self._opening
+
+    def _connect(self):
+        conn = pymysql.connect(**self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._closed += 1
+
+    def _evict_idle(self, now):
+        # Appelée sous verrou : ferme les connexions inactives au-delà de min_size
+        evicted = []
+        while len(self._idle) > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.popleft()
+            evicted.append(conn)
+        return evicted
+
+    def _warm_up(self):
+        # Ouvre les min_size premières connexions au premier emprunt. Les places sont réservées sous
+        # verrou (_opening), si bien que le pool ne dépasse jamais max_size ; en cas d'échec (base
+        # indisponible), l'erreur est propagée et le préchauffage sera retenté au prochain emprunt.
+        with self._cond:
+            if self._warm or self._warming:
+                return
+            missing = max(self.min_size - self._size(), 0)
+            self._warming = True
+            self._opening += missing
+        try:
+            while missing:
+                conn = self._connect()
+                with self._cond:
+                    self._opening -= 1
+                    missing -= 1
+                    self._idle.append((conn, time.monotonic()))
+                    self._cond.notify()
+            with self._cond:
+                self._warm = True
+        finally:
+            with self._cond:
+                self._opening -= missing
+                self._warming = False
+                self._cond.notify_all()
+
+    def acquire(self):
+        self._warm_up()
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        waited = False
+        conn = None
+        create = False
+
+        with self._cond:
+            while True:
+                evicted = self._evict_idle(time.monotonic())
+                if self._idle:
+                    # LIFO : la connexion la plus récemment utilisée est la plus chaude
+                    conn, _ = self._idle.pop()
+                    break
+                if self._size() < self.max_size:
+                    create = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Aucune connexion disponible après {self.wait_timeout:.1f}s "
+                        f"({self.max_size} connexions en cours d'utilisation)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._acquired += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            if waited:
+                elapsed = time.monotonic() - start
+                self._waits += 1
+                self._wait_time_total += elapsed
+                self._wait_time_max = max(self._wait_time_max, elapsed)
+
+        for old in evicted:
+            self._close_quietly(old)
+
+        try:
+            if create:
+                conn = self._connect()
+            else:
+                try:
+                    conn.ping(reconnect=False)
+                except pymysql.MySQLError:
+                    # Connexion coupée par le serveur (wait_timeout MySQL, redémarrage...)
+                    with self._cond:
+                        self._ping_failures += 1
+                    self._close_quietly(conn)
+                    conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        healthy = conn.open
+        if healthy:
+            try:
+                # Terminer la transaction courante pour ne pas garder un instantané périmé
+                conn.rollback()
+            except pymysql.MySQLError:
+                healthy = False
+        if not healthy:
+            self._close_quietly(conn)
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "taille": self._size(),
+                "inactives": len(self._idle),
+                "utilisees": self._in_use,
+                "pic_utilisees": self._peak_in_use,
+                "creees": self._created,
+                "fermees": self._closed,
+                "emprunts": self._acquired,
+                "attentes": self._waits,
+                "temps_attente_total_s": round(self._wait_time_total, 6),
+                "temps_attente_moyen_s": round(self._wait_time_total / self._waits, 6) if self._waits else 0.0,
+                "temps_attente_max_s": round(self._wait_time_max, 6),
+                "delais_depasses": self._timeouts,
+                "echecs_ping": self._ping_failures,
+            }
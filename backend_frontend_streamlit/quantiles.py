@@ -0,0 +1,335 @@
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from periodes import PERIOD_KEY_COLUMNS, add_period_keys, format_period
+
+# Quantiles de temps_reponse sans transfert des détections : un sketch DDSketch par
+# (granularité, période, catégorie, type d'objet), maintenu incrémentalement par le backend.
+# Les sketches sont fusionnables : un quantile par période (toutes catégories), par type ou global
+# s'obtient en fusionnant les sketches des groupes, avec la même garantie d'erreur relative.
+
+# Erreur relative maximale d'un quantile (1 % : le p95 de 40 h est lu entre 39,6 h et 40,4 h)
+RELATIVE_ACCURACY = 0.01
+
+# Quantiles renvoyés par défaut par /data/objets/quantiles
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Dimensions de regroupement proposées par /data/objets/quantiles
+DIMENSIONS = ("periode", "categorie", "type_objet")
+
+# Valeur en deçà de laquelle une valeur est comptée dans le panier zéro
+MIN_INDEXABLE_VALUE = 1e-9
+
+# Colonnes lues par l'index (dans l'ordre de la requête SQL)
+COLUMNS = ["id", "date_detection", "categorie", "type_objet", "temps_reponse"]
+
+# Lignes regroupées par lot lors d'une construction complète : chaque groupe du lot ne coûte
+# qu'un update() numpy, quel que soit son nombre de lignes
+BUILD_BATCH_ROWS = 100000
+
+
+class IndexNotReady(Exception):
+    """Les sketches sont en cours de construction : le backend répond 503."""
+
+
+class DDSketch:
+    """Sketch de quantiles à erreur relative bornée (DDSketch, Masson et al., 2019).
+
+    Une valeur positive x tombe dans le panier ceil(log_gamma(x)), gamma = (1 + a) / (1 - a) :
+    tout quantile est estimé à a près en valeur relative, avec un panier par ordre de grandeur
+    relatif (quelques centaines pour temps_reponse). Les paniers consécutifs sont stockés dans un
+    tableau numpy (counts[i] : panier offset + i) ; deux sketches de même précision se fusionnent
+    en additionnant leurs tableaux. Les valeurs nulles ou négatives (temps de réponse manquant ou
+    nul) sont comptées dans le panier zéro.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.offset = 0  # panier de counts[0]
+        self.counts = np.zeros(0, dtype=np.int32)  # nombre de valeurs par panier
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.update([value])
+
+    def update(self, values):
+        """Ajoute un tableau de valeurs (paniers calculés et comptés en une passe numpy)."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        keys = np.ceil(np.log(values[values > MIN_INDEXABLE_VALUE]) / self._log_gamma).astype(np.int64)
+        if len(keys):
+            low = int(keys.min())
+            self._add_bins(low, np.bincount(keys - low))
+        self.zero_count += len(values) - len(keys)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _add_bins(self, offset, counts):
+        end = max(self.offset + len(self.counts), offset + len(counts))
+        low = min(self.offset, offset) if len(self.counts) else offset
+        if low != self.offset or end != self.offset + len(self.counts):
+            grown = np.zeros(end - low, dtype=self.counts.dtype)
+            grown[self.offset - low:self.offset - low + len(self.counts)] = self.counts
+            self.offset, self.counts = low, grown
+        self.counts[offset - self.offset:offset - self.offset + len(counts)] += counts
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Fusion de sketches de précisions différentes")
+        if len(other.counts):
+            self._add_bins(other.offset, other.counts)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Valeur du quantile q (0 <= q <= 1), None si le sketch est vide."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        # Premier panier dont le compte cumulé dépasse le rang
+        position = int(np.searchsorted(self.zero_count + np.cumsum(self.counts), rank, side="right"))
+        if position >= len(self.counts):
+            return self.max
+        # Milieu (en erreur relative) du panier ]gamma^(key-1), gamma^key]
+        value = 2 * self.gamma ** (self.offset + position) / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+
+class QuantileIndex:
+    """Sketches de temps_reponse par (granularité, période, catégorie, type d'objet).
+
+    La construction complète (premier chargement, base régénérée) se fait dans un thread
+    d'arrière-plan lancé au premier appel de refresh() : tant qu'elle n'est pas terminée,
+    refresh() lève IndexNotReady. Ensuite refresh() ne lit que les détections d'id supérieur au
+    dernier id lu (la table objets ne reçoit que des insertions). Le thread vérifie toutes les
+    check_interval secondes, sur sa propre connexion et sans bloquer refresh(), que le nombre de
+    lignes d'id inférieur ou égal au dernier id lu correspond à ce qui a été lu ; sinon (suppression)
+    il reconstruit les sketches à côté de l'index servi, substitué une fois prêt.
+    """
+
+    def __init__(self, get_connection, open_cursor=None, relative_accuracy=RELATIVE_ACCURACY, chunk_size=5000,
+                 check_interval=60):
+        self.get_connection = get_connection
+        self.open_cursor = open_cursor or (lambda conn: conn.cursor(pymysql.cursors.SSCursor))
+        self.relative_accuracy = relative_accuracy
+        self.chunk_size = chunk_size
+        self.check_interval = check_interval
+        self._refresh_lock = threading.Lock()  # lectures de la base, une à la fois
+        self._lock = threading.Lock()  # sketches
+        self._wake = threading.Event()
+        self._thread = None
+        self._sketches = {granularite: {} for granularite in PERIOD_KEY_COLUMNS}
+        self.last_id = 0
+        self.rows = 0
+        self.ready = False
+        self.error = None
+
+    def start(self):
+        """Lance la construction puis la vérification périodique des sketches (thread démon)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="quantiles", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if not self.ready or not self._consistent():
+                    self._build()
+                self.error = None
+            except Exception as err:  # base indisponible : nouvel essai au cycle suivant
+                self.error = str(err)
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Ajoute les nouvelles détections aux sketches ; renvoie le nombre de lignes lues.
+
+        Lève IndexNotReady tant que les sketches sont en construction.
+        """
+        if not self.ready:
+            self.start()
+            raise IndexNotReady(self._not_ready_message())
+        before = self.rows
+        if not self._update():
+            raise IndexNotReady(self._not_ready_message())
+        return self.rows - before
+
+    def _not_ready_message(self):
+        message = "Index des quantiles en cours de construction, réessayer dans quelques secondes"
+        return f"{message} (dernière erreur : {self.error})" if self.error else message
+
+    def _max_id(self, conn):
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS id_max FROM objets")
+            return cursor.fetchone()["id_max"]
+        finally:
+            cursor.close()
+
+    # Vrai si la table contient encore exactement les lignes lues (aucune suppression). Le comptage
+    # parcourt la clé primaire jusqu'au dernier id lu : il se fait hors de _refresh_lock.
+    def _consistent(self):
+        with self._lock:
+            last_id, rows = self.last_id, self.rows
+        with self.get_connection() as conn:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            try:
+                cursor.execute("SELECT COUNT(*) AS nb FROM objets WHERE id <= %s", (last_id,))
+                return cursor.fetchone()["nb"] == rows
+            finally:
+                cursor.close()
+
+    def _chunks(self, conn, since_id, until_id):
+        cursor = self.open_cursor(conn)
+        try:
+            cursor.execute("""
+            SELECT o.id, o.date_detection, c.nom, o.type_objet, o.temps_reponse
+            FROM objets o
+            LEFT JOIN categories c ON o.categorie_id = c.id
+            WHERE o.id > %s AND o.id <= %s
+            ORDER BY o.id
+            """, (since_id, until_id))
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def _update(self):
+        # Lecture des seules nouvelles lignes ; les sketches sont modifiés sous verrou, bloc par bloc.
+        # Renvoie False (et réveille le thread pour une reconstruction) si la table a été régénérée.
+        with self._refresh_lock:
+            with self.get_connection() as conn:
+                id_max = self._max_id(conn)
+                if id_max >= self.last_id:
+                    for rows in self._chunks(conn, self.last_id, id_max):
+                        with self._lock:
+                            self._add(self._sketches, rows)
+                            self.last_id = rows[-1][0]
+                            self.rows += len(rows)
+                    return True
+            self.ready = False
+        self._wake.set()
+        return False
+
+    def _build(self):
+        # Nouveaux sketches construits sans verrou : refresh() continue de compléter l'index servi.
+        # _refresh_lock n'est pris que pour lire les lignes arrivées entre-temps et substituer l'index.
+        sketches = {granularite: {} for granularite in PERIOD_KEY_COLUMNS}
+        last_id = rows_read = 0
+        batch = []
+        with self.get_connection() as conn:
+            for rows in self._chunks(conn, 0, self._max_id(conn)):
+                batch.extend(rows)
+                if len(batch) >= BUILD_BATCH_ROWS:
+                    self._add(sketches, batch)
+                    batch = []
+                last_id = rows[-1][0]
+                rows_read += len(rows)
+        if batch:
+            self._add(sketches, batch)
+        with self._refresh_lock:
+            with self.get_connection() as conn:
+                for rows in self._chunks(conn, last_id, self._max_id(conn)):
+                    self._add(sketches, rows)
+                    last_id = rows[-1][0]
+                    rows_read += len(rows)
+            with self._lock:
+                self._sketches = sketches
+                self.last_id = last_id
+                self.rows = rows_read
+                self.ready = True
+
+    def _add(self, sketches, rows):
+        # Un bloc de lignes : clés de période vectorisées, puis un update() numpy par groupe du bloc
+        frame = pd.DataFrame.from_records(rows, columns=COLUMNS)
+        frame["date_detection"] = pd.to_datetime(frame["date_detection"], errors="coerce")
+        frame["temps_reponse"] = pd.to_numeric(frame["temps_reponse"], errors="coerce")
+        frame = add_period_keys(frame.dropna(subset=["date_detection", "temps_reponse"]).reset_index(drop=True))
+        if frame.empty:
+            return
+        values = frame["temps_reponse"].to_numpy(dtype=np.float64)
+        category_codes, category_values = pd.factorize(frame["categorie"])  # valeur manquante : -1
+        type_codes, type_values = pd.factorize(frame["type_objet"])
+        for granularite, key_column in PERIOD_KEY_COLUMNS.items():
+            codes = pd.DataFrame({
+                "cle": frame[key_column].to_numpy(dtype=np.int64),
+                "categorie": category_codes,
+                "type_objet": type_codes,
+            })
+            for (key, category, type_code), positions in codes.groupby(list(codes.columns), sort=False).indices.items():
+                group = (
+                    int(key),
+                    category_values[category] if category >= 0 else None,
+                    type_values[type_code] if type_code >= 0 else None,
+                )
+                sketch = sketches[granularite].get(group)
+                if sketch is None:
+                    sketch = sketches[granularite][group] = DDSketch(self.relative_accuracy)
+                sketch.update(values[positions])
+
+    def query(self, granularite, by=("periode", "categorie"), categories=None, types_objets=None, quantiles=DEFAULT_QUANTILES):
+        """Quantiles par groupe de by (dimensions de DIMENSIONS), après fusion des sketches.
+
+        Chaque ligne contient les dimensions de by, nb_objets et une colonne pNN par quantile.
+        """
+        positions = [DIMENSIONS.index(dimension) for dimension in by]
+        merged = {}
+        with self._lock:
+            for group, sketch in self._sketches[granularite].items():
+                if categories and group[1] not in categories:
+                    continue
+                if types_objets and group[2] not in types_objets:
+                    continue
+                # Libellé de période identique à celui du backend (PERIOD_SQL) : "2024-W05", "2024-03", "2024"
+                group = (format_period(group[0], granularite),) + group[1:]
+                key = tuple(group[position] for position in positions)
+                if key not in merged:
+                    merged[key] = DDSketch(self.relative_accuracy)
+                merged[key].merge(sketch)
+        rows = []
+        for key in sorted(merged, key=lambda key: tuple("" if value is None else value for value in key)):
+            sketch = merged[key]
+            row = dict(zip(by, key))
+            row["nb_objets"] = sketch.count
+            for q in quantiles:
+                row[quantile_column(q)] = sketch.quantile(q)
+            rows.append(row)
+        return rows
+
+    def stats(self):
+        with self._lock:
+            sketches = [sketch for groups in self._sketches.values() for sketch in groups.values()]
+            return {
+                "pret": self.ready,
+                "erreur": self.error,
+                "lignes": self.rows,
+                "dernier_id": self.last_id,
+                "sketches": {granularite: len(groups) for granularite, groups in self._sketches.items()},
+                "paniers": sum(len(sketch.counts) for sketch in sketches),
+                "octets_paniers": sum(sketch.counts.nbytes for sketch in sketches),
+            }
+
+
+# Nom de colonne d'un quantile : 0.5 -> "p50", 0.95 -> "p95", 0.999 -> "p99.9"
+def quantile_column(q):
+    return f"p{q * 100:g}"
@@ -0,0 +1,208 @@
+import argparse
+import sys
+
+import pymysql
+from werkzeug.datastructures import MultiDict
+
+# Schéma de la base : tables créées dans l'ordre (clés étrangères), avec les index composites
+# utilisés par les requêtes du backend :
+#   - objets (categorie_id, type_objet, date_detection, temps_reponse) : filtres catégorie / type /
+#     dates et agrégats par période lus dans l'index seul (index couvrant) ;
+#   - objets (utilisateur_id, categorie_id) : jointures avec utilisateurs et satisfactions, nombre
+#     de détections par utilisateur (satisfaction au prorata) ;
+#   - objets (date_detection) : filtres de dates sans catégorie ;
+#   - satisfactions (utilisateur_id, satisfait, non_satisfait) : avis sommés par utilisateur sans
+#     lire la table.
+TABLES = {
+    "categories": """
+    CREATE TABLE IF NOT EXISTS categories (
+        id INT NOT NULL PRIMARY KEY,
+        nom VARCHAR(100) NOT NULL,
+        UNIQUE KEY uq_categories_nom (nom)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    "utilisateurs": """
+    CREATE TABLE IF NOT EXISTS utilisateurs (
+        id INT NOT NULL PRIMARY KEY,
+        email VARCHAR(255) NOT NULL,
+        mot_de_passe VARCHAR(255) NOT NULL,
+        nb_predictions INT NOT NULL DEFAULT 0,
+        genre CHAR(1) NOT NULL,
+        UNIQUE KEY uq_utilisateurs_email (email)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    "objets": """
+    CREATE TABLE IF NOT EXISTS objets (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        utilisateur_id INT NOT NULL,
+        type_objet VARCHAR(50) NOT NULL,
+        image_url VARCHAR(255),
+        temps_reponse DECIMAL(6, 2) NOT NULL,
+        date_detection DATE NOT NULL,
+        categorie_id INT NOT NULL,
+        CONSTRAINT fk_objets_utilisateur FOREIGN KEY (utilisateur_id) REFERENCES utilisateurs (id),
+        CONSTRAINT fk_objets_categorie FOREIGN KEY (categorie_id) REFERENCES categories (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    "satisfactions": """
+    CREATE TABLE IF NOT EXISTS satisfactions (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        utilisateur_id INT NOT NULL,
+        satisfait TINYINT NOT NULL DEFAULT 0,
+        non_satisfait TINYINT NOT NULL DEFAULT 0,
+        CONSTRAINT fk_satisfactions_utilisateur FOREIGN KEY (utilisateur_id) REFERENCES utilisateurs (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+}
+
+# Index secondaires : (table, nom) -> colonnes. Ajoutés aussi aux bases créées à la main (migrate).
+INDEXES = {
+    ("objets", "idx_objets_categorie_type_date"): ("categorie_id", "type_objet", "date_detection", "temps_reponse"),
+    ("objets", "idx_objets_utilisateur_categorie"): ("utilisateur_id", "categorie_id"),
+    ("objets", "idx_objets_date"): ("date_detection",),
+    ("satisfactions", "idx_satisfactions_utilisateur"): ("utilisateur_id", "satisfait", "non_satisfait"),
+    ("utilisateurs", "idx_utilisateurs_genre"): ("genre",),
+}
+
+# Tables dont un parcours complet est refusé par la vérification (au-delà de seuil lignes estimées)
+LARGE_TABLES = ("objets", "satisfactions", "utilisateurs")
+FULL_SCAN_THRESHOLD = 10000
+
+# Types d'accès EXPLAIN qui lisent toute la table : parcours de la table (ALL) ou de tout un index (index)
+FULL_SCAN_TYPES = {"ALL": "table", "index": "index complet"}
+
+
+def _cursor(conn):
+    return conn.cursor(pymysql.cursors.DictCursor)
+
+
+def create_database(config):
+    """Crée la base de config["database"] si elle n'existe pas."""
+    server_config = {key: value for key, value in config.items() if key != "database"}
+    conn = pymysql.connect(**server_config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE DATABASE IF NOT EXISTS `{config['database']}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+            )
+    finally:
+        conn.close()
+
+
+def existing_indexes(conn):
+    with _cursor(conn) as cursor:
+        cursor.execute("""
+        SELECT TABLE_NAME AS nom_table, INDEX_NAME AS nom_index
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        """)
+        return {(row["nom_table"], row["nom_index"]) for row in cursor.fetchall()}
+
+
+def existing_tables(conn):
+    with _cursor(conn) as cursor:
+        cursor.execute("SELECT TABLE_NAME AS nom FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+        return {row["nom"] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    """Met une base existante au niveau du schéma ; renvoie la liste des opérations effectuées."""
+    operations = []
+    tables = existing_tables(conn)
+    with conn.cursor() as cursor:
+        # Anciennes bases (et ancien générateur) : table satisfaction au singulier
+        if "satisfaction" in tables and "satisfactions" not in tables:
+            cursor.execute("RENAME TABLE satisfaction TO satisfactions")
+            operations.append("RENAME TABLE satisfaction TO satisfactions")
+        for name, ddl in TABLES.items():
+            cursor.execute(ddl)
+        indexes = existing_indexes(conn)
+        for (table, index), columns in INDEXES.items():
+            if (table, index) not in indexes:
+                statement = f"ALTER TABLE {table} ADD INDEX {index} ({', '.join(columns)})"
+                cursor.execute(statement)
+                operations.append(statement)
+    conn.commit()
+    return operations
+
+
+def create_schema(config):
+    """Crée la base, les tables et les index manquants (sans toucher aux données)."""
+    create_database(config)
+    conn = pymysql.connect(**config)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+
+# Requêtes représentatives de chaque route du backend, construites par ses propres fonctions
+# (mêmes filtres que les tableaux de bord : catégorie sélectionnée, types, dates, genre)
+def backend_queries():
+    import backend
+
+    filters = [("categorie", "Transport")]
+    types = [("type_objet", "car"), ("type_objet", "bus")]
+    dates = [("date_from", "2024-01-01"), ("date_to", "2024-06-30")]
+    columns = [("colonnes", "type_objet,temps_reponse,date_detection,categorie")]
+    cases = {
+        "/data/objets (catégorie)": backend.objets_query(MultiDict(filters + columns)),
+        "/data/objets (catégorie, types, dates)": backend.objets_query(MultiDict(filters + types + dates + columns)),
+        "/data/objets (delta since_id)": backend.objets_query(MultiDict(filters + columns + [("since_id", "1000")])),
+        "/data/objets (genre)": backend.objets_query(MultiDict(filters + [("genre", "F")])),
+        "/data/satisfaction (catégorie)": backend.satisfaction_query(MultiDict(filters)),
+        "/data/categories": ("SELECT * FROM categories", ()),
+    }
+    for granularite in ("Semaine", "Mois", "Année"):
+        args = filters + [("granularite", granularite)]
+        cases[f"/data/objets/aggregate ({granularite})"] = backend.objets_aggregate_query(MultiDict(args))
+        cases[f"/data/objets/aggregate ({granularite}, types)"] = backend.objets_aggregate_query(MultiDict(args + types))
+        cases[f"/data/satisfaction/aggregate ({granularite})"] = backend.satisfaction_aggregate_query(MultiDict(args))
+        cases[f"/data/satisfaction/aggregate ({granularite}, par type, genre)"] = backend.satisfaction_aggregate_query(
+            MultiDict(args + [("par_type", "1"), ("genre", "H")])
+        )
+    return cases
+
+
+def check_query_plans(conn, queries, threshold=FULL_SCAN_THRESHOLD):
+    """EXPLAIN de chaque requête ; renvoie les parcours complets (types ALL et index) d'une grande table."""
+    failures = []
+    with _cursor(conn) as cursor:
+        for name, (sql, params) in queries.items():
+            cursor.execute("EXPLAIN " + sql.strip().rstrip(";"), params)
+            for row in cursor.fetchall():
+                if row["type"] in FULL_SCAN_TYPES and row["table"] in LARGE_TABLES and (row["rows"] or 0) >= threshold:
+                    failures.append((name, row["table"], FULL_SCAN_TYPES[row["type"]], row["rows"], row.get("Extra")))
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Schéma de la base et vérification des plans d'exécution.")
+    commands = parser.add_subparsers(dest="commande", required=True)
+    commands.add_parser("creer", help="crée la base, les tables et les index manquants")
+    check = commands.add_parser("verifier", help="EXPLAIN de chaque requête du backend")
+    check.add_argument("--seuil", type=int, default=FULL_SCAN_THRESHOLD,
+                       help="lignes estimées à partir desquelles un parcours complet est refusé")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Même connexion que le backend (variables DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+    from backend import DB_CONFIG
+
+    if args.commande == "creer":
+        for operation in create_schema(DB_CONFIG):
+            print(operation)
+        print("Schéma à jour.")
+    else:
+        conn = pymysql.connect(**DB_CONFIG)
+        try:
+            failures = check_query_plans(conn, backend_queries(), args.seuil)
+        finally:
+            conn.close()
+        for name, table, scan, rows, extra in failures:
+            print(f"Parcours complet de {table} ({scan}, ~{rows} lignes) : {name} [{extra}]")
+        if failures:
+            sys.exit(1)
+        print("Aucun parcours complet d'une grande table.")
@@ -0,0 +1,135 @@
+from urllib.parse import urlparse
+
+import pandas as pd
+
+# Types des colonnes renvoyées par chaque endpoint du backend :
+#   "category" : chaînes à faible cardinalité (catégories, types d'objets, genres, périodes)
+#   "datetime" : dates converties en datetime64
+#   "integer" : identifiants et comptes, réduits au plus petit type entier suffisant
+#   "float"   : mesures, gardées en float64 (sommes et moyennes sur des millions de lignes identiques
+#               aux agrégats du serveur, calculés en DECIMAL / double)
+#   "drop"     : colonne inutile aux tableaux de bord, supprimée dès la réception
+SCHEMAS = {
+    "/data/objets": {
+        "id": "integer",
+        "utilisateur_id": "integer",
+        "type_objet": "category",
+        "image_url": "drop",
+        "temps_reponse": "float",
+        "date_detection": "datetime",
+        "categorie_id": "integer",
+        "categorie": "category",
+        "genre": "category",
+    },
+    "/data/objets/aggregate": {
+        "periode": "category",
+        "categorie": "category",
+        "type_objet": "category",
+        "nb_objets": "integer",
+        "somme_temps_reponse": "float",
+        "moyenne_temps_reponse": "float",
+        "min_temps_reponse": "float",
+        "max_temps_reponse": "float",
+    },
+    "/data/satisfaction": {
+        "id": "integer",
+        "utilisateur_id": "integer",
+        "satisfait": "integer",
+        "non_satisfait": "integer",
+        "categorie": "category",
+        "type_objet": "category",
+        "date_detection": "datetime",
+        "genre": "category",
+    },
+    "/data/satisfaction/aggregate": {
+        "periode": "category",
+        "categorie": "category",
+        "type_objet": "category",
+        "satisfait": "float",
+        "non_satisfait": "float",
+        "taux_precision": "float",
+        "nb_objets": "integer",
+    },
+    "/data/categories": {
+        "id": "integer",
+        "nom": "category",
+    },
+}
+
+
+# Schéma correspondant à une URL du backend (None si l'endpoint n'est pas décrit)
+def schema_for(endpoint):
+    return SCHEMAS.get(urlparse(endpoint).path.rstrip("/"))
+
+
+# Format des dates sérialisées par Flask en JSON
+HTTP_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+
+
+# Conversion des dates renvoyées par Flask (format HTTP "Tue, 14 Nov 2023 00:00:00 GMT") en datetime64 naïf.
+# Le format est imposé : deviné à partir de la première valeur, "14 May" serait lu en %B (mois complet)
+# et toutes les autres dates deviendraient NaT.
+def parse_dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        dates = pd.Series(values)
+    else:
+        dates = pd.to_datetime(values, format=HTTP_DATE_FORMAT, errors="coerce")
+        if dates.isna().all():
+            dates = pd.to_datetime(values, errors="coerce")
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates
+
+
+def memory_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+# Applique un schéma à un DataFrame et note l'empreinte mémoire avant/après dans frame.attrs["memoire"]
+def apply_schema(frame, schema):
+    if schema is None or frame.empty:
+        return frame
+    before = memory_bytes(frame)
+    dropped = [column for column, kind in schema.items() if kind == "drop" and column in frame.columns]
+    frame = frame.drop(columns=dropped)
+    for column, kind in schema.items():
+        if column not in frame.columns:
+            continue
+        if kind == "category":
+            frame[column] = frame[column].astype("category")
+        elif kind == "datetime":
+            frame[column] = parse_dates(frame[column])
+        elif kind == "integer":
+            frame[column] = pd.to_numeric(frame[column], downcast="integer")
+        elif kind == "float":
+            frame[column] = pd.to_numeric(frame[column]).astype("float64")
+    frame.attrs["memoire"] = {"avant": before, "apres": memory_bytes(frame)}
+    return frame
+
+
+# Concaténation qui conserve les colonnes catégorielles : pd.concat les convertirait en object
+# dès que les paquets n'ont pas exactement les mêmes catégories.
+def concat_frames(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    # Copies superficielles : les catégories des frames reçus (partagés) ne sont pas modifiées
+    frames = [frame.copy(deep=False) for frame in frames]
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals(
+                [frame[column] for frame in frames if column in frame.columns], ignore_order=True
+            ).categories
+            for frame in frames:
+                if column in frame.columns:
+                    frame[column] = frame[column].cat.set_categories(categories)
+    memory = [frame.attrs.get("memoire") for frame in frames]
+    result = pd.concat(frames, ignore_index=True)
+    if all(memory):
+        result.attrs["memoire"] = {
+            "avant": sum(m["avant"] for m in memory),
+            "apres": sum(m["apres"] for m in memory),
+        }
+    return result